@@ -0,0 +1,85 @@
+"""An asyncio interface to the storage backend for loading page data concurrently.
+
+Every query function of the backend selected by DB_ENGINE (see storage_mar)
+is available here under the same name and signature as a coroutine:
+
+    campaigns, totals = await asyncio.gather(async_mar.read_campaigns(), async_mar.get_campaign_metric_totals())
+
+The coroutines run the synchronous functions on a dedicated thread pool sized
+to the connection pool (DB_POOL_MAX), so they share its connections, the
+query cache and its invalidation, and never queue for a connection inside a
+worker. psycopg2 and sqlite3 release the GIL while a query runs, so queries
+issued together overlap and a page waits for roughly its slowest query
+instead of the sum of all of them.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import storage_mar
+
+bm = storage_mar.load_backend()
+
+ASYNC_FUNCTIONS = [
+    "create_campaign", "read_campaigns", "read_campaigns_page", "update_campaign", "update_campaigns", "delete_campaign",
+    "create_customer", "read_customers", "read_customers_page", "find_customers_by_demographics",
+    "count_customers_by_demographics", "update_customer", "delete_customer", "import_customers",
+    "create_segment", "add_customers_to_segment", "remove_customers_from_segment", "replace_segment_members",
+    "count_customers_matching", "refresh_segment", "refresh_segments", "refresh_segments_incremental",
+    "read_segments", "delete_segment",
+    "log_performance_metric", "rebuild_performance_rollups", "ingest_performance_metrics",
+    "get_campaign_metric_totals", "get_performance_metrics", "read_metric_columns", "get_channel_types", "get_channel_performance",
+    "get_total_campaign_budget", "get_average_clicks_per_campaign", "get_most_successful_campaign",
+    "get_campaign_count", "get_max_min_metrics", "get_insights_snapshot", "get_campaign_leaderboard",
+]
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """Returns the thread pool that runs backend calls, creating it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=bm.DB_POOL_MAX, thread_name_prefix="backend-async")
+        return _executor
+
+def shutdown_executor():
+    """Waits for running backend calls and shuts the thread pool down."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+def _make_async(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+    return wrapper
+
+for _name in ASYNC_FUNCTIONS:
+    globals()[_name] = _make_async(getattr(bm, _name))
+
+# --- Page Loading ---
+
+async def gather_page_data(calls):
+    """Runs every call concurrently; `calls` maps result names to coroutines.
+
+    Returns a dict with the same keys and each call's result.
+    """
+    results = await asyncio.gather(*calls.values())
+    return dict(zip(calls, results))
+
+def load_page_data(calls):
+    """Synchronous entry point for gather_page_data(), for Streamlit scripts, which run without an event loop.
+
+    `calls` maps result names to zero-argument callables returning coroutines,
+    e.g. async_mar.read_campaigns or lambda: async_mar.get_performance_metrics(points=500),
+    so the coroutines are created inside the event loop that runs them.
+    """
+    async def run():
+        return await gather_page_data({name: call() for name, call in calls.items()})
+    return asyncio.run(run())
@@ -1,5 +1,27 @@
-import sqlite3
+import atexit
+import csv
+import io
+import itertools
+import json
 import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import NamedTuple, Optional
+
+import numpy as np
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+from psycopg2.extras import Json, execute_batch, execute_values
+
+from cache_mar import QueryCache
+from criteria_mar import compile_criteria, demographic_numeric_sql, is_executable
+from instrument_mar import InstrumentedCursor, query_stats
 
 # Database connection details
 DB_NAME = os.getenv("DB_NAME", "Marketing campaign manager")
@@ -8,6 +30,12 @@ DB_PASSWORD = os.getenv("DB_PASSWORD", "Shikha#03")
 DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_PORT = os.getenv("DB_PORT", "5432")
 
+# Connection pool sizing and health checking
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", "30"))
+
 def get_db_connection():
     """Establishes a connection to the PostgreSQL database."""
     try:
@@ -23,416 +51,1886 @@ def get_db_connection():
         print(f"Error connecting to database: {e}")
         return None
 
+# --- Connection Pool ---
+
+class ConnectionPool:
+    """A thread-safe pool of PostgreSQL connections shared by the whole process.
+
+    Up to ``maxconn`` connections are opened lazily and kept warm once
+    returned; checkouts block for up to ``timeout`` seconds when all of them
+    are in use. A connection that has sat idle for longer than ``ping_after``
+    seconds is pinged before it is handed out, and broken connections are
+    replaced transparently.
+    """
+
+    def __init__(self, minconn, maxconn, timeout=DB_POOL_TIMEOUT, ping_after=DB_POOL_PING_AFTER, **connect_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self._connect_kwargs = connect_kwargs
+        self._idle = deque()
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+
+    def _connect(self):
+        return psycopg2.connect(**self._connect_kwargs)
+
+    def _is_healthy(self, conn, last_used):
+        """Returns True if an idle connection can be handed out."""
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.ping_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _release_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def checkout(self):
+        """Takes a healthy connection from the pool, opening one if needed."""
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise psycopg2.pool.PoolError("connection pool is closed")
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    self._size += 1
+                    conn = last_used = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise psycopg2.pool.PoolError(f"no connection available after {self.timeout}s")
+                self._cond.wait(remaining)
+
+        if conn is not None:
+            if self._is_healthy(conn, last_used):
+                return conn
+            conn.close()
+        try:
+            return self._connect()
+        except Exception:
+            self._release_slot()
+            raise
+
+    def checkin(self, conn):
+        """Returns a connection to the pool, closing it if it is no longer usable."""
+        reusable = not conn.closed and conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        with self._cond:
+            if reusable and not self._closed:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+                return
+        conn.close()
+        self._release_slot()
+
+    def close(self):
+        """Closes every idle connection; checked-out ones close on checkin."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, deque()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            conn.close()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Returns the process-wide connection pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    DB_POOL_MIN, DB_POOL_MAX, cursor_factory=InstrumentedCursor,
+                    dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD,
+                    host=DB_HOST, port=DB_PORT
+                )
+    return _pool
+
+def close_pool():
+    """Closes the shared pool; the next query will open a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+@contextmanager
+def db_connection():
+    """Checks a connection out of the shared pool for the duration of a block.
+
+    The transaction is committed when the block exits cleanly and rolled back
+    when it raises, so connections always go back to the pool idle. Inside a
+    session() the session's connection is yielded instead and nothing is
+    committed until the session ends.
+    """
+    current = active_session()
+    if current is not None:
+        with current._operation() as conn:
+            yield conn
+        return
+    pool = get_pool()
+    started = time.perf_counter()
+    conn = pool.checkout()
+    query_stats.record_pool_wait(time.perf_counter() - started)
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            pass
+        raise
+    finally:
+        pool.checkin(conn)
+
+@contextmanager
+def db_cursor():
+    """Yields a cursor on a pooled connection; see db_connection()."""
+    with db_connection() as conn:
+        with conn.cursor() as cur:
+            yield cur
+
+def _create_temp_table(cur, name, columns):
+    """Creates an empty temporary table that is dropped at commit.
+
+    A session runs several backend calls in one transaction, so a table left
+    by an earlier call is emptied and reused instead.
+    """
+    cur.execute(f"CREATE TEMP TABLE IF NOT EXISTS {name} ({columns}) ON COMMIT DROP; TRUNCATE {name};")
+
+# --- Unit of Work ---
+
+# Parameter placeholder of this engine's SQL, for statements passed to Session.execute()
+PLACEHOLDER = "%s"
+
+class SessionError(Exception):
+    """Raised when a session cannot go on or commit because a backend call inside it failed."""
+
+class Savepoint:
+    """An open savepoint of a Session; `error` is set once a backend call inside it has failed."""
+
+    def __init__(self, name):
+        self.name = name
+        self.error = None
+
+class Session:
+    """A unit of work: one connection and one transaction shared by the backend calls made inside session().
+
+    Backend functions called on the session's thread run on its connection
+    and commit nothing, so a multi-step flow commits once, or not at all.
+    A failing call still prints its error and returns its usual False, None
+    or [], but it also fails the innermost open savepoint() block, or the
+    whole session outside one: later calls in it raise SessionError at once
+    (and so fail the same way) and the failed part is rolled back.
+
+    Reads bypass the query cache so they see the session's own writes, and
+    cache invalidations are applied after the commit.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.error = None
+        self._savepoints = []
+        self._savepoint_names = itertools.count()
+        self._depth = 0
+        self._invalidated = set()
+
+    def _run(self, sql):
+        cur = self.conn.cursor()
+        try:
+            cur.execute(sql)
+        finally:
+            cur.close()
+
+    def _check(self):
+        if self.error is not None:
+            raise SessionError(f"an earlier operation in this session failed: {self.error}")
+        if self._savepoints and self._savepoints[-1].error is not None:
+            raise SessionError(f"an earlier operation in this savepoint failed: {self._savepoints[-1].error}")
+
+    @contextmanager
+    def _operation(self):
+        """Wraps one backend call on the session's connection and records its failure."""
+        self._check()
+        self._depth += 1
+        try:
+            yield self.conn
+        except Exception as error:
+            # Nested calls (a read inside a write) report once, at the outermost level
+            if self._depth == 1:
+                if self._savepoints:
+                    self._savepoints[-1].error = error
+                    self._run(f"ROLLBACK TO SAVEPOINT {self._savepoints[-1].name};")
+                else:
+                    self.error = error
+            raise
+        finally:
+            self._depth -= 1
+
+    @contextmanager
+    def savepoint(self):
+        """Runs a block under a savepoint and yields its Savepoint.
+
+        If a backend call in the block fails, the block's writes are undone
+        and the savepoint's `error` is set, and the rest of the session goes
+        on. An exception raised by the block is handled the same way and then
+        propagates. Savepoints nest.
+        """
+        self._check()
+        savepoint = Savepoint(f"session_savepoint_{next(self._savepoint_names)}")
+        self._run(f"SAVEPOINT {savepoint.name};")
+        self._savepoints.append(savepoint)
+        try:
+            yield savepoint
+        except Exception as error:
+            if savepoint.error is None:
+                savepoint.error = error
+                self._run(f"ROLLBACK TO SAVEPOINT {savepoint.name};")
+            raise
+        finally:
+            self._savepoints.pop()
+            if self.error is None:
+                self._run(f"RELEASE SAVEPOINT {savepoint.name};")
+
+    def _execute_batch(self, cur, sql, rows, page_size):
+        execute_batch(cur, sql, rows, page_size=page_size)
+
+    def execute(self, sql, params=(), tables=()):
+        """Runs one statement in the session and returns its rows, or None if it returns none.
+
+        `sql` is in the engine's own dialect, with the module's PLACEHOLDER
+        (%s here, ? in sqlite_mar) for parameters. `tables` are the tables it
+        writes, invalidated in the query cache at commit. A failure fails the
+        session like a backend call and is raised.
+        """
+        with self._operation() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute(sql, params)
+                rows = cur.fetchall() if cur.description else None
+            finally:
+                cur.close()
+        self._invalidate(tables)
+        return rows
+
+    def execute_batch(self, sql, rows, page_size=1000, tables=()):
+        """Runs `sql` once for each parameter tuple in `rows`, sending `page_size` statements per round trip.
+
+        See execute() for placeholders, `tables` and failures.
+        """
+        with self._operation() as conn:
+            cur = conn.cursor()
+            try:
+                self._execute_batch(cur, sql, rows, page_size)
+            finally:
+                cur.close()
+        self._invalidate(tables)
+
+    def _invalidate(self, tables):
+        # None stands for every table
+        self._invalidated.update(tables or (None,))
+
+    def _apply_invalidations(self, invalidate):
+        if None in self._invalidated:
+            invalidate()
+        elif self._invalidated:
+            invalidate(*self._invalidated)
+
+_session_local = threading.local()
+
+def active_session():
+    """Returns the Session open on this thread, or None."""
+    return getattr(_session_local, "session", None)
+
+@contextmanager
+def session():
+    """Opens a unit of work on this thread and yields its Session; see Session.
+
+    The transaction commits when the block exits cleanly. It is rolled back
+    when the block raises, which propagates, or when a backend call failed
+    outside a savepoint, which raises SessionError. Sessions do not nest, and
+    calls made on other threads (async_mar, MetricIngestor) are not part of
+    them.
+    """
+    if active_session() is not None:
+        raise SessionError("a session is already open on this thread")
+    with db_connection() as conn:
+        current = _session_local.session = Session(conn)
+        try:
+            yield current
+        finally:
+            _session_local.session = None
+        if current.error is not None:
+            raise SessionError(f"session rolled back: {current.error}") from current.error
+    current._apply_invalidations(invalidate_cache)
+
+# --- Query Cache ---
+
+_query_cache = QueryCache()
+
+def _cache_key(sql, params):
+    return sql, repr([param.adapted if isinstance(param, Json) else param for param in params])
+
+def cached_query(sql, params=(), tables=()):
+    """Runs a read-only query through the shared query cache and returns all rows.
+
+    `tables` lists every table the query reads; writes to any of them through
+    invalidate_cache() drop the entry. Errors are raised, never cached. The
+    list is the caller's own, but its rows are shared with other callers and
+    must not be modified.
+    """
+    if active_session() is not None:
+        # The rows may include the session's uncommitted writes
+        with db_cursor() as cur:
+            cur.execute(sql, params)
+            return cur.fetchall()
+    key = _cache_key(sql, params)
+    hit, rows = _query_cache.get(key)
+    if not hit:
+        generation = _query_cache.generation(tables)
+        with db_cursor() as cur:
+            cur.execute(sql, params)
+            rows = _query_cache.put(key, cur.fetchall(), tables, generation)
+    # The cache holds the rows as a frozen tuple; callers get a list, as from fetchall()
+    return list(rows)
+
+def invalidate_cache(*tables):
+    """Drops cached results that read any of `tables`; with no arguments drops everything.
+
+    Inside a session() the invalidation waits for the commit.
+    """
+    current = active_session()
+    if current is not None:
+        current._invalidate(tables)
+        return
+    if tables:
+        _query_cache.invalidate(*tables)
+    else:
+        _query_cache.clear()
+
+def cache_stats():
+    """Returns the query cache's hit, miss, invalidation and eviction counters."""
+    return _query_cache.snapshot()
+
+# --- Streaming Reads ---
+
+# Rows fetched per round trip by stream_query()
+STREAM_FETCH_SIZE = int(os.getenv("STREAM_FETCH_SIZE", "10000"))
+
+_stream_names = itertools.count()
+
+def stream_query(sql, params=(), fetch_size=None):
+    """Runs a read-only query on a named server-side cursor and yields its rows in lists of up to `fetch_size`.
+
+    Only one chunk is held in Python memory at a time and results bypass the
+    query cache. The pooled connection stays checked out until the generator
+    is exhausted or closed, so close it when stopping early. Errors are
+    raised to the caller.
+    """
+    fetch_size = fetch_size or STREAM_FETCH_SIZE
+    with db_connection() as conn:
+        try:
+            with conn.cursor(name=f"stream_{next(_stream_names)}") as cur:
+                cur.itersize = fetch_size
+                cur.execute(sql, params)
+                while True:
+                    rows = cur.fetchmany(fetch_size)
+                    if not rows:
+                        break
+                    yield rows
+        except GeneratorExit:
+            # Abandoned early: end the transaction before the connection goes back to the pool
+            if active_session() is None:
+                conn.rollback()
+            raise
+
+# --- Query Diagnostics ---
+
+def query_diagnostics():
+    """Returns per-statement timing histograms, connection wait times and recent slow queries."""
+    return query_stats.snapshot()
+
+def reset_query_diagnostics():
+    """Clears the recorded query statistics."""
+    query_stats.reset()
+
+# --- Keyset Pagination ---
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def _keyset_page(sort_column, descending, after):
+    """Builds the seek predicate and ORDER BY for a keyset-paginated query.
+
+    Rows are ordered by (sort_column, id) so the order is total even when the
+    sort column has duplicates. `after` is the (sort value, id) cursor of the
+    last row on the previous page, or None for the first page.
+    """
+    direction = "DESC" if descending else "ASC"
+    order_by = f"ORDER BY {sort_column} {direction}, id {direction}"
+    if after is None:
+        return "TRUE", [], order_by
+    comparison = "<" if descending else ">"
+    return f"({sort_column}, id) {comparison} (%s, %s)", list(after), order_by
+
+def _page_size(page_size):
+    return max(1, min(int(page_size), MAX_PAGE_SIZE))
+
+def _split_page(rows, page_size, sort_index):
+    """Trims the look-ahead row and returns (rows, cursor for the next page)."""
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, (rows[-1][sort_index], rows[-1][0])
+
+# --- Channel Types ---
+
+def get_channel_types():
+    """Retrieves (id, name) of every channel type in id order."""
+    try:
+        return cached_query("SELECT id, name FROM channel_types ORDER BY id;", tables=("channel_types",))
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error reading channel types: {error}")
+        return []
+
+def _channel_type_ids():
+    """Returns a channel name -> channel_types id map."""
+    return {name: channel_type_id for channel_type_id, name in get_channel_types()}
+
+def _ensure_channel_types(cur, names):
+    """Adds the channel names missing from channel_types; returns whether any were added.
+
+    Only missing names are inserted, so the SMALLINT ids are not used up by
+    conflicting inserts. Callers invalidate "channel_types" after committing.
+    """
+    known = _channel_type_ids()
+    missing = [name for name in dict.fromkeys(names) if name not in known]
+    if not missing:
+        return False
+    cur.execute("""
+        INSERT INTO channel_types (name)
+        SELECT m.name FROM unnest(%s::text[]) WITH ORDINALITY AS m(name, position)
+        WHERE NOT EXISTS (SELECT 1 FROM channel_types t WHERE t.name = m.name)
+        ORDER BY m.position
+        ON CONFLICT (name) DO NOTHING;
+    """, (missing,))
+    return True
+
 # --- CRUD Operations for Campaigns ---
 
 def create_campaign(name, budget, start_date, end_date, description, channels):
-    """Creates a new campaign and its associated channels."""
-    conn = get_db_connection()
-    if conn is None: return False
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO campaigns (name, budget, start_date, end_date, description) VALUES (%s, %s, %s, %s, %s) RETURNING id;",
-            (name, budget, start_date, end_date, description)
-        )
-        campaign_id = cur.fetchone()[0]
-        for channel in channels:
-            cur.execute(
-                "INSERT INTO channels (campaign_id, channel_type) VALUES (%s, %s);",
-                (campaign_id, channel)
-            )
-        conn.commit()
-        return True
+    """Creates a new campaign and its associated channels and returns its ID."""
+    try:
+        channels = list(dict.fromkeys(channels))
+        with db_cursor() as cur:
+            added_types = _ensure_channel_types(cur, channels)
+            cur.execute("""
+                WITH campaign AS (
+                    INSERT INTO campaigns (name, budget, start_date, end_date, description)
+                    VALUES (%s, %s, %s, %s, %s)
+                    RETURNING id
+                ), campaign_channels AS (
+                    INSERT INTO channels (campaign_id, channel_type_id)
+                    SELECT campaign.id, t.id
+                    FROM campaign
+                    CROSS JOIN unnest(%s::text[]) WITH ORDINALITY AS w(name, position)
+                    JOIN channel_types t ON t.name = w.name
+                    ORDER BY w.position
+                )
+                SELECT id FROM campaign;
+            """, (name, budget, start_date, end_date, description, channels))
+            campaign_id = cur.fetchone()[0]
+        invalidate_cache("campaigns", "channels", *(["channel_types"] if added_types else []))
+        return campaign_id
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error creating campaign: {error}")
-        conn.rollback()
         return False
-    finally:
-        if conn:
-            cur.close()
-            conn.close()
 
 def read_campaigns():
     """Retrieves all campaigns with their associated channels."""
-    conn = get_db_connection()
-    if conn is None: return []
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM campaigns;")
-        campaigns_data = cur.fetchall()
-        
-        campaigns = []
-        for campaign in campaigns_data:
-            cur.execute("SELECT channel_type FROM channels WHERE campaign_id = %s;", (campaign[0],))
-            channels = [row[0] for row in cur.fetchall()]
-            campaigns.append({
-                "id": campaign[0], "name": campaign[1], "budget": campaign[2],
-                "start_date": campaign[3], "end_date": campaign[4],
-                "description": campaign[5], "channels": channels
-            })
-        return campaigns
+    try:
+        rows = cached_query("""
+            SELECT c.id, c.name, c.budget, c.start_date, c.end_date, c.description,
+                   COALESCE(array_agg(t.name ORDER BY ch.id) FILTER (WHERE ch.id IS NOT NULL), '{}')
+            FROM campaigns c
+            LEFT JOIN channels ch ON ch.campaign_id = c.id
+            LEFT JOIN channel_types t ON t.id = ch.channel_type_id
+            GROUP BY c.id
+            ORDER BY c.id;
+        """, tables=("campaigns", "channels", "channel_types"))
+        return [
+            {
+                "id": row[0], "name": row[1], "budget": row[2],
+                "start_date": row[3], "end_date": row[4],
+                "description": row[5], "channels": list(row[6])
+            }
+            for row in rows
+        ]
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error reading campaigns: {error}")
         return []
-    finally:
-        if conn:
-            cur.close()
-            conn.close()
 
-def update_campaign(campaign_id, name, budget, start_date, end_date, description, channels):
-    """Updates an existing campaign and its channels."""
-    conn = get_db_connection()
-    if conn is None: return False
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            "UPDATE campaigns SET name = %s, budget = %s, start_date = %s, end_date = %s, description = %s WHERE id = %s;",
-            (name, budget, start_date, end_date, description, campaign_id)
-        )
-        # First delete old channels
-        cur.execute("DELETE FROM channels WHERE campaign_id = %s;", (campaign_id,))
-        # Then insert new channels
-        for channel in channels:
-            cur.execute(
-                "INSERT INTO channels (campaign_id, channel_type) VALUES (%s, %s);",
-                (campaign_id, channel)
+CAMPAIGN_SORT_COLUMNS = {"id": 0, "name": 1, "budget": 2, "start_date": 3, "end_date": 4}
+
+def read_campaigns_page(page_size=DEFAULT_PAGE_SIZE, after=None, sort_by="id", descending=False,
+                        name_contains=None, channel=None):
+    """Retrieves one keyset page of campaigns with their channels.
+
+    Returns (campaigns, next_cursor); pass next_cursor back as `after` to get
+    the following page. next_cursor is None on the last page.
+    """
+    try:
+        if sort_by not in CAMPAIGN_SORT_COLUMNS:
+            raise ValueError(f"cannot sort campaigns by {sort_by!r}")
+        page_size = _page_size(page_size)
+        seek, params, order_by = _keyset_page(sort_by, descending, after)
+        conditions = [seek]
+        if name_contains:
+            conditions.append("name ILIKE %s")
+            params.append(f"%{name_contains}%")
+        if channel:
+            conditions.append(
+                "EXISTS (SELECT 1 FROM channels ch WHERE ch.campaign_id = c.id"
+                " AND ch.channel_type_id = (SELECT id FROM channel_types WHERE name = %s))"
             )
-        conn.commit()
+            params.append(channel)
+        rows = cached_query(f"""
+            SELECT c.id, c.name, c.budget, c.start_date, c.end_date, c.description,
+                   COALESCE((
+                       SELECT array_agg(t.name ORDER BY ch.id)
+                       FROM channels ch JOIN channel_types t ON t.id = ch.channel_type_id
+                       WHERE ch.campaign_id = c.id
+                   ), '{{}}')
+            FROM campaigns c
+            WHERE {" AND ".join(conditions)}
+            {order_by}
+            LIMIT %s;
+        """, params + [page_size + 1], ("campaigns", "channels", "channel_types"))
+        rows, next_cursor = _split_page(rows, page_size, CAMPAIGN_SORT_COLUMNS[sort_by])
+        campaigns = [
+            {
+                "id": row[0], "name": row[1], "budget": row[2],
+                "start_date": row[3], "end_date": row[4],
+                "description": row[5], "channels": list(row[6])
+            }
+            for row in rows
+        ]
+        return campaigns, next_cursor
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error reading campaigns page: {error}")
+        return [], None
+
+CAMPAIGN_UPDATE_FIELDS = ("name", "budget", "start_date", "end_date", "description")
+
+def _campaign_update_rows(updates):
+    """Normalizes update dicts to (id, name, budget, start_date, end_date, description) rows and a channel map.
+
+    A later update for the same campaign replaces an earlier one. Campaigns
+    whose update has no "channels" key keep their channels.
+    """
+    rows, channels = {}, {}
+    for update in updates:
+        campaign_id = int(update["id"])
+        rows[campaign_id] = (campaign_id,) + tuple(update[field] for field in CAMPAIGN_UPDATE_FIELDS)
+        if update.get("channels") is not None:
+            channels[campaign_id] = list(dict.fromkeys(update["channels"]))
+        else:
+            channels.pop(campaign_id, None)
+    return list(rows.values()), channels
+
+def _apply_campaign_updates(cur, rows, channels):
+    """Writes campaign rows and channel sets, touching only what differs; returns update stats.
+
+    Unchanged campaign rows are not rewritten, and each campaign's channels
+    are diffed against the requested set so only missing channels are
+    inserted and unwanted ones deleted, all in one statement.
+    """
+    stats = {"updated": 0, "channels_added": 0, "channels_removed": 0}
+    if rows:
+        changed = execute_values(cur, """
+            UPDATE campaigns c
+            SET name = v.name, budget = v.budget, start_date = v.start_date, end_date = v.end_date, description = v.description
+            FROM (VALUES %s) AS v(id, name, budget, start_date, end_date, description)
+            WHERE c.id = v.id
+              AND (c.name, c.budget, c.start_date, c.end_date, c.description)
+                  IS DISTINCT FROM (v.name, v.budget, v.start_date, v.end_date, v.description)
+            RETURNING c.id;
+        """, rows, template="(%s::integer, %s::text, %s::numeric, %s::date, %s::date, %s::text)", page_size=1000, fetch=True)
+        stats["updated"] = len(changed)
+    if channels:
+        campaign_ids = list(channels)
+        pairs = [(campaign_id, channel) for campaign_id, wanted in channels.items() for channel in wanted]
+        cur.execute("""
+            WITH wanted AS (
+                SELECT w.campaign_id, t.id AS channel_type_id, w.position
+                FROM unnest(%s::integer[], %s::text[]) WITH ORDINALITY AS w(campaign_id, name, position)
+                JOIN channel_types t ON t.name = w.name
+            ), removed AS (
+                DELETE FROM channels ch
+                WHERE ch.campaign_id = ANY(%s::integer[])
+                  AND NOT EXISTS (SELECT 1 FROM wanted w WHERE w.campaign_id = ch.campaign_id AND w.channel_type_id = ch.channel_type_id)
+                RETURNING 1
+            ), added AS (
+                INSERT INTO channels (campaign_id, channel_type_id)
+                SELECT w.campaign_id, w.channel_type_id FROM wanted w
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM channels ch WHERE ch.campaign_id = w.campaign_id AND ch.channel_type_id = w.channel_type_id
+                )
+                ORDER BY w.position
+                RETURNING 1
+            )
+            SELECT (SELECT COUNT(*) FROM added), (SELECT COUNT(*) FROM removed);
+        """, ([campaign_id for campaign_id, _ in pairs], [channel for _, channel in pairs], campaign_ids))
+        stats["channels_added"], stats["channels_removed"] = cur.fetchone()
+    return stats
+
+def _invalidate_campaign_updates(stats, added_types):
+    tables = ["channel_types"] if added_types else []
+    if stats["updated"]:
+        tables.append("campaigns")
+    if stats["channels_added"] or stats["channels_removed"]:
+        tables.append("channels")
+    if tables:
+        invalidate_cache(*tables)
+
+def update_campaign(campaign_id, name, budget, start_date, end_date, description, channels):
+    """Updates an existing campaign and its channels, writing only the fields and channels that changed."""
+    try:
+        update = dict(zip(("id",) + CAMPAIGN_UPDATE_FIELDS, (campaign_id, name, budget, start_date, end_date, description)))
+        rows, channel_sets = _campaign_update_rows([dict(update, channels=channels)])
+        with db_cursor() as cur:
+            added_types = _ensure_channel_types(cur, channel_sets.get(int(campaign_id), []))
+            stats = _apply_campaign_updates(cur, rows, channel_sets)
+        _invalidate_campaign_updates(stats, added_types)
         return True
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error updating campaign: {error}")
-        conn.rollback()
         return False
-    finally:
-        if conn:
-            cur.close()
-            conn.close()
+
+def update_campaigns(updates):
+    """Updates many campaigns in one transaction; returns update stats, or None on error.
+
+    `updates` are dicts with an "id", every field of CAMPAIGN_UPDATE_FIELDS
+    and optionally "channels" (the shape read_campaigns() returns). Rows
+    and channels that already match are left untouched; the stats count the
+    campaigns actually rewritten and the channels added and removed.
+    """
+    try:
+        rows, channel_sets = _campaign_update_rows(updates)
+        with db_cursor() as cur:
+            added_types = _ensure_channel_types(cur, [name for names in channel_sets.values() for name in names])
+            stats = _apply_campaign_updates(cur, rows, channel_sets)
+        _invalidate_campaign_updates(stats, added_types)
+        return stats
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error updating campaigns: {error}")
+        return None
 
 def delete_campaign(campaign_id):
     """Deletes a campaign."""
-    conn = get_db_connection()
-    if conn is None: return False
     try:
-        cur = conn.cursor()
-        cur.execute("DELETE FROM campaigns WHERE id = %s;", (campaign_id,))
-        conn.commit()
+        with db_cursor() as cur:
+            cur.execute("DELETE FROM campaigns WHERE id = %s;", (campaign_id,))
+        invalidate_cache("campaigns", "channels", "performance_metrics")
         return True
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error deleting campaign: {error}")
-        conn.rollback()
         return False
-    finally:
-        if conn:
-            cur.close()
-            conn.close()
 
 # --- CRUD Operations for Customers ---
 
+_DEMOGRAPHIC_PAIR_RE = re.compile(r"([A-Za-z_][A-Za-z0-9_ ]*)\s*[:=]\s*([^,;\n]*)")
+_NUMBER_RE = re.compile(r"^-?[0-9]+(\.[0-9]+)?$")
+
+def parse_demographics(text):
+    """Parses free-text demographics such as "location: North, age=25" into a dict.
+
+    Mirrors migrations/0001_demographics_jsonb.sql: keys are lower-cased with
+    spaces turned into underscores, numeric values become numbers, JSON objects
+    are kept as they are and text without key/value pairs is kept under "notes".
+    """
+    text = (text or "").strip()
+    if not text:
+        return {}
+    if text.startswith("{"):
+        try:
+            value = json.loads(text)
+            if isinstance(value, dict):
+                return value
+        except ValueError:
+            pass
+    demographics = {}
+    for key, value in _DEMOGRAPHIC_PAIR_RE.findall(text):
+        key = re.sub(r"\s+", "_", key.strip().lower())
+        value = value.strip()
+        if _NUMBER_RE.match(value):
+            value = float(value) if "." in value else int(value)
+        demographics[key] = value
+    return demographics or {"notes": text}
+
+def _demographics_param(demographics):
+    """Adapts demographics given as a dict or free text for a JSONB column."""
+    if not isinstance(demographics, dict):
+        demographics = parse_demographics(demographics)
+    return Json(demographics)
+
 def create_customer(name, email, demographics):
-    """Creates a new customer."""
-    conn = get_db_connection()
-    if conn is None: return False
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO customers (name, email, demographics) VALUES (%s, %s, %s);",
-            (name, email, demographics)
-        )
-        conn.commit()
+    """Creates a new customer; demographics may be a dict or "key: value" text."""
+    try:
+        with db_cursor() as cur:
+            cur.execute(
+                "INSERT INTO customers (name, email, demographics) VALUES (%s, %s, %s);",
+                (name, email, _demographics_param(demographics))
+            )
+        invalidate_cache("customers")
         return True
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error creating customer: {error}")
-        conn.rollback()
         return False
-    finally:
-        if conn:
-            cur.close()
-            conn.close()
 
 def read_customers():
     """Retrieves all customers."""
-    conn = get_db_connection()
-    if conn is None: return []
     try:
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM customers;")
-        return cur.fetchall()
+        return cached_query("SELECT * FROM customers;", tables=("customers",))
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error reading customers: {error}")
         return []
-    finally:
-        if conn:
-            cur.close()
-            conn.close()
+
+def stream_customers(fetch_size=None):
+    """Yields all customers in id order, in lists of up to `fetch_size` rows, without holding the whole table.
+
+    Prints the error and stops if the query fails.
+    """
+    try:
+        yield from stream_query("SELECT * FROM customers ORDER BY id;", fetch_size=fetch_size)
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error streaming customers: {error}")
+
+CUSTOMER_SORT_COLUMNS = {"id": 0, "name": 1, "email": 2}
+
+def read_customers_page(page_size=DEFAULT_PAGE_SIZE, after=None, sort_by="id", descending=False, search=None,
+                        criteria=None):
+    """Retrieves one keyset page of customers as (id, name, email, demographics) rows.
+
+    `criteria` optionally filters with segment criteria (see criteria_mar).
+    Returns (customers, next_cursor); see read_campaigns_page().
+    """
+    try:
+        if sort_by not in CUSTOMER_SORT_COLUMNS:
+            raise ValueError(f"cannot sort customers by {sort_by!r}")
+        page_size = _page_size(page_size)
+        seek, params, order_by = _keyset_page(sort_by, descending, after)
+        conditions = [seek]
+        if search:
+            conditions.append("(name ILIKE %s OR email ILIKE %s)")
+            params.extend([f"%{search}%", f"%{search}%"])
+        if criteria:
+            condition, criteria_params = compile_criteria(criteria)
+            conditions.append(condition)
+            params.extend(criteria_params)
+        rows = cached_query(f"""
+            SELECT id, name, email, demographics
+            FROM customers c
+            WHERE {" AND ".join(conditions)}
+            {order_by}
+            LIMIT %s;
+        """, params + [page_size + 1], ("customers",))
+        return _split_page(rows, page_size, CUSTOMER_SORT_COLUMNS[sort_by])
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error reading customers page: {error}")
+        return [], None
+
+def _demographic_condition(equals=None, ranges=None):
+    """Builds an indexable predicate over customers c from demographic filters."""
+    conditions, params = [], []
+    if equals:
+        conditions.append("c.demographics @> %s")
+        params.append(Json(equals))
+    for key, (minimum, maximum) in (ranges or {}).items():
+        sql, key_params = demographic_numeric_sql(key)
+        if minimum is not None:
+            conditions.append(f"{sql} >= %s")
+            params.extend(key_params + [minimum])
+        if maximum is not None:
+            conditions.append(f"{sql} <= %s")
+            params.extend(key_params + [maximum])
+    return " AND ".join(conditions) or "TRUE", params
+
+def find_customers_by_demographics(equals=None, ranges=None, page_size=DEFAULT_PAGE_SIZE, after=None):
+    """Retrieves one page of customers matching demographic filters, ordered by id.
+
+    `equals` is a dict matched by JSONB containment (GIN index), e.g.
+    {"location": "North"}; `ranges` maps numeric keys to inclusive
+    (minimum, maximum) bounds, either of which may be None, e.g.
+    {"age": (18, 30)}, and uses the expression indexes on those keys.
+    Returns (customers, next_cursor); see read_campaigns_page().
+    """
+    try:
+        page_size = _page_size(page_size)
+        condition, params = _demographic_condition(equals, ranges)
+        seek, seek_params, order_by = _keyset_page("id", False, after)
+        rows = cached_query(f"""
+            SELECT id, name, email, demographics
+            FROM customers c
+            WHERE {seek} AND {condition}
+            {order_by}
+            LIMIT %s;
+        """, seek_params + params + [page_size + 1], ("customers",))
+        return _split_page(rows, page_size, 0)
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error finding customers by demographics: {error}")
+        return [], None
+
+def count_customers_by_demographics(equals=None, ranges=None):
+    """Counts customers matching demographic filters; see find_customers_by_demographics()."""
+    try:
+        condition, params = _demographic_condition(equals, ranges)
+        return cached_query(f"SELECT COUNT(*) FROM customers c WHERE {condition};", params, ("customers",))[0][0]
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error counting customers by demographics: {error}")
+        return None
 
 def update_customer(customer_id, name, email, demographics):
-    """Updates an existing customer."""
-    conn = get_db_connection()
-    if conn is None: return False
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            "UPDATE customers SET name = %s, email = %s, demographics = %s WHERE id = %s;",
-            (name, email, demographics, customer_id)
-        )
-        conn.commit()
+    """Updates an existing customer; demographics may be a dict or "key: value" text."""
+    try:
+        with db_cursor() as cur:
+            cur.execute(
+                "UPDATE customers SET name = %s, email = %s, demographics = %s WHERE id = %s;",
+                (name, email, _demographics_param(demographics), customer_id)
+            )
+        invalidate_cache("customers")
         return True
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error updating customer: {error}")
-        conn.rollback()
         return False
-    finally:
-        if conn:
-            cur.close()
-            conn.close()
 
 def delete_customer(customer_id):
     """Deletes a customer."""
-    conn = get_db_connection()
-    if conn is None: return False
     try:
-        cur = conn.cursor()
-        cur.execute("DELETE FROM customers WHERE id = %s;", (customer_id,))
-        conn.commit()
+        with db_cursor() as cur:
+            cur.execute("DELETE FROM customers WHERE id = %s;", (customer_id,))
+        invalidate_cache("customers", "customer_segments")
         return True
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error deleting customer: {error}")
-        conn.rollback()
         return False
+
+# --- Bulk Customer Import ---
+
+IMPORT_BATCH_SIZE = 50000
+IMPORT_MAX_ERRORS_KEPT = 20
+
+def _open_text(source):
+    """Returns (text stream, close function) for a path or a binary file-like object."""
+    if isinstance(source, (str, os.PathLike)):
+        stream = open(source, encoding="utf-8", newline="")
+        return stream, stream.close
+    stream = io.TextIOWrapper(source, encoding="utf-8", newline="")
+    return stream, stream.detach
+
+def _iter_import_records(stream, file_format):
+    """Yields (line number, record dict or None) pairs; None marks unparseable input."""
+    if file_format == "csv":
+        reader = csv.DictReader(stream)
+        if reader.fieldnames:
+            reader.fieldnames = [field.strip().lower() for field in reader.fieldnames]
+        for record in reader:
+            yield reader.line_num, record
+    elif file_format == "ndjson":
+        for line_num, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield line_num, record if isinstance(record, dict) else None
+    else:
+        raise ValueError(f"unsupported import format {file_format!r}")
+
+def _validate_import_record(record):
+    """Returns (name, email, demographics) or raises ValueError with the reason."""
+    if record is None:
+        raise ValueError("unparseable record")
+    name = (record.get("name") or "").strip()
+    email = (record.get("email") or "").strip()
+    demographics = record.get("demographics")
+    if not name:
+        raise ValueError("missing name")
+    if "@" not in email:
+        raise ValueError("missing or invalid email")
+    if len(name) > 255 or len(email) > 255:
+        raise ValueError("name or email longer than 255 characters")
+    if not isinstance(demographics, dict):
+        demographics = parse_demographics(demographics if isinstance(demographics, str) else None)
+    return name, email, json.dumps(demographics)
+
+def _flush_import_batch(conn, batch, stats):
+    """COPYs one batch into a staging table and upserts it into customers.
+
+    The staging table is dropped when the batch commits; inside a session the
+    batch commits with the session instead.
+    """
+    batch.seek(0)
+    with conn.cursor() as cur:
+        _create_temp_table(cur, "customer_import", "line BIGINT, name VARCHAR(255), email VARCHAR(255), demographics JSONB")
+        cur.copy_expert("COPY customer_import (line, name, email, demographics) FROM STDIN WITH (FORMAT csv);", batch)
+        staged = cur.rowcount
+        cur.execute("""
+            WITH latest AS (
+                SELECT DISTINCT ON (email) name, email, demographics
+                FROM customer_import
+                ORDER BY email, line DESC
+            ), upserted AS (
+                INSERT INTO customers (name, email, demographics)
+                SELECT name, email, demographics FROM latest
+                ON CONFLICT (email) DO UPDATE SET name = EXCLUDED.name, demographics = EXCLUDED.demographics
+                RETURNING (xmax = 0) AS inserted
+            )
+            SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted) FROM upserted;
+        """)
+        inserted, updated = cur.fetchone()
+    if active_session() is None:
+        conn.commit()
+    stats["inserted"] += inserted
+    stats["updated"] += updated
+    stats["duplicates"] += staged - inserted - updated
+    batch.seek(0)
+    batch.truncate()
+
+def import_customers(source, file_format="csv", batch_size=IMPORT_BATCH_SIZE, progress_callback=None):
+    """Bulk-loads customers from a CSV or NDJSON file, upserting on email.
+
+    `source` is a path or a binary file-like object with name, email and
+    demographics fields. The input is streamed in batches of `batch_size`
+    rows through COPY into a temporary staging table, so memory stays bounded
+    by the batch size. Each batch is committed on its own (inside a session,
+    together with the session) and
+    `progress_callback(stats)` is called after every one.
+
+    Returns a stats dict, or None if the import failed: `inserted` new
+    customers, `updated` existing customers (including ones from earlier
+    batches), `duplicates` records superseded by a later record with the same
+    email in the same batch, `rejected` invalid records and a sample of
+    (line, reason) `errors`.
+    """
+    stats = {"read": 0, "inserted": 0, "updated": 0, "duplicates": 0, "rejected": 0, "errors": []}
+    stream, close_stream = _open_text(source)
+    try:
+        with db_connection() as conn:
+            batch = io.StringIO()
+            writer = csv.writer(batch)
+            batch_rows = 0
+            for line_num, record in _iter_import_records(stream, file_format):
+                stats["read"] += 1
+                try:
+                    row = _validate_import_record(record)
+                except ValueError as reason:
+                    stats["rejected"] += 1
+                    if len(stats["errors"]) < IMPORT_MAX_ERRORS_KEPT:
+                        stats["errors"].append((line_num, str(reason)))
+                    continue
+                writer.writerow((line_num,) + row)
+                batch_rows += 1
+                if batch_rows >= batch_size:
+                    _flush_import_batch(conn, batch, stats)
+                    batch_rows = 0
+                    if progress_callback:
+                        progress_callback(stats)
+            if batch_rows:
+                _flush_import_batch(conn, batch, stats)
+            if progress_callback:
+                progress_callback(stats)
+        return stats
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error importing customers: {error}")
+        return None
     finally:
-        if conn:
-            cur.close()
-            conn.close()
+        # Batches commit individually, so a failed import may still have written rows.
+        invalidate_cache("customers")
+        close_stream()
 
 # --- CRUD Operations for Segments and Customer-Segment Association ---
 
 def create_segment(segment_name, criteria):
     """Creates a new segment and returns its ID."""
-    conn = get_db_connection()
-    if conn is None: return None
     try:
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO segments (segment_name, criteria) VALUES (%s, %s) RETURNING id;",
-            (segment_name, criteria)
-        )
-        segment_id = cur.fetchone()[0]
-        conn.commit()
+        with db_cursor() as cur:
+            cur.execute(
+                "INSERT INTO segments (segment_name, criteria) VALUES (%s, %s) RETURNING id;",
+                (segment_name, criteria)
+            )
+            segment_id = cur.fetchone()[0]
+        invalidate_cache("segments")
         return segment_id
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error creating segment: {error}")
-        conn.rollback()
         return None
-    finally:
-        if conn:
-            cur.close()
-            conn.close()
 
-def add_customers_to_segment(segment_id, customer_ids):
-    """Adds customers to a specific segment."""
-    conn = get_db_connection()
-    if conn is None: return False
+# Id lists longer than this are COPYed into a temporary table instead of
+# being sent inline as an array parameter.
+MEMBERSHIP_ARRAY_LIMIT = 10000
+
+def _member_source(cur, customer_ids, where):
+    """Returns (sql, params) for a subquery yielding the selected customer_id column.
+
+    Customers are selected either by a list of ids or by `where`, a trusted
+    (sql, params) predicate over `customers c`. Large id lists are streamed
+    into a temporary table with COPY.
+    """
+    if where is not None:
+        condition, params = where
+        return f"SELECT c.id AS customer_id FROM customers c WHERE {condition}", list(params)
+    customer_ids = list(customer_ids)
+    if len(customer_ids) <= MEMBERSHIP_ARRAY_LIMIT:
+        return "SELECT unnest(%s::integer[]) AS customer_id", [customer_ids]
+    _create_temp_table(cur, "segment_member_ids", "customer_id INTEGER")
+    cur.copy_expert(
+        "COPY segment_member_ids (customer_id) FROM STDIN;",
+        io.StringIO("".join(f"{int(customer_id)}\n" for customer_id in customer_ids))
+    )
+    return "SELECT customer_id FROM segment_member_ids", []
+
+def add_customers_to_segment(segment_id, customer_ids=None, where=None):
+    """Adds customers, given as a list of ids or a `where` predicate, to a segment in one statement."""
     try:
-        cur = conn.cursor()
-        for customer_id in customer_ids:
-            cur.execute(
-                "INSERT INTO customer_segments (customer_id, segment_id) VALUES (%s, %s) ON CONFLICT DO NOTHING;",
-                (customer_id, segment_id)
-            )
-        conn.commit()
+        with db_cursor() as cur:
+            source, params = _member_source(cur, customer_ids, where)
+            cur.execute(f"""
+                INSERT INTO customer_segments (customer_id, segment_id)
+                SELECT src.customer_id, %s FROM ({source}) src
+                ON CONFLICT DO NOTHING;
+            """, [segment_id] + params)
+        invalidate_cache("customer_segments")
         return True
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error adding customers to segment: {error}")
-        conn.rollback()
         return False
-    finally:
-        if conn:
-            cur.close()
-            conn.close()
+
+def remove_customers_from_segment(segment_id, customer_ids=None, where=None):
+    """Removes customers, given as a list of ids or a `where` predicate, from a segment in one statement."""
+    try:
+        with db_cursor() as cur:
+            source, params = _member_source(cur, customer_ids, where)
+            cur.execute(f"""
+                DELETE FROM customer_segments
+                WHERE segment_id = %s AND customer_id IN ({source});
+            """, [segment_id] + params)
+        invalidate_cache("customer_segments")
+        return True
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error removing customers from segment: {error}")
+        return False
+
+def _replace_members(cur, segment_id, customer_ids=None, where=None):
+    source, params = _member_source(cur, customer_ids, where)
+    cur.execute(f"""
+        DELETE FROM customer_segments cs
+        WHERE cs.segment_id = %s
+          AND NOT EXISTS (SELECT 1 FROM ({source}) src WHERE src.customer_id = cs.customer_id);
+    """, [segment_id] + params)
+    cur.execute(f"""
+        INSERT INTO customer_segments (customer_id, segment_id)
+        SELECT src.customer_id, %s FROM ({source}) src
+        ON CONFLICT DO NOTHING;
+    """, [segment_id] + params)
+
+def replace_segment_members(segment_id, customer_ids=None, where=None):
+    """Makes the selected customers the exact membership of a segment.
+
+    Only the difference is written: members no longer selected are deleted
+    and newly selected customers are inserted, in one transaction.
+    """
+    try:
+        with db_cursor() as cur:
+            _replace_members(cur, segment_id, customer_ids, where)
+        invalidate_cache("customer_segments")
+        return True
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error replacing segment members: {error}")
+        return False
+
+# --- Criteria-Driven Segments ---
+
+def count_customers_matching(criteria):
+    """Counts the customers matching segment criteria without fetching them."""
+    try:
+        condition, params = compile_criteria(criteria)
+        return cached_query(f"SELECT COUNT(*) FROM customers c WHERE {condition};", params, ("customers",))[0][0]
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error counting matching customers: {error}")
+        return None
+
+def refresh_segment(segment_id):
+    """Recomputes a segment's membership from its criteria inside the database."""
+    try:
+        with db_cursor() as cur:
+            cur.execute("SELECT criteria FROM segments WHERE id = %s FOR UPDATE;", (segment_id,))
+            row = cur.fetchone()
+            if row is None:
+                raise ValueError(f"segment {segment_id} does not exist")
+            _replace_members(cur, segment_id, where=compile_criteria(row[0]))
+        invalidate_cache("customer_segments")
+        return True
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error refreshing segment: {error}")
+        return False
+
+def refresh_segments():
+    """Recomputes every segment whose criteria are executable; returns how many were refreshed."""
+    try:
+        with db_cursor() as cur:
+            cur.execute("SELECT id, criteria FROM segments ORDER BY id;")
+            segments = cur.fetchall()
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error reading segments: {error}")
+        return 0
+    return sum(
+        1 for segment_id, criteria in segments
+        if is_executable(criteria) and refresh_segment(segment_id)
+    )
+
+def refresh_segments_incremental():
+    """Re-evaluates only customers changed since the last run against every criteria-driven segment.
+
+    Changed customers are consumed from the customer_changes log (filled by
+    triggers on customers), so each change is processed exactly once; changes
+    committed while the job runs are left for the next run. Membership is
+    updated with one DELETE and one INSERT ... SELECT per segment, restricted
+    to the changed customers.
+
+    A segment whose criteria fail in the database is skipped and its id is
+    listed under "failed"; its members are left as they were.
+
+    Returns a dict with the number of changed customers, segments evaluated,
+    memberships added and removed, the failed segment ids and the elapsed
+    seconds, or None on error.
+    """
+    started = time.perf_counter()
+    stats = {"changed_customers": 0, "segments": 0, "added": 0, "removed": 0, "failed": []}
+    try:
+        with db_cursor() as cur:
+            _create_temp_table(cur, "changed_customers", "customer_id INTEGER PRIMARY KEY")
+            cur.execute("""
+                WITH consumed AS (DELETE FROM customer_changes RETURNING customer_id)
+                INSERT INTO changed_customers SELECT DISTINCT customer_id FROM consumed;
+            """)
+            stats["changed_customers"] = cur.rowcount
+            if stats["changed_customers"]:
+                cur.execute("ANALYZE changed_customers;")
+                cur.execute("SELECT id, criteria FROM segments ORDER BY id;")
+                for segment_id, criteria in cur.fetchall():
+                    if not is_executable(criteria):
+                        continue
+                    condition, params = compile_criteria(criteria)
+                    # A segment whose criteria fail at run time is rolled back alone, so the others
+                    # and the consumed changes are still committed
+                    cur.execute("SAVEPOINT refresh_segment;")
+                    try:
+                        cur.execute(f"""
+                            DELETE FROM customer_segments cs
+                            USING changed_customers ch, customers c
+                            WHERE cs.segment_id = %s AND cs.customer_id = ch.customer_id
+                              AND c.id = ch.customer_id AND NOT ({condition});
+                        """, [segment_id] + params)
+                        removed = cur.rowcount
+                        cur.execute(f"""
+                            INSERT INTO customer_segments (customer_id, segment_id)
+                            SELECT c.id, %s FROM changed_customers ch JOIN customers c ON c.id = ch.customer_id
+                            WHERE {condition}
+                            ON CONFLICT DO NOTHING;
+                        """, [segment_id] + params)
+                        added = cur.rowcount
+                    except psycopg2.DatabaseError as error:
+                        cur.execute("ROLLBACK TO SAVEPOINT refresh_segment;")
+                        print(f"Error refreshing segment {segment_id}: {error}")
+                        stats["failed"].append(segment_id)
+                        continue
+                    cur.execute("RELEASE SAVEPOINT refresh_segment;")
+                    stats["removed"] += removed
+                    stats["added"] += added
+                    stats["segments"] += 1
+        if stats["added"] or stats["removed"]:
+            invalidate_cache("customer_segments")
+        stats["seconds"] = time.perf_counter() - started
+        return stats
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error refreshing segments incrementally: {error}")
+        return None
+
+SEGMENT_MEMBERS_SQL = """
+    SELECT s.id, s.segment_name, s.criteria, c.id, c.name
+    FROM segments s
+    LEFT JOIN customer_segments cs ON cs.segment_id = s.id
+    LEFT JOIN customers c ON c.id = cs.customer_id
+    ORDER BY s.id;
+"""
+
+def _group_segments(rows):
+    """Folds SEGMENT_MEMBERS_SQL rows into segment dicts, yielding each segment once its rows are consumed."""
+    segment = None
+    for segment_id, segment_name, criteria, customer_id, customer_name in rows:
+        if segment is None or segment["id"] != segment_id:
+            if segment is not None:
+                yield segment
+            segment = {
+                "id": segment_id,
+                "name": segment_name,
+                "criteria": criteria,
+                "customers": []
+            }
+        if customer_id is not None:
+            segment["customers"].append((customer_id, customer_name))
+    if segment is not None:
+        yield segment
 
 def read_segments():
     """Retrieves all segments and their associated customers."""
-    conn = get_db_connection()
-    if conn is None: return []
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT id, segment_name, criteria FROM segments;")
-        segments_data = cur.fetchall()
-        
-        segments = []
-        for segment_data in segments_data:
-            segment_id = segment_data[0]
-            cur.execute(
-                "SELECT c.id, c.name FROM customers c JOIN customer_segments cs ON c.id = cs.customer_id WHERE cs.segment_id = %s;",
-                (segment_id,)
-            )
-            customers = cur.fetchall()
-            segments.append({
-                "id": segment_id,
-                "name": segment_data[1],
-                "criteria": segment_data[2],
-                "customers": customers
-            })
-        return segments
+    try:
+        rows = cached_query(SEGMENT_MEMBERS_SQL, tables=("segments", "customer_segments", "customers"))
+        return list(_group_segments(rows))
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error reading segments: {error}")
         return []
-    finally:
-        if conn:
-            cur.close()
-            conn.close()
+
+def stream_segments(fetch_size=None):
+    """Yields the segments of read_segments() one at a time, holding only the current segment's customers.
+
+    Rows are fetched `fetch_size` at a time. Prints the error and stops if
+    the query fails.
+    """
+    try:
+        yield from _group_segments(itertools.chain.from_iterable(stream_query(SEGMENT_MEMBERS_SQL, fetch_size=fetch_size)))
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error streaming segments: {error}")
 
 def delete_segment(segment_id):
     """Deletes a segment."""
-    conn = get_db_connection()
-    if conn is None: return False
     try:
-        cur = conn.cursor()
-        cur.execute("DELETE FROM segments WHERE id = %s;", (segment_id,))
-        conn.commit()
+        with db_cursor() as cur:
+            cur.execute("DELETE FROM segments WHERE id = %s;", (segment_id,))
+        invalidate_cache("segments", "customer_segments")
         return True
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error deleting segment: {error}")
-        conn.rollback()
         return False
-    finally:
-        if conn:
-            cur.close()
-            conn.close()
 
 # --- CRUD Operations for Performance Metrics ---
 
-def log_performance_metric(campaign_id, emails_sent, emails_opened, clicks):
-    """Inserts a new performance metric record for a campaign."""
-    conn = get_db_connection()
-    if conn is None: return False
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO performance_metrics (campaign_id, emails_sent, emails_opened, clicks) VALUES (%s, %s, %s, %s);",
-            (campaign_id, emails_sent, emails_opened, clicks)
+ROLLUP_TABLES = {"hour": "performance_rollup_hourly", "day": "performance_rollup_daily"}
+
+def _rollup_upsert_sql(unit, source):
+    """Returns an upsert folding raw metric rows from `source` into the `unit` rollup.
+
+    `source` is a table or parenthesized subquery with campaign_id, timestamp,
+    emails_sent, emails_opened and clicks columns. Rows are pre-aggregated per
+    bucket so each rollup row is touched once per statement. click_entries
+    counts the rows with clicks, the divisor of AVG(clicks).
+    """
+    return f"""
+        INSERT INTO {ROLLUP_TABLES[unit]} AS r (
+            campaign_id, bucket, entries, click_entries, emails_sent, emails_opened, clicks,
+            min_emails_sent, max_emails_sent, min_emails_opened, max_emails_opened, min_clicks, max_clicks
         )
-        conn.commit()
+        SELECT campaign_id, date_trunc('{unit}', timestamp), COUNT(*), COUNT(clicks),
+               COALESCE(SUM(emails_sent), 0), COALESCE(SUM(emails_opened), 0), COALESCE(SUM(clicks), 0),
+               MIN(emails_sent), MAX(emails_sent), MIN(emails_opened), MAX(emails_opened), MIN(clicks), MAX(clicks)
+        FROM {source} src
+        WHERE campaign_id IS NOT NULL
+        GROUP BY 1, 2
+        ON CONFLICT (campaign_id, bucket) DO UPDATE SET
+            entries = r.entries + EXCLUDED.entries,
+            click_entries = r.click_entries + EXCLUDED.click_entries,
+            emails_sent = r.emails_sent + EXCLUDED.emails_sent,
+            emails_opened = r.emails_opened + EXCLUDED.emails_opened,
+            clicks = r.clicks + EXCLUDED.clicks,
+            min_emails_sent = LEAST(r.min_emails_sent, EXCLUDED.min_emails_sent),
+            max_emails_sent = GREATEST(r.max_emails_sent, EXCLUDED.max_emails_sent),
+            min_emails_opened = LEAST(r.min_emails_opened, EXCLUDED.min_emails_opened),
+            max_emails_opened = GREATEST(r.max_emails_opened, EXCLUDED.max_emails_opened),
+            min_clicks = LEAST(r.min_clicks, EXCLUDED.min_clicks),
+            max_clicks = GREATEST(r.max_clicks, EXCLUDED.max_clicks)
+    """
+
+def _channel_rollup_upsert_sql(source):
+    """Returns an upsert folding the channel-attributed rows of `source` into performance_rollup_channel_daily.
+
+    `source` is like in _rollup_upsert_sql() and also has a channel_type_id
+    column; rows without a channel are skipped.
+    """
+    return f"""
+        INSERT INTO performance_rollup_channel_daily AS r (
+            campaign_id, channel_type_id, bucket, entries, emails_sent, emails_opened, clicks
+        )
+        SELECT campaign_id, channel_type_id, date_trunc('day', timestamp), COUNT(*),
+               COALESCE(SUM(emails_sent), 0), COALESCE(SUM(emails_opened), 0), COALESCE(SUM(clicks), 0)
+        FROM {source} src
+        WHERE campaign_id IS NOT NULL AND channel_type_id IS NOT NULL
+        GROUP BY 1, 2, 3
+        ON CONFLICT (campaign_id, channel_type_id, bucket) DO UPDATE SET
+            entries = r.entries + EXCLUDED.entries,
+            emails_sent = r.emails_sent + EXCLUDED.emails_sent,
+            emails_opened = r.emails_opened + EXCLUDED.emails_opened,
+            clicks = r.clicks + EXCLUDED.clicks
+    """
+
+def log_performance_metric(campaign_id, emails_sent, emails_opened, clicks, channel=None):
+    """Inserts a new performance metric record for a campaign and folds it into the rollups.
+
+    `channel` optionally attributes the record to a channel type by name.
+    """
+    try:
+        channel_type_id = None
+        if channel is not None:
+            channel_type_id = _channel_type_ids().get(channel)
+            if channel_type_id is None:
+                raise ValueError(f"unknown channel {channel!r}")
+        with db_cursor() as cur:
+            cur.execute(f"""
+                WITH metric AS (
+                    INSERT INTO performance_metrics (campaign_id, emails_sent, emails_opened, clicks, channel_type_id)
+                    VALUES (%s, %s, %s, %s, %s)
+                    RETURNING campaign_id, channel_type_id, timestamp, emails_sent, emails_opened, clicks
+                ), hourly AS (
+                    {_rollup_upsert_sql("hour", "metric")}
+                ), daily AS (
+                    {_rollup_upsert_sql("day", "metric")}
+                )
+                {_channel_rollup_upsert_sql("metric")};
+            """, (campaign_id, emails_sent, emails_opened, clicks, channel_type_id))
+        invalidate_cache("performance_metrics")
         return True
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error logging performance metric: {error}")
-        conn.rollback()
         return False
-    finally:
-        if conn:
-            cur.close()
-            conn.close()
 
-def get_performance_metrics(campaign_id=None):
-    """Retrieves performance metrics for a specific campaign or all campaigns."""
-    conn = get_db_connection()
-    if conn is None: return []
+def rebuild_performance_rollups():
+    """Recomputes the hourly, daily and per-channel rollups from the raw performance_metrics rows.
+
+    The incremental upserts keep the rollups current, so this is only needed
+    after raw rows are changed or removed outside backend_mar.
+    """
+    try:
+        with db_cursor() as cur:
+            cur.execute(
+                "LOCK TABLE performance_rollup_hourly, performance_rollup_daily, performance_rollup_channel_daily"
+                " IN EXCLUSIVE MODE;"
+            )
+            cur.execute("DELETE FROM performance_rollup_hourly;")
+            cur.execute("DELETE FROM performance_rollup_daily;")
+            cur.execute("DELETE FROM performance_rollup_channel_daily;")
+            cur.execute(_rollup_upsert_sql("hour", "performance_metrics") + ";")
+            cur.execute(_rollup_upsert_sql("day", "performance_metrics") + ";")
+            cur.execute(_channel_rollup_upsert_sql("performance_metrics") + ";")
+        invalidate_cache("performance_metrics")
+        return True
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error rebuilding performance rollups: {error}")
+        return False
+
+# --- Buffered Metric Ingestion ---
+
+INGEST_MAX_BATCH = int(os.getenv("INGEST_MAX_BATCH", "5000"))
+INGEST_MAX_DELAY = float(os.getenv("INGEST_MAX_DELAY", "1.0"))
+INGEST_MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", "100000"))
+INGEST_MAX_RETRIES = 5
+
+def _metric_row(event, channel_type_ids):
+    """Converts an event dict to a (campaign_id, sent, opened, clicks, timestamp, channel_type_id) row.
+
+    An optional "channel" name is resolved through `channel_type_ids`.
+    """
+    timestamp = event.get("timestamp") or datetime.now()
+    if not isinstance(timestamp, datetime):
+        timestamp = datetime.fromisoformat(str(timestamp))
+    channel = event.get("channel")
+    return (
+        int(event["campaign_id"]), int(event.get("emails_sent") or 0),
+        int(event.get("emails_opened") or 0), int(event.get("clicks") or 0), timestamp,
+        channel_type_ids[channel] if channel is not None else None
+    )
+
+def write_metric_batch(rows):
+    """Writes (campaign_id, sent, opened, clicks, timestamp[, channel_type_id]) rows with COPY and updates the rollups.
+
+    The rows are COPYed into a temporary staging table, then moved into
+    performance_metrics and folded into the rollups in one transaction.
+    Rows for campaigns that do not exist are discarded; their count is
+    returned. Errors propagate to the caller.
+    """
+    buffer = io.StringIO()
+    for campaign_id, emails_sent, emails_opened, clicks, timestamp, *channel in rows:
+        channel_type_id = channel[0] if channel and channel[0] is not None else "\\N"
+        buffer.write(f"{campaign_id}\t{emails_sent}\t{emails_opened}\t{clicks}\t{timestamp.isoformat()}\t{channel_type_id}\n")
+    buffer.seek(0)
+    with db_cursor() as cur:
+        _create_temp_table(
+            cur, "metric_batch",
+            "campaign_id INTEGER, emails_sent INTEGER, emails_opened INTEGER, clicks INTEGER, timestamp TIMESTAMP,"
+            " channel_type_id SMALLINT"
+        )
+        cur.copy_expert("COPY metric_batch FROM STDIN;", buffer)
+        cur.execute("DELETE FROM metric_batch b WHERE NOT EXISTS (SELECT 1 FROM campaigns c WHERE c.id = b.campaign_id);")
+        unknown_campaign_rows = cur.rowcount
+        cur.execute(f"""
+            WITH metrics AS (
+                INSERT INTO performance_metrics (campaign_id, emails_sent, emails_opened, clicks, timestamp, channel_type_id)
+                SELECT campaign_id, emails_sent, emails_opened, clicks, timestamp, channel_type_id FROM metric_batch
+            ), hourly AS (
+                {_rollup_upsert_sql("hour", "metric_batch")}
+            ), daily AS (
+                {_rollup_upsert_sql("day", "metric_batch")}
+            )
+            {_channel_rollup_upsert_sql("metric_batch")};
+        """)
+    invalidate_cache("performance_metrics")
+    return unknown_campaign_rows
+
+class MetricIngestor:
+    """Buffers performance metric events and writes them in batches from a background thread.
+
+    A batch is written once `max_batch` events are buffered or the oldest
+    buffered event is `max_delay` seconds old. submit() blocks while
+    `max_pending` events are waiting (backpressure) and gives up after
+    `timeout` seconds. Batches that hit a connection error are retried with
+    backoff; batches the database rejects outright are dropped and counted.
+    close() flushes everything still buffered. `stats` is a snapshot of the
+    event counters.
+    """
+    RETRYABLE_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError, psycopg2.pool.PoolError)
+
+    def __init__(self, max_batch=INGEST_MAX_BATCH, max_delay=INGEST_MAX_DELAY, max_pending=INGEST_MAX_PENDING,
+                 writer=write_metric_batch, channel_types=get_channel_types):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self._writer = writer
+        self._channel_types = channel_types
+        self._buffer = []
+        self._oldest = None
+        self._in_flight = 0
+        self._flush_requested = False
+        self._closing = False
+        self._cond = threading.Condition()
+        self._stats = {"submitted": 0, "written": 0, "rejected": 0, "dropped": 0, "batches": 0, "retries": 0}
+        self._thread = threading.Thread(target=self._run, name="metric-ingestor", daemon=True)
+        self._thread.start()
+
+    @property
+    def stats(self):
+        """Returns a copy of the event counters, taken under the lock."""
+        with self._cond:
+            return dict(self._stats)
+
+    def submit(self, events, timeout=None):
+        """Buffers a batch of event dicts; returns False if backpressure outlasted `timeout`.
+
+        Events need a campaign_id and may carry emails_sent, emails_opened,
+        clicks, a timestamp (defaults to now) and a channel name. Malformed
+        events and unknown channels are skipped and counted as rejected.
+        """
+        rows, rejected = [], 0
+        channel_type_ids = {name: channel_type_id for channel_type_id, name in self._channel_types()}
+        for event in events:
+            try:
+                rows.append(_metric_row(event, channel_type_ids))
+            except (KeyError, TypeError, ValueError):
+                rejected += 1
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._stats["rejected"] += rejected
+            if self._closing:
+                return False
+            while len(self._buffer) + self._in_flight + len(rows) > self.max_pending and (self._buffer or self._in_flight):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            if not self._buffer:
+                self._oldest = time.monotonic()
+            self._buffer.extend(rows)
+            self._stats["submitted"] += len(rows)
+            self._cond.notify_all()
+        return True
+
+    def pending(self):
+        """Returns the number of events buffered or being written."""
+        with self._cond:
+            return len(self._buffer) + self._in_flight
+
+    def flush(self):
+        """Blocks until every event submitted so far has been written or dropped."""
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._buffer or self._in_flight:
+                self._cond.wait()
+
+    def close(self):
+        """Flushes the buffer and stops the background writer."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _next_batch(self):
+        with self._cond:
+            while True:
+                if len(self._buffer) >= self.max_batch or (self._buffer and (self._flush_requested or self._closing)):
+                    break
+                if self._buffer:
+                    remaining = self._oldest + self.max_delay - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                elif self._closing:
+                    return None
+                else:
+                    self._flush_requested = False
+                    self._cond.wait()
+            batch = self._buffer[:self.max_batch]
+            del self._buffer[:self.max_batch]
+            self._in_flight = len(batch)
+            self._oldest = time.monotonic() if self._buffer else None
+            return batch
+
+    def _write(self, batch):
+        delay = 0.1
+        for attempt in range(INGEST_MAX_RETRIES + 1):
+            try:
+                unknown_campaign_rows = self._writer(batch) or 0
+                with self._cond:
+                    self._stats["written"] += len(batch) - unknown_campaign_rows
+                    self._stats["rejected"] += unknown_campaign_rows
+                    self._stats["batches"] += 1
+                return
+            except self.RETRYABLE_ERRORS as error:
+                if attempt == INGEST_MAX_RETRIES:
+                    print(f"Error writing metric batch, giving up after {attempt} retries: {error}")
+                    break
+                with self._cond:
+                    self._stats["retries"] += 1
+                time.sleep(delay)
+                delay = min(delay * 2, 5.0)
+            except (Exception, psycopg2.DatabaseError) as error:
+                print(f"Error writing metric batch: {error}")
+                break
+        with self._cond:
+            self._stats["dropped"] += len(batch)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._write(batch)
+            finally:
+                with self._cond:
+                    self._in_flight = 0
+                    self._cond.notify_all()
+
+_ingestor = None
+_ingestor_lock = threading.Lock()
+
+def get_metric_ingestor():
+    """Returns the process-wide MetricIngestor, starting it on first use.
+
+    It is closed, and therefore flushed, when the interpreter exits.
+    """
+    global _ingestor
+    if _ingestor is None:
+        with _ingestor_lock:
+            if _ingestor is None:
+                _ingestor = MetricIngestor()
+                atexit.register(_ingestor.close)
+    return _ingestor
+
+def ingest_performance_metrics(events, timeout=None):
+    """Queues a batch of metric events for buffered, batched writing; see MetricIngestor.submit()."""
+    return get_metric_ingestor().submit(events, timeout)
+
+def get_campaign_metric_totals():
+    """Retrieves (campaign_id, emails_sent, emails_opened, clicks) totals per campaign from the daily rollup."""
     try:
-        cur = conn.cursor()
+        return cached_query("""
+            SELECT campaign_id, SUM(emails_sent)::bigint, SUM(emails_opened)::bigint, SUM(clicks)::bigint
+            FROM performance_rollup_daily
+            GROUP BY campaign_id
+            ORDER BY campaign_id;
+        """, tables=("performance_metrics",))
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error retrieving campaign metric totals: {error}")
+        return []
+
+MAX_CHART_POINTS = 2000
+ROLLUP_SECONDS = {"hour": 3600, "day": 86400}
+
+def _chart_bucketing(start, end, points):
+    """Returns (source unit or None, aligned start, bucket width in seconds) for a downsampled range.
+
+    Buckets at least an hour (day) wide are whole multiples of it and start on
+    an hour (day) boundary, so they can be summed exactly from that rollup.
+    """
+    start = start.replace(microsecond=0)
+    width = max(1, -(-int((end - start).total_seconds()) // points))
+    for unit in ("day", "hour"):
+        unit_seconds = ROLLUP_SECONDS[unit]
+        if width >= unit_seconds:
+            start = start.replace(minute=0, second=0, microsecond=0)
+            if unit == "day":
+                start = start.replace(hour=0)
+            return unit, start, -(-width // unit_seconds) * unit_seconds
+    return None, start, width
+
+def chart_bounds(start, end, points):
+    """Returns the (start, end) range that get_performance_metrics(start=start, end=end, points=points) charts.
+
+    `start` moves back to its first bucket's boundary; None stays None (from
+    the earliest metric).
+    """
+    if start is None or start >= end:
+        return start, end
+    return _chart_bucketing(start, end, min(max(1, points), MAX_CHART_POINTS))[1], end
+
+def get_performance_metrics(campaign_id=None, start=None, end=None, points=None):
+    """Retrieves performance metrics for a specific campaign or all campaigns.
+
+    Without `points` the raw rows between `start` and `end` are returned.
+    With `points` the range is downsampled in the database into at most that
+    many (capped at MAX_CHART_POINTS) equal time buckets, returned as
+    (bucket_start, emails_sent, emails_opened, clicks) sums; buckets an hour
+    or more wide are read from the rollups instead of the raw rows. `start`
+    defaults to the earliest metric and `end` to the current minute.
+    """
+    try:
+        conditions, params = ["TRUE"], []
         if campaign_id:
-            cur.execute("SELECT * FROM performance_metrics WHERE campaign_id = %s ORDER BY timestamp;", (campaign_id,))
-        else:
-            cur.execute("SELECT * FROM performance_metrics ORDER BY timestamp;")
-        return cur.fetchall()
+            conditions.append("campaign_id = %s")
+            params.append(campaign_id)
+        if points is None:
+            if start is not None:
+                conditions.append("timestamp >= %s")
+                params.append(start)
+            if end is not None:
+                conditions.append("timestamp < %s")
+                params.append(end)
+            return cached_query(
+                f"SELECT * FROM performance_metrics WHERE {' AND '.join(conditions)} ORDER BY timestamp;",
+                params, ("performance_metrics",)
+            )
+
+        if end is None:
+            end = datetime.now().replace(second=0, microsecond=0) + timedelta(minutes=1)
+        if start is None:
+            rows = cached_query(
+                f"SELECT MIN(bucket) FROM performance_rollup_hourly WHERE {' AND '.join(conditions)};",
+                params, ("performance_metrics",)
+            )
+            start = rows[0][0]
+            if start is None:
+                return []
+        if start >= end:
+            return []
+        unit, start, width = _chart_bucketing(start, end, min(max(1, points), MAX_CHART_POINTS))
+        source, column = (ROLLUP_TABLES[unit], "bucket") if unit else ("performance_metrics", "timestamp")
+        return cached_query(f"""
+            SELECT %s + floor(extract(epoch FROM {column} - %s) / %s) * %s * interval '1 second' AS bucket_start,
+                   SUM(emails_sent)::bigint, SUM(emails_opened)::bigint, SUM(clicks)::bigint
+            FROM {source}
+            WHERE {' AND '.join(conditions)} AND {column} >= %s AND {column} < %s
+            GROUP BY 1
+            ORDER BY 1;
+        """, [start, start, width, width] + params + [start, end], ("performance_metrics",))
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error retrieving performance metrics: {error}")
         return []
-    finally:
-        if conn:
-            cur.close()
-            conn.close()
+
+def stream_performance_metrics(campaign_id=None, start=None, end=None, fetch_size=None):
+    """Yields the raw rows of get_performance_metrics() in lists of up to `fetch_size`, without holding them all.
+
+    Suits full-history reads and exports. Prints the error and stops if the
+    query fails.
+    """
+    try:
+        conditions, params = ["TRUE"], []
+        if campaign_id:
+            conditions.append("campaign_id = %s")
+            params.append(campaign_id)
+        if start is not None:
+            conditions.append("timestamp >= %s")
+            params.append(start)
+        if end is not None:
+            conditions.append("timestamp < %s")
+            params.append(end)
+        yield from stream_query(
+            f"SELECT * FROM performance_metrics WHERE {' AND '.join(conditions)} ORDER BY timestamp;", params, fetch_size
+        )
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error streaming performance metrics: {error}")
+
+# --- Columnar Metric Reads ---
+
+class MetricColumns(NamedTuple):
+    """Performance metrics as parallel NumPy arrays, one element per raw row or rollup bucket."""
+    campaign_id: np.ndarray  # int32
+    timestamp: np.ndarray  # datetime64[us]; the bucket start for rollup reads
+    emails_sent: np.ndarray  # int64
+    emails_opened: np.ndarray  # int64
+    clicks: np.ndarray  # int64
+
+# A binary COPY row of read_metric_columns(): a field count, then each field's byte length and big-endian value.
+_COPY_FIELDS = [("campaign_id", ">i4"), ("timestamp", ">i8"), ("emails_sent", ">i8"), ("emails_opened", ">i8"), ("clicks", ">i8")]
+_COPY_ROW_DTYPE = np.dtype(
+    [("field_count", ">i2")] + [field for name, kind in _COPY_FIELDS for field in ((f"{name}_length", ">i4"), (name, kind))]
+)
+_COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+# PostgreSQL's binary timestamps count microseconds from this epoch.
+_PG_EPOCH = np.datetime64("2000-01-01T00:00:00", "us")
+
+def _metric_columns_from_copy(data):
+    """Decodes the output of a binary COPY of read_metric_columns() into MetricColumns."""
+    if bytes(data[:len(_COPY_SIGNATURE)]) != _COPY_SIGNATURE:
+        raise ValueError("not a binary COPY stream")
+    header = len(_COPY_SIGNATURE) + 8 + int.from_bytes(data[len(_COPY_SIGNATURE) + 4:len(_COPY_SIGNATURE) + 8], "big")
+    body = data[header:len(data) - 2]
+    if len(body) % _COPY_ROW_DTYPE.itemsize:
+        raise ValueError("unexpected binary COPY row layout")
+    rows = np.frombuffer(body, dtype=_COPY_ROW_DTYPE)
+    return MetricColumns(
+        rows["campaign_id"].astype(np.int32),
+        _PG_EPOCH + rows["timestamp"].astype(np.int64).astype("timedelta64[us]"),
+        rows["emails_sent"].astype(np.int64),
+        rows["emails_opened"].astype(np.int64),
+        rows["clicks"].astype(np.int64),
+    )
+
+def read_metric_columns(start=None, end=None, campaign_id=None, unit=None):
+    """Reads the performance metrics between `start` and `end` as MetricColumns, in no particular order.
+
+    With `unit` ("hour" or "day") each element is one campaign's rollup bucket
+    instead of a raw row. The rows are streamed with a binary COPY and decoded
+    straight into arrays, without a Python object per value, and the arrays
+    go through the query cache, so they are read-only. Returns None on error.
+    """
+    try:
+        source, column = (ROLLUP_TABLES[unit], "bucket") if unit else ("performance_metrics", "timestamp")
+        conditions, params = ["campaign_id IS NOT NULL"], []
+        if campaign_id:
+            conditions.append("campaign_id = %s")
+            params.append(campaign_id)
+        if start is not None:
+            conditions.append(f"{column} >= %s")
+            params.append(start)
+        if end is not None:
+            conditions.append(f"{column} < %s")
+            params.append(end)
+        sql = f"""
+            COPY (
+                SELECT campaign_id::integer, {column}::timestamp, COALESCE(emails_sent, 0)::bigint,
+                       COALESCE(emails_opened, 0)::bigint, COALESCE(clicks, 0)::bigint
+                FROM {source}
+                WHERE {" AND ".join(conditions)}
+            ) TO STDOUT WITH (FORMAT binary);
+        """
+        # Inside a session the metrics may include its uncommitted writes, so the cache is bypassed
+        use_cache = active_session() is None
+        key = _cache_key(sql, params)
+        hit, columns = _query_cache.get(key) if use_cache else (False, None)
+        if hit:
+            return columns
+        generation = _query_cache.generation(("performance_metrics",))
+        buffer = io.BytesIO()
+        with db_cursor() as cur:
+            cur.copy_expert(cur.mogrify(sql, params).decode(), buffer)
+        columns = _metric_columns_from_copy(buffer.getbuffer())
+        if use_cache:
+            columns = _query_cache.put(key, columns, ("performance_metrics",), generation)
+        return columns
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error reading metric columns: {error}")
+        return None
 
 # --- Business Insights Functions ---
 
 def get_total_campaign_budget():
     """Calculates the total budget of all campaigns."""
-    conn = get_db_connection()
-    if conn is None: return 0
     try:
-        cur = conn.cursor()
-        cur.execute("SELECT SUM(budget) FROM campaigns;")
-        result = cur.fetchone()[0]
+        result = cached_query("SELECT SUM(budget) FROM campaigns;", tables=("campaigns",))[0][0]
         return result if result is not None else 0
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error getting total budget: {error}")
         return 0
-    finally:
-        if conn:
-            cur.close()
-            conn.close()
 
 def get_average_clicks_per_campaign():
     """Calculates the average clicks per campaign."""
-    conn = get_db_connection()
-    if conn is None: return 0
     try:
-        cur = conn.cursor()
-        cur.execute("SELECT AVG(clicks) FROM performance_metrics;")
-        result = cur.fetchone()[0]
+        result = cached_query(
+            "SELECT SUM(clicks)::numeric / NULLIF(SUM(click_entries), 0) FROM performance_rollup_daily;",
+            tables=("performance_metrics",)
+        )[0][0]
         return result if result is not None else 0
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error getting average clicks: {error}")
         return 0
-    finally:
-        if conn:
-            cur.close()
-            conn.close()
-            
+
 def get_most_successful_campaign():
     """Finds the campaign with the highest number of clicks."""
-    conn = get_db_connection()
-    if conn is None: return None
     try:
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT c.name, SUM(pm.clicks) AS total_clicks
+        rows = cached_query("""
+            SELECT c.name, SUM(pm.clicks)::bigint AS total_clicks
             FROM campaigns c
-            JOIN performance_metrics pm ON c.id = pm.campaign_id
-            GROUP BY c.name
-            ORDER BY total_clicks DESC
+            JOIN performance_rollup_daily pm ON c.id = pm.campaign_id
+            GROUP BY c.id
+            ORDER BY total_clicks DESC, c.id
             LIMIT 1;
-        """)
-        return cur.fetchone()
+        """, tables=("campaigns", "performance_metrics"))
+        return rows[0] if rows else None
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error getting most successful campaign: {error}")
         return None
-    finally:
-        if conn:
-            cur.close()
-            conn.close()
 
 def get_campaign_count():
     """Counts the total number of campaigns."""
-    conn = get_db_connection()
-    if conn is None: return 0
     try:
-        cur = conn.cursor()
-        cur.execute("SELECT COUNT(*) FROM campaigns;")
-        return cur.fetchone()[0]
+        return cached_query("SELECT COUNT(*) FROM campaigns;", tables=("campaigns",))[0][0]
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error getting campaign count: {error}")
         return 0
-    finally:
-        if conn:
-            cur.close()
-            conn.close()
 
 def get_max_min_metrics():
     """Gets the max and min values for emails sent, opened, and clicks."""
-    conn = get_db_connection()
-    if conn is None: return {}
     try:
-        cur = conn.cursor()
-        cur.execute("""
+        rows = cached_query("""
             SELECT
-                MAX(emails_sent), MIN(emails_sent),
-                MAX(emails_opened), MIN(emails_opened),
-                MAX(clicks), MIN(clicks)
-            FROM performance_metrics;
-        """)
-        results = cur.fetchone()
-        if results is None:
+                MAX(max_emails_sent), MIN(min_emails_sent),
+                MAX(max_emails_opened), MIN(min_emails_opened),
+                MAX(max_clicks), MIN(min_clicks)
+            FROM performance_rollup_daily;
+        """, tables=("performance_metrics",))
+        if not rows:
             return {}
+        results = rows[0]
         return {
             'max_sent': results[0], 'min_sent': results[1],
             'max_opened': results[2], 'min_opened': results[3],
@@ -441,7 +1939,231 @@ def get_max_min_metrics():
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error getting max/min metrics: {error}")
         return {}
-    finally:
-        if conn:
-            cur.close()
-            conn.close()
\ No newline at end of file
+
+class InsightsSnapshot(NamedTuple):
+    """Every Business Insights figure, computed in one query."""
+    campaign_count: int
+    total_budget: Decimal
+    average_clicks: Decimal
+    max_sent: Optional[int]
+    min_sent: Optional[int]
+    max_opened: Optional[int]
+    min_opened: Optional[int]
+    max_clicks: Optional[int]
+    min_clicks: Optional[int]
+    top_campaign: Optional[str]
+    top_campaign_clicks: Optional[int]
+
+INSIGHTS_SNAPSHOT_SQL = """
+    WITH campaign_totals AS (
+        SELECT COUNT(*) AS campaign_count, COALESCE(SUM(budget), 0) AS total_budget
+        FROM campaigns
+    ), metric_totals AS (
+        SELECT COALESCE(SUM(clicks)::numeric / NULLIF(SUM(click_entries), 0), 0) AS average_clicks,
+               MAX(max_emails_sent), MIN(min_emails_sent),
+               MAX(max_emails_opened), MIN(min_emails_opened),
+               MAX(max_clicks), MIN(min_clicks)
+        FROM performance_rollup_daily
+    ), top_campaign AS (
+        SELECT c.name, SUM(pm.clicks)::bigint AS total_clicks
+        FROM campaigns c
+        JOIN performance_rollup_daily pm ON c.id = pm.campaign_id
+        GROUP BY c.id
+        ORDER BY total_clicks DESC, c.id
+        LIMIT 1
+    )
+    SELECT ct.campaign_count, ct.total_budget, mt.*, tc.name, tc.total_clicks
+    FROM campaign_totals ct
+    CROSS JOIN metric_totals mt
+    LEFT JOIN top_campaign tc ON TRUE;
+"""
+
+def get_insights_snapshot(use_cache=True):
+    """Returns an InsightsSnapshot of all Business Insights figures from one statement, or None on error.
+
+    With `use_cache` the result is served from the query cache until a write
+    to campaigns or performance metrics invalidates it.
+    """
+    try:
+        if use_cache:
+            row = cached_query(INSIGHTS_SNAPSHOT_SQL, tables=("campaigns", "performance_metrics"))[0]
+        else:
+            with db_cursor() as cur:
+                cur.execute(INSIGHTS_SNAPSHOT_SQL)
+                row = cur.fetchone()
+        return InsightsSnapshot(*row)
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error getting insights snapshot: {error}")
+        return None
+
+# --- Channel Analytics ---
+
+class ChannelPerformance(NamedTuple):
+    """Spend and email metrics attributed to one channel type across all campaigns."""
+    channel: str
+    campaigns: int
+    spend: Decimal
+    emails_sent: Decimal
+    emails_opened: Decimal
+    clicks: Decimal
+
+CHANNEL_PERFORMANCE_SQL = """
+    WITH campaign_channels AS (
+        SELECT campaign_id, channel_type_id, COUNT(*) OVER (PARTITION BY campaign_id) AS channel_count
+        FROM channels
+    ), campaign_totals AS (
+        SELECT campaign_id, SUM(emails_sent) AS emails_sent, SUM(emails_opened) AS emails_opened, SUM(clicks) AS clicks
+        FROM performance_rollup_daily
+        WHERE {bucket_filter}
+        GROUP BY campaign_id
+    ), attributed AS (
+        SELECT campaign_id, channel_type_id,
+               SUM(emails_sent) AS emails_sent, SUM(emails_opened) AS emails_opened, SUM(clicks) AS clicks
+        FROM performance_rollup_channel_daily
+        WHERE {bucket_filter}
+        GROUP BY campaign_id, channel_type_id
+    ), unattributed AS (
+        SELECT t.campaign_id,
+               t.emails_sent - COALESCE(SUM(a.emails_sent), 0) AS emails_sent,
+               t.emails_opened - COALESCE(SUM(a.emails_opened), 0) AS emails_opened,
+               t.clicks - COALESCE(SUM(a.clicks), 0) AS clicks
+        FROM campaign_totals t
+        LEFT JOIN attributed a ON a.campaign_id = t.campaign_id
+        GROUP BY t.campaign_id, t.emails_sent, t.emails_opened, t.clicks
+    ), shares AS (
+        SELECT cc.channel_type_id, cc.campaign_id, c.budget / cc.channel_count AS spend,
+               COALESCE(u.emails_sent, 0) / cc.channel_count AS emails_sent,
+               COALESCE(u.emails_opened, 0) / cc.channel_count AS emails_opened,
+               COALESCE(u.clicks, 0) / cc.channel_count AS clicks
+        FROM campaign_channels cc
+        JOIN campaigns c ON c.id = cc.campaign_id
+        LEFT JOIN unattributed u ON u.campaign_id = cc.campaign_id
+        UNION ALL
+        SELECT channel_type_id, campaign_id, 0, emails_sent, emails_opened, clicks
+        FROM attributed
+    )
+    SELECT t.name, COUNT(DISTINCT s.campaign_id),
+           ROUND(COALESCE(SUM(s.spend), 0), 2), ROUND(COALESCE(SUM(s.emails_sent), 0), 2),
+           ROUND(COALESCE(SUM(s.emails_opened), 0), 2), ROUND(COALESCE(SUM(s.clicks), 0), 2)
+    FROM channel_types t
+    LEFT JOIN shares s ON s.channel_type_id = t.id
+    GROUP BY t.id, t.name
+    ORDER BY t.id;
+"""
+
+def get_channel_performance(start=None, end=None):
+    """Retrieves a ChannelPerformance row per channel type, in channel type order.
+
+    Each campaign's budget is split evenly across its channels. Metrics logged
+    with a channel count towards that channel; the rest of a campaign's
+    metrics are split evenly across its channels, and are left out for
+    campaigns without channels. `start` and `end` limit the metrics to the
+    days from start's day up to end, read from the daily rollups.
+    """
+    try:
+        conditions, params = ["TRUE"], []
+        if start is not None:
+            conditions.append("bucket >= date_trunc('day', %s::timestamp)")
+            params.append(start)
+        if end is not None:
+            conditions.append("bucket < %s")
+            params.append(end)
+        bucket_filter = " AND ".join(conditions)
+        rows = cached_query(
+            CHANNEL_PERFORMANCE_SQL.format(bucket_filter=bucket_filter), params + params,
+            ("campaigns", "channels", "channel_types", "performance_metrics")
+        )
+        return [ChannelPerformance(*row) for row in rows]
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error retrieving channel performance: {error}")
+        return []
+
+# --- Campaign Leaderboard ---
+
+class LeaderboardEntry(NamedTuple):
+    """One campaign's place in a leaderboard and the window totals behind it."""
+    rank: int
+    campaign_id: int
+    name: str
+    emails_sent: int
+    emails_opened: int
+    clicks: int
+    spend: float
+    value: float
+
+# Ranking metrics: (SQL over the window totals t and prorated spend s, whether lower ranks first)
+LEADERBOARD_METRICS = {
+    "clicks": ("t.clicks", False),
+    "open_rate": ("100.0 * t.emails_opened / NULLIF(t.emails_sent, 0)", False),
+    "click_through_rate": ("100.0 * t.clicks / NULLIF(t.emails_opened, 0)", False),
+    "cost_per_click": ("s.spend / NULLIF(t.clicks, 0)", True),
+}
+LEADERBOARD_MAX_LIMIT = 100
+
+LEADERBOARD_SQL = """
+    WITH totals AS (
+        SELECT campaign_id, SUM(emails_sent)::bigint AS emails_sent, SUM(emails_opened)::bigint AS emails_opened,
+               SUM(clicks)::bigint AS clicks
+        FROM {source}
+        WHERE {bucket_filter}
+        GROUP BY campaign_id
+    ), scored AS (
+        SELECT c.id, c.name, t.emails_sent, t.emails_opened, t.clicks, s.spend, ({metric})::float8 AS value
+        FROM totals t
+        JOIN campaigns c ON c.id = t.campaign_id
+        CROSS JOIN LATERAL (
+            -- The budget is spread evenly from start_date to the end of end_date, as in kpi_mar
+            SELECT COALESCE(c.budget * GREATEST(extract(epoch FROM
+                       LEAST((c.end_date + 1)::timestamp, %s::timestamp) - GREATEST(c.start_date::timestamp, %s::timestamp)
+                   ), 0) / NULLIF(extract(epoch FROM (c.end_date + 1)::timestamp - c.start_date::timestamp), 0), 0)::float8
+                   AS spend
+        ) s
+    )
+    SELECT RANK() OVER (ORDER BY value {direction}), id, name, emails_sent, emails_opened, clicks, spend, value
+    FROM scored
+    WHERE value IS NOT NULL
+    ORDER BY value {direction}, clicks DESC, id
+    LIMIT %s;
+"""
+
+def _next_bucket(value, unit):
+    """Returns the start of the hour or day (`unit`) bucket after the one holding `value`."""
+    seconds = ROLLUP_SECONDS[unit]
+    elapsed = (value - datetime(1970, 1, 1)).total_seconds()
+    return datetime(1970, 1, 1) + timedelta(seconds=(elapsed // seconds + 1) * seconds)
+
+def get_campaign_leaderboard(metric="clicks", start=None, end=None, limit=10, unit="day"):
+    """Ranks campaigns by `metric` over a time window and returns the top `limit` as LeaderboardEntry rows.
+
+    `metric` is one of LEADERBOARD_METRICS. Campaigns are grouped by id, and
+    campaigns without metrics in the window, or whose metric is undefined
+    (e.g. cost per click without clicks), are left out. Tied campaigns share
+    a rank. Totals are read from the hourly or daily (`unit`) rollups,
+    counting the buckets that start in [start, end), so no view scans the raw
+    metrics, and the result is cached until a metric or campaign write.
+    Spend is the budget share of the window; when `end` is None it runs to
+    the end of the current bucket, so repeated calls share a cache entry.
+    """
+    try:
+        if metric not in LEADERBOARD_METRICS:
+            raise ValueError(f"unknown leaderboard metric {metric!r}")
+        expression, ascending = LEADERBOARD_METRICS[metric]
+        conditions, params = ["campaign_id IS NOT NULL"], []
+        if start is not None:
+            conditions.append("bucket >= %s")
+            params.append(start)
+        if end is not None:
+            conditions.append("bucket < %s")
+            params.append(end)
+        sql = LEADERBOARD_SQL.format(
+            source=ROLLUP_TABLES[unit], bucket_filter=" AND ".join(conditions), metric=expression,
+            direction="ASC" if ascending else "DESC"
+        )
+        spend_end = end if end is not None else _next_bucket(datetime.now(), unit)
+        rows = cached_query(
+            sql, params + [spend_end, start, min(max(1, limit), LEADERBOARD_MAX_LIMIT)], ("campaigns", "performance_metrics")
+        )
+        return [LeaderboardEntry(*row) for row in rows]
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error retrieving campaign leaderboard: {error}")
+        return []
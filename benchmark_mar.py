@@ -0,0 +1,596 @@
+"""Benchmarks for backend_mar against a scratch PostgreSQL database.
+
+The benchmarks use the same DB_* environment variables as the app, e.g.
+
+    DB_NAME=campaigns_bench python benchmark_mar.py n_plus_one --sizes 100 1000 5000
+
+Each benchmark inserts its own rows (names and emails start with "bench-")
+and removes them afterwards, but it should never be pointed at production data.
+"""
+import argparse
+import asyncio
+import itertools
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from psycopg2.extras import execute_values
+
+import async_mar as am
+import backend_mar as bm
+import kpi_mar
+from cache_mar import QueryCache
+from instrument_mar import InstrumentedCursor
+
+BENCH_PREFIX = "bench-"
+
+# --- Round-trip counting ---
+
+class CountingCursor(InstrumentedCursor):
+    """A cursor that counts every statement sent to the server.
+
+    `latency` (seconds, default 0) is slept before each statement to model
+    the network round trip to a remote database.
+    """
+    executes = 0
+    latency = 0.0
+
+    def execute(self, query, vars=None):
+        CountingCursor.executes += 1
+        if CountingCursor.latency:
+            time.sleep(CountingCursor.latency)
+        return super().execute(query, vars)
+
+def install_counting_pool():
+    """Replaces the backend's shared pool with one that counts round trips."""
+    bm.close_pool()
+    bm._pool = bm.ConnectionPool(
+        1, bm.DB_POOL_MAX, cursor_factory=CountingCursor,
+        dbname=bm.DB_NAME, user=bm.DB_USER, password=bm.DB_PASSWORD,
+        host=bm.DB_HOST, port=bm.DB_PORT
+    )
+    # Benchmarks measure the queries themselves, not cache hits.
+    bm._query_cache = QueryCache(ttl=0)
+
+def measure(func, repeat=3):
+    """Runs func `repeat` times; returns (best wall time, round trips per call)."""
+    best = float("inf")
+    for _ in range(repeat):
+        CountingCursor.executes = 0
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best, CountingCursor.executes
+
+# --- Seeding ---
+
+def seed_campaigns(count, channels_per_campaign=2):
+    """Inserts `count` benchmark campaigns with channels; returns their ids."""
+    channel_type_ids = [channel_type_id for channel_type_id, _ in bm.get_channel_types()[:3]]
+    with bm.db_cursor() as cur:
+        rows = execute_values(
+            cur,
+            "INSERT INTO campaigns (name, budget, start_date, end_date, description) VALUES %s RETURNING id;",
+            [(f"{BENCH_PREFIX}campaign-{i}", 1000, "2024-01-01", "2024-12-31", "") for i in range(count)],
+            page_size=1000, fetch=True
+        )
+        campaign_ids = [row[0] for row in rows]
+        execute_values(
+            cur,
+            "INSERT INTO channels (campaign_id, channel_type_id) VALUES %s;",
+            [(cid, channel_type_ids[j % len(channel_type_ids)]) for cid in campaign_ids for j in range(channels_per_campaign)],
+            page_size=1000
+        )
+    return campaign_ids
+
+def seed_customers(count):
+    """Inserts `count` benchmark customers; returns their ids."""
+    with bm.db_cursor() as cur:
+        rows = execute_values(
+            cur,
+            "INSERT INTO customers (name, email, demographics) VALUES %s RETURNING id;",
+            [(f"{BENCH_PREFIX}customer-{i}", f"{BENCH_PREFIX}{i}@example.com", "{}") for i in range(count)],
+            page_size=1000, fetch=True
+        )
+    return [row[0] for row in rows]
+
+def seed_segments(count, customers_per_segment=10):
+    """Inserts `count` benchmark segments, each with its own customers."""
+    customer_ids = seed_customers(count * customers_per_segment)
+    with bm.db_cursor() as cur:
+        rows = execute_values(
+            cur,
+            "INSERT INTO segments (segment_name, criteria) VALUES %s RETURNING id;",
+            [(f"{BENCH_PREFIX}segment-{i}", "") for i in range(count)],
+            page_size=1000, fetch=True
+        )
+        segment_ids = [row[0] for row in rows]
+        execute_values(
+            cur,
+            "INSERT INTO customer_segments (customer_id, segment_id) VALUES %s;",
+            [(customer_id, segment_ids[i // customers_per_segment]) for i, customer_id in enumerate(customer_ids)],
+            page_size=1000
+        )
+    return segment_ids
+
+def cleanup():
+    """Removes every row created by the benchmarks."""
+    with bm.db_cursor() as cur:
+        cur.execute("DELETE FROM campaigns WHERE name LIKE %s;", (BENCH_PREFIX + "%",))
+        cur.execute("DELETE FROM segments WHERE segment_name LIKE %s;", (BENCH_PREFIX + "%",))
+        cur.execute("DELETE FROM customers WHERE email LIKE %s;", (BENCH_PREFIX + "%",))
+
+# --- Benchmarks ---
+
+def _read_campaigns_n_plus_one():
+    """The original read_campaigns(): one channel query per campaign."""
+    with bm.db_cursor() as cur:
+        cur.execute("SELECT * FROM campaigns;")
+        for campaign in cur.fetchall():
+            cur.execute(
+                "SELECT t.name FROM channels ch JOIN channel_types t ON t.id = ch.channel_type_id WHERE ch.campaign_id = %s;",
+                (campaign[0],)
+            )
+            cur.fetchall()
+
+def _read_segments_n_plus_one():
+    """The original read_segments(): one customer join per segment."""
+    with bm.db_cursor() as cur:
+        cur.execute("SELECT id, segment_name, criteria FROM segments;")
+        for segment in cur.fetchall():
+            cur.execute(
+                "SELECT c.id, c.name FROM customers c JOIN customer_segments cs ON c.id = cs.customer_id WHERE cs.segment_id = %s;",
+                (segment[0],)
+            )
+            cur.fetchall()
+
+def bench_n_plus_one(sizes):
+    """Compares the per-row and set-based campaign/segment reads."""
+    cases = [
+        ("read_campaigns", seed_campaigns, _read_campaigns_n_plus_one, bm.read_campaigns),
+        ("read_segments", seed_segments, _read_segments_n_plus_one, bm.read_segments),
+    ]
+    print(f"{'function':<16}{'rows':>8}{'before trips':>14}{'before ms':>11}{'after trips':>13}{'after ms':>10}")
+    for name, seed, before, after in cases:
+        for size in sizes:
+            try:
+                seed(size)
+                before_time, before_trips = measure(before)
+                after_time, after_trips = measure(after)
+                print(f"{name:<16}{size:>8}{before_trips:>14}{before_time * 1000:>11.1f}{after_trips:>13}{after_time * 1000:>10.1f}")
+            finally:
+                cleanup()
+
+def _add_customers_to_segment_row_by_row(segment_id, customer_ids):
+    """The original add_customers_to_segment(): one INSERT per customer."""
+    with bm.db_cursor() as cur:
+        for customer_id in customer_ids:
+            cur.execute(
+                "INSERT INTO customer_segments (customer_id, segment_id) VALUES (%s, %s) ON CONFLICT DO NOTHING;",
+                (customer_id, segment_id)
+            )
+
+def bench_membership(sizes, legacy_max):
+    """Reports membership write throughput for the row-by-row and set-based paths."""
+    print(f"{'operation':<28}{'rows':>9}{'trips':>7}{'ms':>10}{'rows/s':>12}")
+
+    def report(operation, size, func):
+        CountingCursor.executes = 0
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        print(f"{operation:<28}{size:>9}{CountingCursor.executes:>7}{elapsed * 1000:>10.1f}{size / elapsed:>12,.0f}")
+
+    for size in sizes:
+        try:
+            customer_ids = seed_customers(size)
+            segment_id = bm.create_segment(f"{BENCH_PREFIX}membership", "")
+            if size <= legacy_max:
+                report("row-by-row add", size, lambda: _add_customers_to_segment_row_by_row(segment_id, customer_ids))
+                bm.remove_customers_from_segment(segment_id, customer_ids)
+            report("add (id list)", size, lambda: bm.add_customers_to_segment(segment_id, customer_ids))
+            report("remove (id list)", size, lambda: bm.remove_customers_from_segment(segment_id, customer_ids))
+            where = ("c.email LIKE %s", [BENCH_PREFIX + "%"])
+            report("add (where)", size, lambda: bm.add_customers_to_segment(segment_id, where=where))
+            half = customer_ids[: size // 2]
+            report("replace (half of members)", size, lambda: bm.replace_segment_members(segment_id, half))
+        finally:
+            cleanup()
+
+def bench_ingest(events, producers, chunk, max_batch, legacy_events):
+    """Reports sustained events/s for buffered ingestion versus one log_performance_metric() call per event."""
+    try:
+        campaign_ids = seed_campaigns(20)
+        started = time.perf_counter()
+        for i in range(legacy_events):
+            bm.log_performance_metric(campaign_ids[i % len(campaign_ids)], 100, 20, 3)
+        legacy_elapsed = time.perf_counter() - started
+
+        ingestor = bm.MetricIngestor(max_batch=max_batch, max_pending=max_batch * 20)
+        per_producer = events // producers
+
+        def produce(offset):
+            for start in range(0, per_producer, chunk):
+                ingestor.submit([
+                    {"campaign_id": campaign_ids[(offset + i) % len(campaign_ids)],
+                     "emails_sent": 100, "emails_opened": 20, "clicks": 3}
+                    for i in range(start, min(start + chunk, per_producer))
+                ])
+
+        threads = [threading.Thread(target=produce, args=(n,)) for n in range(producers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        ingestor.close()
+        elapsed = time.perf_counter() - started
+        stats = ingestor.stats
+
+        print(f"{'writer':<34}{'events':>10}{'seconds':>10}{'events/s':>12}")
+        print(f"{'log_performance_metric per event':<34}{legacy_events:>10}{legacy_elapsed:>10.2f}{legacy_events / legacy_elapsed:>12,.0f}")
+        print(f"{f'MetricIngestor ({producers} producers)':<34}{stats['written']:>10}{elapsed:>10.2f}{stats['written'] / elapsed:>12,.0f}")
+        print(f"batches: {stats['batches']}, dropped: {stats['dropped']}, retries: {stats['retries']}")
+    finally:
+        cleanup()
+
+def _update_campaign_delete_reinsert(campaign):
+    """The original update_campaign(): rewrite the row, delete every channel and insert each one again."""
+    with bm.db_cursor() as cur:
+        cur.execute(
+            "UPDATE campaigns SET name = %s, budget = %s, start_date = %s, end_date = %s, description = %s WHERE id = %s;",
+            (campaign["name"], campaign["budget"], campaign["start_date"], campaign["end_date"], campaign["description"], campaign["id"])
+        )
+        cur.execute("DELETE FROM channels WHERE campaign_id = %s;", (campaign["id"],))
+        for channel in campaign["channels"]:
+            cur.execute(
+                "INSERT INTO channels (campaign_id, channel_type_id) SELECT %s, id FROM channel_types WHERE name = %s;",
+                (campaign["id"], channel)
+            )
+
+def _max_channel_id():
+    with bm.db_cursor() as cur:
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM channels;")
+        return cur.fetchone()[0]
+
+def bench_campaign_updates(campaigns, repeat):
+    """Compares delete-and-reinsert channel updates with delta and bulk updates when nothing changed."""
+    try:
+        campaign_ids = set(seed_campaigns(campaigns, channels_per_campaign=3))
+        rows = [campaign for campaign in bm.read_campaigns() if campaign["id"] in campaign_ids]
+        with bm.db_cursor() as cur:
+            cur.execute("ANALYZE channels;")
+        fields = ("id", "name", "budget", "start_date", "end_date", "description", "channels")
+        cases = [
+            ("delete + re-insert per campaign", lambda: [_update_campaign_delete_reinsert(row) for row in rows]),
+            ("update_campaign per campaign", lambda: [bm.update_campaign(*(row[f] for f in fields)) for row in rows]),
+            ("update_campaigns (bulk)", lambda: bm.update_campaigns(rows)),
+        ]
+        print(f"{'path':<34}{'campaigns':>10}{'trips':>8}{'ms':>10}{'channel rows rewritten':>24}")
+        for name, func in cases:
+            before = _max_channel_id()
+            elapsed, trips = measure(func, repeat)
+            # Every rewrite inserts a new row with a fresh serial id.
+            rewritten = (_max_channel_id() - before) // repeat
+            print(f"{name:<34}{campaigns:>10}{trips:>8}{elapsed * 1000:>10.1f}{rewritten:>24}")
+    finally:
+        cleanup()
+
+def _onboarding_flow(customer_ids, metrics, batched=False):
+    """Creates a campaign and a segment, attaches the customers and logs the campaign's first metrics."""
+    name = f"{BENCH_PREFIX}onboarding-{next(_onboarding_names)}"
+    campaign_id = bm.create_campaign(name, 1000, date(2024, 1, 1), date(2024, 12, 31), "", ["Email"])
+    segment_id = bm.create_segment(name, "")
+    bm.add_customers_to_segment(segment_id, customer_ids)
+    if batched:
+        now = datetime.now()
+        bm.write_metric_batch([(campaign_id, 100, 20, i % 7, now) for i in range(metrics)])
+    else:
+        for i in range(metrics):
+            bm.log_performance_metric(campaign_id, 100, 20, i % 7)
+
+_onboarding_names = itertools.count()
+
+def _in_session(flow):
+    with bm.session():
+        flow()
+
+def bench_unit_of_work(customers, metrics, repeat):
+    """Compares a multi-step onboarding flow committed step by step with the same flow in one session."""
+    try:
+        customer_ids = seed_customers(customers)
+        cases = [
+            ("separate transactions", lambda: _onboarding_flow(customer_ids, metrics)),
+            ("one session", lambda: _in_session(lambda: _onboarding_flow(customer_ids, metrics))),
+            ("one session, batched metrics", lambda: _in_session(lambda: _onboarding_flow(customer_ids, metrics, True))),
+        ]
+        print(f"{'path':<32}{'customers':>10}{'metrics':>9}{'trips':>7}{'ms':>10}")
+        for name, func in cases:
+            elapsed, trips = measure(func, repeat)
+            print(f"{name:<32}{customers:>10}{metrics:>9}{trips:>7}{elapsed * 1000:>10.1f}")
+    finally:
+        cleanup()
+
+LEADERBOARD_SCAN_SQL = """
+    SELECT c.id, c.name, SUM(m.clicks) AS clicks
+    FROM performance_metrics m
+    JOIN campaigns c ON c.id = m.campaign_id
+    WHERE m.timestamp >= %s AND m.timestamp < %s
+    GROUP BY c.id
+    ORDER BY clicks DESC, c.id
+    LIMIT 10;
+"""
+
+def bench_leaderboard(campaigns, metrics_per_campaign, repeat):
+    """Compares ranking campaigns by clicks from the raw metrics with get_campaign_leaderboard() on the rollups."""
+    try:
+        campaign_ids = seed_campaigns(campaigns)
+        now = datetime.now()
+        bm.write_metric_batch([
+            (campaign_id, 100, 20, i % 7, now - timedelta(hours=i))
+            for campaign_id in campaign_ids for i in range(metrics_per_campaign)
+        ])
+        # Both paths should be planned with the seeded row counts
+        with bm.db_cursor() as cur:
+            cur.execute("ANALYZE performance_metrics, performance_rollup_hourly, performance_rollup_daily;")
+
+        def raw_scan(start, end):
+            with bm.db_cursor() as cur:
+                cur.execute(LEADERBOARD_SCAN_SQL, (start, end))
+                return cur.fetchall()
+
+        print(f"{'path':<36}{'window':>10}{'trips':>7}{'ms':>10}")
+        for period in (timedelta(days=7), timedelta(days=365)):
+            _, end, unit = kpi_mar.kpi_window(period, now)
+            start = end - period
+            for name, func in [
+                ("raw metrics scan", lambda: raw_scan(start, end)),
+                (f"leaderboard ({unit} rollup)", lambda: bm.get_campaign_leaderboard("clicks", start, end, unit=unit)),
+            ]:
+                elapsed, trips = measure(func, repeat)
+                print(f"{name:<36}{period.days:>9}d{trips:>7}{elapsed * 1000:>10.2f}")
+        bm._query_cache, uncached = QueryCache(), bm._query_cache
+        try:
+            bm.get_campaign_leaderboard("clicks", start, end, unit=unit)
+            elapsed, trips = measure(lambda: bm.get_campaign_leaderboard("clicks", start, end, unit=unit), repeat)
+            print(f"{'leaderboard (cache hit)':<36}{period.days:>9}d{trips:>7}{elapsed * 1000:>10.2f}")
+        finally:
+            bm._query_cache = uncached
+    finally:
+        cleanup()
+
+def _insights_five_calls():
+    """The original Business Insights page: one query per figure."""
+    bm.get_campaign_count()
+    bm.get_total_campaign_budget()
+    bm.get_average_clicks_per_campaign()
+    bm.get_max_min_metrics()
+    bm.get_most_successful_campaign()
+
+def bench_insights(campaigns, metrics_per_campaign, repeat):
+    """Compares the five-call Business Insights path with get_insights_snapshot()."""
+    try:
+        campaign_ids = seed_campaigns(campaigns)
+        now = datetime.now()
+        bm.write_metric_batch([
+            (campaign_id, 100, 20, i % 7, now - timedelta(hours=i))
+            for campaign_id in campaign_ids for i in range(metrics_per_campaign)
+        ])
+        cached = QueryCache()
+        print(f"{'path':<30}{'trips':>7}{'ms':>10}")
+        for name, func in [
+            ("five calls", _insights_five_calls),
+            ("snapshot", lambda: bm.get_insights_snapshot(use_cache=False)),
+        ]:
+            elapsed, trips = measure(func, repeat)
+            print(f"{name:<30}{trips:>7}{elapsed * 1000:>10.2f}")
+        bm._query_cache, uncached = cached, bm._query_cache
+        try:
+            bm.get_insights_snapshot()
+            elapsed, trips = measure(bm.get_insights_snapshot, repeat)
+            print(f"{'snapshot (cache hit)':<30}{trips:>7}{elapsed * 1000:>10.2f}")
+        finally:
+            bm._query_cache = uncached
+    finally:
+        cleanup()
+
+def bench_async_page(campaigns, metrics_per_campaign, segments, repeat, latency_ms):
+    """Compares loading a dashboard's data one query at a time with async_mar.gather_page_data().
+
+    The chart shows one campaign, as when a campaign is selected, so no single
+    query dominates the page. `latency_ms` adds a simulated round trip to
+    every statement; gathering should bring the page from about the sum of
+    its queries down to about the slowest one.
+    """
+    CountingCursor.latency = latency_ms / 1000
+    try:
+        campaign_ids = seed_campaigns(campaigns)
+        seed_segments(segments, 50)
+        now = datetime.now()
+        bm.write_metric_batch([
+            (campaign_id, 100, 20, i % 7, now - timedelta(hours=i))
+            for campaign_id in campaign_ids for i in range(metrics_per_campaign)
+        ])
+        with bm.db_cursor() as cur:
+            cur.execute("ANALYZE;")
+        queries = {
+            "read_campaigns": (bm.read_campaigns, ()),
+            "get_campaign_metric_totals": (bm.get_campaign_metric_totals, ()),
+            "get_performance_metrics": (bm.get_performance_metrics, (campaign_ids[0], now - timedelta(days=30), now, 500)),
+            "get_insights_snapshot": (bm.get_insights_snapshot, (False,)),
+            "read_segments": (bm.read_segments, ()),
+        }
+        print(f"{'load':<30}{'ms':>10}")
+        query_times = {}
+        for name, (func, args) in queries.items():
+            query_times[name], _ = measure(lambda: func(*args), repeat)
+            print(f"{name:<30}{query_times[name] * 1000:>10.1f}")
+        print(f"{'sum of queries':<30}{sum(query_times.values()) * 1000:>10.1f}")
+        print(f"{'max of queries':<30}{max(query_times.values()) * 1000:>10.1f}")
+
+        def sequential():
+            for func, args in queries.values():
+                func(*args)
+
+        def gathered():
+            asyncio.run(am.gather_page_data({
+                name: getattr(am, func.__name__)(*args) for name, (func, args) in queries.items()
+            }))
+
+        gathered()
+        for name, func in [("sequential page load", sequential), ("gathered page load", gathered)]:
+            elapsed, _ = measure(func, repeat)
+            print(f"{name:<30}{elapsed * 1000:>10.1f}")
+    finally:
+        CountingCursor.latency = 0.0
+        am.shutdown_executor()
+        cleanup()
+
+def _synthetic_metric_columns(rows, campaigns, days, end, seed):
+    """Returns `rows` seeded random metrics of campaigns 1..`campaigns` over `days` days before `end`."""
+    rng = np.random.default_rng(seed)
+    emails_sent = rng.integers(50, 5000, rows)
+    emails_opened = (emails_sent * rng.uniform(0.05, 0.6, rows)).astype(np.int64)
+    return bm.MetricColumns(
+        rng.integers(1, campaigns + 1, rows, dtype=np.int32),
+        np.datetime64(end, "us") - rng.integers(1, days * 86400 * 10**6, rows).astype("timedelta64[us]"),
+        emails_sent, emails_opened, (emails_opened * rng.uniform(0.01, 0.3, rows)).astype(np.int64),
+    )
+
+def _pandas_campaign_kpis(frame, end, period):
+    """The DataFrame path kpi_mar replaces: filter, groupby and rate columns per period, then the changes."""
+    def period_kpis(start, stop):
+        rows = frame[(frame["timestamp"] >= start) & (frame["timestamp"] < stop)]
+        kpis = rows.groupby("campaign_id")[["emails_sent", "emails_opened", "clicks"]].sum()
+        kpis["open_rate"] = (kpis["emails_opened"] / kpis["emails_sent"] * 100).fillna(0)
+        kpis["click_through_rate"] = (kpis["clicks"] / kpis["emails_opened"] * 100).fillna(0)
+        return kpis
+
+    current = period_kpis(end - period, end)
+    previous = period_kpis(end - 2 * period, end - period).reindex(current.index, fill_value=0)
+    return current.join(current - previous, rsuffix="_change")
+
+def bench_kpis(rows, campaigns, tuple_rows, db_rows, repeat):
+    """Compares pandas groupby with kpi_mar's vectorized KPIs in memory, then tuple vs columnar reads."""
+    end, period = datetime(2025, 1, 1), timedelta(days=7)
+    columns = _synthetic_metric_columns(rows, campaigns, 14, end, seed=42)
+    campaign_rows = [
+        {"id": i, "name": f"{BENCH_PREFIX}{i}", "budget": 1000, "start_date": date(2024, 12, 1), "end_date": date(2025, 1, 31)}
+        for i in range(1, campaigns + 1)
+    ]
+    frame = pd.DataFrame(columns._asdict())
+    kpis = kpi_mar.compute_campaign_kpis(columns, campaign_rows, end, period)
+    expected = _pandas_campaign_kpis(frame, end, period)
+    if not np.array_equal(kpis["clicks"][expected.index - 1], expected["clicks"].to_numpy()):
+        raise RuntimeError("kpi_mar and pandas disagree on clicks")
+
+    print(f"{'path':<46}{'rows':>12}{'ms':>10}")
+    tuples = list(zip(*(column[:tuple_rows].tolist() for column in columns)))
+    for name, count, func in [
+        ("pandas from tuples + groupby", len(tuples), lambda: _pandas_campaign_kpis(
+            pd.DataFrame(tuples, columns=list(bm.MetricColumns._fields)), end, period)),
+        ("pandas groupby", rows, lambda: _pandas_campaign_kpis(frame, end, period)),
+        ("kpi_mar.compute_campaign_kpis", rows, lambda: kpi_mar.compute_campaign_kpis(columns, campaign_rows, end, period)),
+    ]:
+        elapsed, _ = measure(func, repeat)
+        print(f"{name:<46}{count:>12,}{elapsed * 1000:>10.1f}")
+    del tuples, frame
+
+    if not db_rows:
+        return
+    try:
+        campaign_ids = seed_campaigns(campaigns)
+        db_columns = _synthetic_metric_columns(db_rows, len(campaign_ids), 14, end, seed=7)
+        bm.write_metric_batch(zip(
+            np.array(campaign_ids)[db_columns.campaign_id - 1].tolist(), db_columns.emails_sent.tolist(),
+            db_columns.emails_opened.tolist(), db_columns.clicks.tolist(), db_columns.timestamp.astype(datetime).tolist()
+        ))
+        start = end - 2 * period
+        for name, func in [
+            ("get_performance_metrics (tuples)", lambda: bm.get_performance_metrics(None, start, end)),
+            ("read_metric_columns (binary COPY)", lambda: bm.read_metric_columns(start, end)),
+            ("read_metric_columns (hourly rollup)", lambda: bm.read_metric_columns(start, end, unit="hour")),
+        ]:
+            elapsed, trips = measure(func, repeat)
+            print(f"{name:<46}{db_rows:>12,}{elapsed * 1000:>10.1f}")
+    finally:
+        cleanup()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    n_plus_one = subparsers.add_parser("n_plus_one", help="per-row vs set-based reads in read_campaigns/read_segments")
+    n_plus_one.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+
+    membership = subparsers.add_parser("membership", help="bulk segment membership writes")
+    membership.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 500000])
+    membership.add_argument("--legacy-max", type=int, default=20000,
+                            help="largest size to also run the row-by-row writer for")
+
+    ingest = subparsers.add_parser("ingest", help="buffered metric ingestion throughput")
+    ingest.add_argument("--events", type=int, default=500000)
+    ingest.add_argument("--producers", type=int, default=4)
+    ingest.add_argument("--chunk", type=int, default=500, help="events per submit() call")
+    ingest.add_argument("--max-batch", type=int, default=bm.INGEST_MAX_BATCH)
+    ingest.add_argument("--legacy-events", type=int, default=2000)
+
+    insights = subparsers.add_parser("insights", help="five-call Business Insights vs get_insights_snapshot()")
+    insights.add_argument("--campaigns", type=int, default=1000)
+    insights.add_argument("--metrics-per-campaign", type=int, default=200)
+    insights.add_argument("--repeat", type=int, default=20)
+
+    campaign_updates = subparsers.add_parser("campaign_updates", help="channel rewrites vs delta and bulk campaign updates")
+    campaign_updates.add_argument("--campaigns", type=int, default=1000)
+    campaign_updates.add_argument("--repeat", type=int, default=3)
+
+    async_page = subparsers.add_parser("async_page", help="sequential vs gathered dashboard data loading")
+    async_page.add_argument("--campaigns", type=int, default=2000)
+    async_page.add_argument("--metrics-per-campaign", type=int, default=200)
+    async_page.add_argument("--segments", type=int, default=200)
+    async_page.add_argument("--repeat", type=int, default=5)
+    async_page.add_argument("--latency-ms", type=float, default=0, help="simulated round trip added to every statement")
+
+    kpis = subparsers.add_parser("kpis", help="pandas groupby vs vectorized campaign KPIs, tuple vs columnar reads")
+    kpis.add_argument("--rows", type=int, default=10000000, help="in-memory metric rows")
+    kpis.add_argument("--campaigns", type=int, default=1000)
+    kpis.add_argument("--tuple-rows", type=int, default=1000000,
+                      help="rows for the list-of-tuples DataFrame path, which needs far more memory")
+    kpis.add_argument("--db-rows", type=int, default=200000, help="metric rows to write for the read comparison (0 skips it)")
+    kpis.add_argument("--repeat", type=int, default=3)
+
+    unit_of_work = subparsers.add_parser("unit_of_work", help="step-by-step commits vs one session for a multi-step flow")
+    unit_of_work.add_argument("--customers", type=int, default=10000)
+    unit_of_work.add_argument("--metrics", type=int, default=50, help="initial metrics logged for the new campaign")
+    unit_of_work.add_argument("--repeat", type=int, default=5)
+
+    leaderboard = subparsers.add_parser("leaderboard", help="campaign ranking from raw metrics vs the rollup leaderboard")
+    leaderboard.add_argument("--campaigns", type=int, default=1000)
+    leaderboard.add_argument("--metrics-per-campaign", type=int, default=500)
+    leaderboard.add_argument("--repeat", type=int, default=10)
+
+    args = parser.parse_args()
+    install_counting_pool()
+    if args.benchmark == "n_plus_one":
+        bench_n_plus_one(args.sizes)
+    elif args.benchmark == "membership":
+        bench_membership(args.sizes, args.legacy_max)
+    elif args.benchmark == "ingest":
+        bench_ingest(args.events, args.producers, args.chunk, args.max_batch, args.legacy_events)
+    elif args.benchmark == "insights":
+        bench_insights(args.campaigns, args.metrics_per_campaign, args.repeat)
+    elif args.benchmark == "campaign_updates":
+        bench_campaign_updates(args.campaigns, args.repeat)
+    elif args.benchmark == "async_page":
+        bench_async_page(args.campaigns, args.metrics_per_campaign, args.segments, args.repeat, args.latency_ms)
+    elif args.benchmark == "kpis":
+        bench_kpis(args.rows, args.campaigns, args.tuple_rows, args.db_rows, args.repeat)
+    elif args.benchmark == "unit_of_work":
+        bench_unit_of_work(args.customers, args.metrics, args.repeat)
+    elif args.benchmark == "leaderboard":
+        bench_leaderboard(args.campaigns, args.metrics_per_campaign, args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""An in-process TTL + LRU cache for backend_mar query results.
+
+Every entry is tagged with the tables its query reads. Writes invalidate by
+table, so only entries that depend on a changed table are dropped; the TTL
+bounds staleness from writes made by other processes. The cache is bounded
+both by entry count and by the estimated bytes of its results, and a result
+larger than the whole byte budget (a big table read in full) is not stored.
+
+Cached results are shared by every caller and must be treated as read-only:
+put() freezes a result once (lists become tuples and NumPy arrays read-only)
+and get() returns that same object without copying it.
+"""
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "60"))
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "256"))
+QUERY_CACHE_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Items measured per sequence by estimate_size()
+SIZE_SAMPLE = 32
+
+_CONTAINERS = (list, tuple, np.ndarray)
+
+def freeze(value):
+    """Returns `value` with its lists turned into tuples and its NumPy arrays made read-only, recursively.
+
+    Named tuples keep their type. Dicts and other objects are returned as they
+    are, so callers must not change them either.
+    """
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+        return value
+    if isinstance(value, tuple) and hasattr(value, "_fields"):
+        return type(value)._make(map(freeze, value))
+    # Most query rows hold only scalars and are kept as they are
+    if isinstance(value, tuple) and not any(isinstance(item, _CONTAINERS) for item in value):
+        return value
+    if isinstance(value, (list, tuple)):
+        return tuple(map(freeze, value))
+    return value
+
+def estimate_size(value):
+    """Estimates the memory held by a query result in bytes.
+
+    NumPy arrays count their buffer. Long sequences are measured from up to
+    SIZE_SAMPLE evenly spaced items, so a large result costs no more to
+    measure than a small one.
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        size = sys.getsizeof(value)
+        if not value:
+            return size
+        sample = value[::max(1, len(value) // SIZE_SAMPLE)]
+        return size + sum(map(estimate_size, sample)) * len(value) // len(sample)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    return sys.getsizeof(value)
+
+class QueryCache:
+    """A thread-safe LRU mapping of query keys to results with per-table invalidation.
+
+    Each table has a generation counter that invalidate() bumps. A result is
+    only stored if none of its tables changed while it was being computed, so
+    a read racing a write can never repopulate the cache with stale rows.
+
+    Least recently used entries are evicted once there are more than
+    `max_entries` or their estimated sizes add up to more than `max_bytes`.
+    """
+
+    def __init__(self, ttl=QUERY_CACHE_TTL, max_entries=QUERY_CACHE_MAX_ENTRIES, max_bytes=QUERY_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._bytes = 0
+        self._entries = OrderedDict()
+        self._by_table = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0, "oversized": 0}
+
+    def generation(self, tables):
+        """Returns a token describing the current state of `tables`."""
+        with self._lock:
+            return tuple(self._generations.get(table, 0) for table in tables)
+
+    def get(self, key):
+        """Returns (True, the frozen value) on a fresh hit, else (False, None)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return True, entry[1]
+            if entry is not None:
+                self._remove(key)
+            self.stats["misses"] += 1
+            return False, None
+
+    def put(self, key, value, tables, generation):
+        """Stores a value computed when `tables` were at `generation` and returns it frozen.
+
+        The caller should hand out the returned value, so a miss sees the
+        same read-only result as later hits. A TTL of 0 disables storing,
+        and results estimated above `max_bytes` are returned without being
+        stored.
+        """
+        value = freeze(value)
+        if self.ttl <= 0:
+            return value
+        size = estimate_size(value)
+        with self._lock:
+            if generation != tuple(self._generations.get(table, 0) for table in tables):
+                return value
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                self.stats["oversized"] += 1
+                return value
+            self._entries[key] = (time.monotonic() + self.ttl, value, tables, size)
+            self._bytes += size
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+        return value
+
+    def invalidate(self, *tables):
+        """Drops every entry that read any of `tables`."""
+        with self._lock:
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+                for key in list(self._by_table.pop(table, ())):
+                    if key in self._entries:
+                        self._remove(key)
+                        self.stats["invalidations"] += 1
+
+    def clear(self):
+        """Drops every entry."""
+        with self._lock:
+            for table in list(self._by_table):
+                self._generations[table] = self._generations.get(table, 0) + 1
+            self._entries.clear()
+            self._by_table.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, _, tables, size = self._entries.pop(key)
+        self._bytes -= size
+        for table in tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+
+    def snapshot(self):
+        """Returns the hit/miss counters plus the current entry count and estimated bytes."""
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), bytes=self._bytes)
@@ -0,0 +1,252 @@
+"""A small, safe language for segment criteria, compiled to SQL predicates.
+
+Criteria are comparisons on customer fields combined with AND, OR, NOT and
+parentheses. Each non-blank line is one condition and lines are ANDed:
+
+    location = North
+    age < 30 AND (plan IN ('pro', 'team') OR email CONTAINS '@example.com')
+
+`name`, `email` and `id` refer to customer columns; any other field name is a
+key in the customer's JSONB demographics. `name` and `email` always compare
+as text and `id` only with numbers (not with CONTAINS). For demographics,
+numbers compare numerically, everything else as text; a demographic that is
+missing or not numeric never matches. Equality on a demographic compiles to JSONB containment so it can use
+the GIN index on customers.demographics.
+
+compile_criteria() turns criteria into a (sql, params) predicate over the
+`customers c` table alias. Values are always passed as parameters and field
+names are checked against an identifier pattern, so criteria text never
+reaches the SQL string itself. The predicate targets PostgreSQL by default;
+with dialect="sqlite" it uses SQLite's JSON functions instead (placeholders
+are %s in both dialects).
+"""
+import re
+
+from psycopg2.extras import Json
+
+CUSTOMER_COLUMNS = {"id": "c.id", "name": "c.name", "email": "c.email"}
+NUMERIC_COLUMNS = {"id"}
+
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<number>-?\d+(?:\.\d+)?)(?![\w.])
+      | (?P<string>'(?:[^']|'')*'|"(?:[^"]|"")*")
+      | (?P<op><=|>=|!=|<>|=|<|>)
+      | (?P<lparen>\()
+      | (?P<rparen>\))
+      | (?P<comma>,)
+      | (?P<word>[A-Za-z_][\w.@-]*)
+    )""", re.VERBOSE)
+_FIELD_RE = re.compile(r"^[a-z_][a-z0-9_]*$")
+_KEYWORDS = {"AND", "OR", "NOT", "IN", "CONTAINS"}
+_KIND_NAMES = {
+    "number": "a number", "string": "a quoted string", "word": "a name",
+    "op": "a comparison", "lparen": "'('", "rparen": "')'", "comma": "','",
+}
+
+DIALECTS = ("postgresql", "sqlite")
+
+class CriteriaError(ValueError):
+    """Raised when segment criteria cannot be parsed."""
+
+def _tokenize(text):
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN_RE.match(text, position)
+        if match is None or match.end() == position:
+            raise CriteriaError(f"unexpected character {text[position:].lstrip()[:1]!r} at position {position}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "word" and value.upper() in _KEYWORDS:
+            kind, value = value.upper(), value.upper()
+        elif kind == "number":
+            value = float(value) if "." in value else int(value)
+        elif kind == "string":
+            quote = value[0]
+            value = value[1:-1].replace(quote * 2, quote)
+        tokens.append((kind, value))
+        position = match.end()
+    return tokens
+
+def _sqlite_path(key):
+    """Returns (sql, params) for the JSON path of a demographic key in SQLite.
+
+    Plain field names are inlined so the expression matches the
+    customers_demographics_*_idx indexes; anything else is passed as a
+    parameter.
+    """
+    if _FIELD_RE.match(key):
+        return f"'$.{key}'", []
+    return "%s", ['$."' + key.replace('"', '""') + '"']
+
+def demographic_sql(key, dialect="postgresql"):
+    """Returns (sql, params) reading a demographic key of customers c as text."""
+    if dialect == "sqlite":
+        path, params = _sqlite_path(key)
+        return f"json_extract(c.demographics, {path})", params
+    return "c.demographics ->> %s", [key]
+
+def demographic_numeric_sql(key, dialect="postgresql"):
+    """Returns (sql, params) reading a demographic key as NUMERIC, NULL when it is not a number.
+
+    The expression matches the customers_demographics_*_idx expression indexes.
+    """
+    if dialect == "sqlite":
+        path, params = _sqlite_path(key)
+        return (
+            f"(CASE WHEN json_type(c.demographics, {path}) IN ('integer', 'real') THEN json_extract(c.demographics, {path}) END)",
+            params + params
+        )
+    return "(CASE WHEN jsonb_typeof(c.demographics -> %s) = 'number' THEN (c.demographics ->> %s)::numeric END)", [key, key]
+
+def demographic_equals_sql(key, value, dialect="postgresql"):
+    """Returns (sql, params) testing a demographic key for equality via GIN containment."""
+    if dialect == "sqlite":
+        sql, params = demographic_sql(key, dialect)
+        return f"{sql} = %s", params + [value]
+    return "c.demographics @> %s", [Json({key: value})]
+
+def _field_sql(field, dialect):
+    if field in CUSTOMER_COLUMNS:
+        return CUSTOMER_COLUMNS[field], []
+    return demographic_sql(field, dialect)
+
+def _numeric_sql(field, dialect):
+    """Returns (sql, params) for a field as NUMERIC, NULL when it is not a number."""
+    if field in NUMERIC_COLUMNS:
+        return CUSTOMER_COLUMNS[field], []
+    return demographic_numeric_sql(field, dialect)
+
+def _compared_sql(field, values, dialect):
+    """Returns (sql, params, values) comparing `field` with `values`, numerically if they are all numbers.
+
+    Customer columns keep their own type: text columns compare as text and
+    numeric ones only accept numbers.
+    """
+    numeric = all(isinstance(value, (int, float)) for value in values)
+    if field in NUMERIC_COLUMNS and not numeric:
+        raise CriteriaError(f"{field} can only be compared with numbers")
+    if field in CUSTOMER_COLUMNS and field not in NUMERIC_COLUMNS:
+        numeric = False
+    if numeric:
+        return (*_numeric_sql(field, dialect), values)
+    return (*_field_sql(field, dialect), [str(value) for value in values])
+
+class _Parser:
+    def __init__(self, tokens, dialect):
+        self.tokens = tokens
+        self.index = 0
+        self.dialect = dialect
+
+    def peek(self):
+        return self.tokens[self.index][0] if self.index < len(self.tokens) else None
+
+    def take(self, *kinds):
+        kind = self.peek()
+        if kind not in kinds:
+            found = repr(self.tokens[self.index][1]) if kind else "end of criteria"
+            expected = " or ".join(_KIND_NAMES.get(expected, expected) for expected in kinds)
+            raise CriteriaError(f"expected {expected}, found {found}")
+        self.index += 1
+        return self.tokens[self.index - 1][1]
+
+    def parse(self):
+        sql, params = self.or_expr()
+        if self.peek() is not None:
+            raise CriteriaError(f"unexpected {self.tokens[self.index][1]!r}")
+        return sql, params
+
+    def or_expr(self):
+        return self._chain(self.and_expr, "OR")
+
+    def and_expr(self):
+        return self._chain(self.not_expr, "AND")
+
+    def _chain(self, operand, keyword):
+        sql, params = operand()
+        parts = [sql]
+        while self.peek() == keyword:
+            self.take(keyword)
+            sql, more = operand()
+            parts.append(sql)
+            params = params + more
+        if len(parts) == 1:
+            return parts[0], params
+        return "(" + f" {keyword} ".join(parts) + ")", params
+
+    def not_expr(self):
+        if self.peek() == "NOT":
+            self.take("NOT")
+            sql, params = self.not_expr()
+            return f"NOT COALESCE({sql}, FALSE)", params
+        if self.peek() == "lparen":
+            self.take("lparen")
+            sql, params = self.or_expr()
+            self.take("rparen")
+            return sql, params
+        return self.comparison()
+
+    def value(self):
+        return self.take("number", "string", "word")
+
+    def comparison(self):
+        field = self.take("word").lower()
+        if not _FIELD_RE.match(field):
+            raise CriteriaError(f"invalid field name {field!r}")
+        kind = self.take("op", "IN", "CONTAINS")
+        if kind == "IN":
+            self.take("lparen")
+            values = [self.value()]
+            while self.peek() == "comma":
+                self.take("comma")
+                values.append(self.value())
+            self.take("rparen")
+            sql, params, values = _compared_sql(field, values, self.dialect)
+            placeholders = ", ".join(["%s"] * len(values))
+            return f"{sql} IN ({placeholders})", params + values
+        if kind == "CONTAINS":
+            if field in NUMERIC_COLUMNS:
+                raise CriteriaError(f"CONTAINS cannot be used on the numeric field {field}")
+            value = str(self.value())
+            sql, params = _field_sql(field, self.dialect)
+            escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            if self.dialect == "sqlite":
+                return f"{sql} LIKE %s ESCAPE '\\'", params + [f"%{escaped}%"]
+            return f"{sql} ILIKE %s", params + [f"%{escaped}%"]
+        op = "<>" if kind == "!=" else kind
+        value = self.value()
+        if op == "=" and field not in CUSTOMER_COLUMNS:
+            return demographic_equals_sql(field, value, self.dialect)
+        sql, params, values = _compared_sql(field, [value], self.dialect)
+        return f"{sql} {op} %s", params + values
+
+def compile_criteria(criteria, dialect="postgresql"):
+    """Compiles criteria text into a (sql, params) predicate over `customers c`.
+
+    `dialect` is one of DIALECTS. Raises CriteriaError if the criteria are
+    empty or malformed.
+    """
+    if dialect not in DIALECTS:
+        raise ValueError(f"unknown SQL dialect {dialect!r}")
+    lines = [line.strip() for line in (criteria or "").splitlines() if line.strip()]
+    if not lines:
+        raise CriteriaError("criteria are empty")
+    parts, params = [], []
+    for number, line in enumerate(lines, start=1):
+        try:
+            sql, line_params = _Parser(_tokenize(line), dialect).parse()
+        except CriteriaError as error:
+            raise CriteriaError(f"line {number}: {error}") from None
+        parts.append(f"COALESCE({sql}, FALSE)")
+        params.extend(line_params)
+    return " AND ".join(parts), params
+
+def is_executable(criteria):
+    """Returns True if the criteria compile, i.e. the segment is computed from them."""
+    try:
+        compile_criteria(criteria)
+        return True
+    except CriteriaError:
+        return False
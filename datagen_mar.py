@@ -0,0 +1,271 @@
+"""Seeded synthetic data for load tests and benchmarks.
+
+Fills campaigns, channels, customers, segments, segment membership and
+performance_metrics at a given scale, e.g.
+
+    DB_NAME=campaigns_bench python datagen_mar.py --rows 1000000 --seed 42
+    DB_NAME=campaigns_bench python datagen_mar.py --drop
+
+--rows is the approximate total row count: about 20% customers, 1% campaigns
+with one to three channels each, and the rest performance metrics spread over
+the year before --anchor, 70% of them attributed to one of the campaign's
+channels. The same seed and anchor always produce the same data. Customers
+are loaded with COPY and metrics through write_metric_batch(), which also
+maintains the rollups; segment membership is then computed by
+refresh_segments_incremental().
+
+Generated rows are marked with the "gen-" prefix in campaign and segment names
+and customer emails, so --drop removes them and nothing else. Use a scratch
+database all the same. --embedded DIR runs everything against an embedded
+PostgreSQL in DIR (needs the pgserver package) instead of a server; with
+DB_ENGINE=sqlite the data goes into the SQLITE_PATH file instead, loaded with
+executemany() in place of COPY.
+"""
+import argparse
+import csv
+import io
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+import migrate_mar
+import storage_mar
+
+bm = storage_mar.load_backend()
+SQLITE = storage_mar.DB_ENGINE == "sqlite"
+
+GEN_PREFIX = "gen-"
+DEFAULT_ANCHOR = datetime(2025, 1, 1)
+COPY_CHUNK = 100000
+# Share of generated metrics attributed to one of their campaign's channels
+ATTRIBUTED_SHARE = 0.7
+
+CHANNEL_TYPES = ['Email', 'Social Media', 'Paid Ads', 'Content Marketing']
+LOCATIONS = ["North", "South", "East", "West", "Central"]
+PLANS = ["free", "pro", "team"]
+SEGMENT_CRITERIA = [
+    "location = {location}",
+    "age < {age}",
+    "age >= {age}",
+    "plan IN ('pro', 'team')",
+    "plan = {plan} AND age < {age}",
+    "location = {location} OR location = {other_location}",
+    "NOT location = {location}\nplan = {plan}",
+]
+
+# --- Database Selection ---
+
+def use_database(dbname=None, host=None, port=None, user=None, password=None):
+    """Points backend_mar at another database; takes effect for the next pooled connection."""
+    for name, value in [("DB_NAME", dbname), ("DB_HOST", host), ("DB_PORT", port), ("DB_USER", user), ("DB_PASSWORD", password)]:
+        if value is not None:
+            setattr(bm, name, value)
+    bm.close_pool()
+    bm.invalidate_cache()
+
+def use_embedded_database(data_dir, dbname="campaigns_bench"):
+    """Starts (or reuses) an embedded PostgreSQL in `data_dir`, creates `dbname` and migrates it.
+
+    The server listens on a Unix socket only, so no network is needed. Returns
+    the server handle; it stops when the process exits.
+    """
+    try:
+        import pgserver
+    except ImportError:
+        raise RuntimeError("the embedded database needs the pgserver package (pip install pgserver)") from None
+    server = pgserver.get_server(data_dir)
+    conn = psycopg2.connect(dbname="postgres", user="postgres", host=data_dir)
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_database WHERE datname = %s;", (dbname,))
+            if cur.fetchone() is None:
+                cur.execute(f'CREATE DATABASE "{dbname}";')
+    finally:
+        conn.close()
+    use_database(dbname=dbname, host=data_dir, user="postgres", password="")
+    migrate_mar.migrate()
+    return server
+
+# --- Generation ---
+
+def plan_counts(rows):
+    """Splits an approximate total row count into per-table counts."""
+    campaigns = max(10, rows // 100)
+    customers = max(100, rows // 5)
+    channels = campaigns * 2
+    return {
+        "campaigns": campaigns,
+        "channels": channels,
+        "customers": customers,
+        "segments": max(5, min(50, rows // 20000)),
+        "performance_metrics": max(1000, rows - campaigns - channels - customers),
+    }
+
+def _generate_campaigns(rng, seed, count, anchor):
+    campaign_ids = []
+    with bm.db_cursor() as cur:
+        for start in range(0, count, COPY_CHUNK):
+            rows = []
+            for i in range(start, min(start + COPY_CHUNK, count)):
+                start_date = anchor - timedelta(days=rng.randrange(30, 365))
+                rows.append((
+                    f"{GEN_PREFIX}{seed}-campaign-{i}", rng.randrange(1000, 100000),
+                    start_date.date(), (start_date + timedelta(days=rng.randrange(30, 180))).date(),
+                    f"Synthetic campaign {i}"
+                ))
+            if SQLITE:
+                for row in rows:
+                    cur.execute("INSERT INTO campaigns (name, budget, start_date, end_date, description) VALUES (?, ?, ?, ?, ?);", row)
+                    campaign_ids.append(cur.lastrowid)
+                continue
+            inserted = execute_values(
+                cur,
+                "INSERT INTO campaigns (name, budget, start_date, end_date, description) VALUES %s RETURNING id;",
+                rows, page_size=1000, fetch=True
+            )
+            campaign_ids.extend(row[0] for row in inserted)
+        channel_type_ids = bm._channel_type_ids()
+        campaign_channels = {
+            campaign_id: [channel_type_ids[channel] for channel in rng.sample(CHANNEL_TYPES, rng.randint(1, 3))]
+            for campaign_id in campaign_ids
+        }
+        channel_rows = [(campaign_id, channel) for campaign_id, channels in campaign_channels.items() for channel in channels]
+        if SQLITE:
+            cur.executemany("INSERT INTO channels (campaign_id, channel_type_id) VALUES (?, ?);", channel_rows)
+        else:
+            execute_values(cur, "INSERT INTO channels (campaign_id, channel_type_id) VALUES %s;", channel_rows, page_size=5000)
+    bm.invalidate_cache("campaigns", "channels")
+    return campaign_channels
+
+def _demographics(rng):
+    demographics = {}
+    if rng.random() < 0.95:
+        demographics["location"] = rng.choice(LOCATIONS)
+    if rng.random() < 0.9:
+        demographics["age"] = rng.randint(18, 80)
+    if rng.random() < 0.8:
+        demographics["plan"] = rng.choices(PLANS, weights=[6, 3, 1])[0]
+    return demographics
+
+def _generate_customers(rng, seed, count, progress):
+    with bm.db_cursor() as cur:
+        for start in range(0, count, COPY_CHUNK):
+            if SQLITE:
+                cur.executemany("INSERT INTO customers (name, email, demographics) VALUES (?, ?, ?);", [
+                    (f"Customer {i}", f"{GEN_PREFIX}{seed}-{i}@example.com", json.dumps(_demographics(rng)))
+                    for i in range(start, min(start + COPY_CHUNK, count))
+                ])
+                progress("customers", min(start + COPY_CHUNK, count), count)
+                continue
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for i in range(start, min(start + COPY_CHUNK, count)):
+                writer.writerow((f"Customer {i}", f"{GEN_PREFIX}{seed}-{i}@example.com", json.dumps(_demographics(rng))))
+            buffer.seek(0)
+            cur.copy_expert("COPY customers (name, email, demographics) FROM STDIN WITH (FORMAT csv);", buffer)
+            progress("customers", min(start + COPY_CHUNK, count), count)
+    bm.invalidate_cache("customers")
+
+def _generate_segments(rng, seed, count):
+    segment_ids = []
+    for i in range(count):
+        criteria = rng.choice(SEGMENT_CRITERIA).format(
+            location=rng.choice(LOCATIONS), other_location=rng.choice(LOCATIONS),
+            age=rng.randint(25, 65), plan=rng.choice(PLANS)
+        )
+        segment_id = bm.create_segment(f"{GEN_PREFIX}{seed}-segment-{i}", criteria)
+        if segment_id is None:
+            raise RuntimeError("could not create a segment")
+        segment_ids.append(segment_id)
+    return segment_ids
+
+def _generate_metrics(rng, campaign_channels, count, anchor, progress):
+    year = 365 * 86400
+    campaign_ids = list(campaign_channels)
+    written = 0
+    while written < count:
+        size = min(COPY_CHUNK, count - written)
+        rows = []
+        for _ in range(size):
+            emails_sent = rng.randint(50, 5000)
+            emails_opened = int(emails_sent * rng.uniform(0.05, 0.6))
+            campaign_id = rng.choice(campaign_ids)
+            channel = rng.choice(campaign_channels[campaign_id]) if rng.random() < ATTRIBUTED_SHARE else None
+            rows.append((
+                campaign_id, emails_sent, emails_opened,
+                int(emails_opened * rng.uniform(0.01, 0.3)), anchor - timedelta(seconds=rng.randrange(year)), channel
+            ))
+        bm.write_metric_batch(rows)
+        written += size
+        progress("performance_metrics", written, count)
+
+def generate(rows, seed=42, anchor=DEFAULT_ANCHOR, progress=None):
+    """Fills the database with about `rows` seeded synthetic rows; returns the generated counts and timings."""
+    progress = progress or (lambda table, done, total: None)
+    rng = random.Random(seed)
+    counts = plan_counts(rows)
+    timings = {}
+
+    started = time.perf_counter()
+    campaign_channels = _generate_campaigns(rng, seed, counts["campaigns"], anchor)
+    campaign_ids = list(campaign_channels)
+    counts["channels"] = sum(len(channels) for channels in campaign_channels.values())
+    timings["campaigns"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    segment_ids = _generate_segments(rng, seed, counts["segments"])
+    _generate_customers(rng, seed, counts["customers"], progress)
+    refresh = bm.refresh_segments_incremental()
+    if refresh is None:
+        raise RuntimeError("could not compute segment membership")
+    counts["customer_segments"] = refresh["added"]
+    timings["customers_and_segments"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    _generate_metrics(rng, campaign_channels, counts["performance_metrics"], anchor, progress)
+    timings["performance_metrics"] = time.perf_counter() - started
+
+    with bm.db_cursor() as cur:
+        cur.execute("ANALYZE;")
+    return {
+        "seed": seed, "anchor": anchor.isoformat(), "counts": counts, "seconds": timings,
+        "campaign_ids": campaign_ids, "segment_ids": segment_ids,
+    }
+
+def drop_generated():
+    """Removes every generated row; cascades take channels, memberships and metrics with them."""
+    with bm.db_cursor() as cur:
+        cur.execute(f"DELETE FROM campaigns WHERE name LIKE {bm.PLACEHOLDER};", (GEN_PREFIX + "%",))
+        cur.execute(f"DELETE FROM segments WHERE segment_name LIKE {bm.PLACEHOLDER};", (GEN_PREFIX + "%",))
+        cur.execute(f"DELETE FROM customers WHERE email LIKE {bm.PLACEHOLDER};", (GEN_PREFIX + "%",))
+    bm.invalidate_cache()
+
+def _print_progress(table, done, total):
+    print(f"  {table}: {done:,}/{total:,}", flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000, help="approximate total rows to generate (10k to 10M)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--anchor", type=datetime.fromisoformat, default=DEFAULT_ANCHOR,
+                        help="metrics are spread over the year before this date")
+    parser.add_argument("--drop", action="store_true", help="remove previously generated rows instead")
+    parser.add_argument("--embedded", metavar="DIR", help="use an embedded PostgreSQL in DIR (needs pgserver)")
+    args = parser.parse_args()
+
+    if args.embedded:
+        use_embedded_database(args.embedded)
+    if args.drop:
+        drop_generated()
+        print("Removed generated rows.")
+        return
+    result = generate(args.rows, args.seed, args.anchor, _print_progress)
+    print(json.dumps({key: result[key] for key in ("seed", "anchor", "counts", "seconds")}, indent=2))
+
+if __name__ == "__main__":
+    main()
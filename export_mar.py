@@ -0,0 +1,313 @@
+"""Arrow/Parquet snapshots of campaign analytics for offline dashboards.
+
+    python export_mar.py export snapshots/2025-01 --start 2024-01-01 --end 2025-01-01
+    python export_mar.py summary snapshots/2025-01 --period-days 7
+
+export streams campaigns, segments, segment membership and performance
+metrics out of the storage engine selected by DB_ENGINE with stream_query()
+(a named server-side cursor on PostgreSQL) and turns each chunk into an
+Arrow record batch, so memory stays bounded by --batch-size rows whatever
+the table sizes. A snapshot directory holds:
+
+    campaigns.parquet           one row per campaign, channels as a list
+    segments.parquet            segment id, name and criteria
+    customer_segments.parquet   segment membership as (segment_id, customer_id)
+    performance_metrics/        metrics partitioned by campaign_id and day (Hive layout)
+    snapshot.json               creation time, metric time range, partitioning and row counts
+
+--start and --end limit the metrics; metrics without a campaign are left
+out. Each campaign and day is one directory, which suits campaigns with
+many metrics a day; sparse histories export faster with --partition-by
+campaign_id or day.
+
+load_snapshot() reopens a snapshot with pyarrow alone, memory-mapping the
+files and pruning metric partitions by campaign and day, so offline
+dashboards and kpi_mar run without a database. Needs the pyarrow package
+(pip install pyarrow).
+"""
+import argparse
+import json
+import os
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    raise ImportError("export_mar needs the pyarrow package (pip install pyarrow)") from None
+
+import kpi_mar
+import storage_mar
+
+bm = storage_mar.load_backend()
+SQLITE = storage_mar.DB_ENGINE == "sqlite"
+
+SNAPSHOT_VERSION = 1
+MANIFEST = "snapshot.json"
+METRICS_DIRECTORY = "performance_metrics"
+EXPORT_BATCH_SIZE = 50000
+
+CAMPAIGN_SCHEMA = pa.schema([
+    ("id", pa.int32()), ("name", pa.string()), ("budget", pa.decimal128(10, 2)),
+    ("start_date", pa.date32()), ("end_date", pa.date32()), ("description", pa.string()),
+    ("channels", pa.list_(pa.string())),
+])
+SEGMENT_SCHEMA = pa.schema([("id", pa.int32()), ("segment_name", pa.string()), ("criteria", pa.string())])
+MEMBERSHIP_SCHEMA = pa.schema([("segment_id", pa.int32()), ("customer_id", pa.int32())])
+METRIC_SCHEMA = pa.schema([
+    ("id", pa.int64()), ("campaign_id", pa.int32()), ("day", pa.date32()), ("timestamp", pa.timestamp("us")),
+    ("emails_sent", pa.int32()), ("emails_opened", pa.int32()), ("clicks", pa.int32()), ("channel", pa.string()),
+])
+PARTITION_COLUMNS = ("campaign_id", "day")
+
+def metric_partitioning(columns=PARTITION_COLUMNS):
+    """Returns the Hive partitioning of the metrics dataset by `columns` (a subset of PARTITION_COLUMNS)."""
+    return ds.partitioning(pa.schema([METRIC_SCHEMA.field(column) for column in columns]), flavor="hive")
+
+# --- Export Queries ---
+
+if SQLITE:
+    CAMPAIGNS_SQL = """
+        SELECT c.id, c.name, ROUND(c.budget, 2) AS "budget [DECIMAL]", c.start_date, c.end_date, c.description,
+               (SELECT json_group_array(name) FROM (
+                   SELECT t.name FROM channels ch JOIN channel_types t ON t.id = ch.channel_type_id
+                   WHERE ch.campaign_id = c.id ORDER BY ch.id
+               )) AS "channels [JSON]"
+        FROM campaigns c
+        ORDER BY c.id;
+    """
+    METRICS_SQL = """
+        SELECT m.id, m.campaign_id, date(m.timestamp) AS "day [DATE]", m.timestamp,
+               m.emails_sent, m.emails_opened, m.clicks, t.name
+        FROM performance_metrics m
+        LEFT JOIN channel_types t ON t.id = m.channel_type_id
+        WHERE {conditions}
+        ORDER BY {order_by};
+    """
+else:
+    CAMPAIGNS_SQL = """
+        SELECT c.id, c.name, c.budget, c.start_date, c.end_date, c.description,
+               COALESCE((
+                   SELECT array_agg(t.name ORDER BY ch.id)
+                   FROM channels ch JOIN channel_types t ON t.id = ch.channel_type_id
+                   WHERE ch.campaign_id = c.id
+               ), '{}')
+        FROM campaigns c
+        ORDER BY c.id;
+    """
+    METRICS_SQL = """
+        SELECT m.id, m.campaign_id, m.timestamp::date, m.timestamp, m.emails_sent, m.emails_opened, m.clicks, t.name
+        FROM performance_metrics m
+        LEFT JOIN channel_types t ON t.id = m.channel_type_id
+        WHERE {conditions}
+        ORDER BY {order_by};
+    """
+SEGMENTS_SQL = "SELECT id, segment_name, criteria FROM segments ORDER BY id;"
+MEMBERSHIP_SQL = "SELECT segment_id, customer_id FROM customer_segments ORDER BY segment_id, customer_id;"
+
+# --- Export ---
+
+def _record_batch(rows, schema):
+    """Converts a chunk of row tuples to a record batch, one Arrow array per column."""
+    return pa.RecordBatch.from_arrays(
+        [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)], schema=schema
+    )
+
+def _record_batches(sql, params, schema, batch_size, counts, name):
+    """Streams a query as record batches, counting the rows under counts[name]."""
+    counts[name] = 0
+    for rows in bm.stream_query(sql, params, batch_size):
+        counts[name] += len(rows)
+        yield _record_batch(rows, schema)
+
+def _write_file(path, sql, schema, batch_size, counts, name):
+    with pq.ParquetWriter(path, schema) as writer:
+        for batch in _record_batches(sql, (), schema, batch_size, counts, name):
+            writer.write_batch(batch)
+
+def _write_partitioned(root, batches, schema, partition_by):
+    """Writes record batches sorted by the `partition_by` columns as a Hive-partitioned dataset.
+
+    Each partition becomes one part-0.parquet file, written while its rows
+    stream past, so only one file is open at a time. pyarrow's
+    write_dataset() slows down sharply once a batch spans thousands of
+    partitions, which campaign and day partitioning easily reaches.
+    """
+    file_schema = pa.schema([field for field in schema if field.name not in partition_by])
+    writer, current = None, None
+    try:
+        for batch in batches:
+            keys = [batch.column(name).to_numpy(zero_copy_only=False) for name in partition_by]
+            changed = np.zeros(batch.num_rows, dtype=bool)
+            changed[:1] = True
+            for values in keys:
+                changed[1:] |= values[1:] != values[:-1]
+            starts = np.flatnonzero(changed)
+            data = batch.select(file_schema.names)
+            for first, last in zip(starts, np.append(starts[1:], batch.num_rows)):
+                key = tuple(str(values[first]) for values in keys)
+                if key != current:
+                    if writer is not None:
+                        writer.close()
+                    directory = os.path.join(root, *(f"{name}={value}" for name, value in zip(partition_by, key)))
+                    os.makedirs(directory, exist_ok=True)
+                    writer, current = pq.ParquetWriter(os.path.join(directory, "part-0.parquet"), file_schema), key
+                writer.write_batch(data.slice(first, last - first))
+    finally:
+        if writer is not None:
+            writer.close()
+
+def export_snapshot(directory, start=None, end=None, batch_size=EXPORT_BATCH_SIZE, partition_by=PARTITION_COLUMNS):
+    """Writes a snapshot of campaigns, segments, membership and metrics to a new or empty `directory`.
+
+    Metrics are limited to [start, end) when given and partitioned by the
+    `partition_by` columns. Returns the manifest, which is written last, so
+    a directory without snapshot.json is an incomplete export.
+    """
+    partition_by = list(partition_by)
+    if not set(partition_by) <= set(PARTITION_COLUMNS):
+        raise ValueError(f"metrics can only be partitioned by {', '.join(PARTITION_COLUMNS)}")
+    if os.path.isdir(directory) and os.listdir(directory):
+        raise ValueError(f"{directory} is not empty")
+    os.makedirs(directory, exist_ok=True)
+    counts = {}
+    _write_file(os.path.join(directory, "campaigns.parquet"), CAMPAIGNS_SQL, CAMPAIGN_SCHEMA, batch_size, counts, "campaigns")
+    _write_file(os.path.join(directory, "segments.parquet"), SEGMENTS_SQL, SEGMENT_SCHEMA, batch_size, counts, "segments")
+    _write_file(
+        os.path.join(directory, "customer_segments.parquet"), MEMBERSHIP_SQL, MEMBERSHIP_SCHEMA, batch_size,
+        counts, "customer_segments"
+    )
+
+    conditions, params = ["m.campaign_id IS NOT NULL", "m.timestamp IS NOT NULL"], []
+    if start is not None:
+        conditions.append(f"m.timestamp >= {bm.PLACEHOLDER}")
+        params.append(start)
+    if end is not None:
+        conditions.append(f"m.timestamp < {bm.PLACEHOLDER}")
+        params.append(end)
+    # Time order is day order, so both orders keep every partition's rows together
+    order_by = "m.timestamp" if partition_by == ["day"] else "m.campaign_id, m.timestamp"
+    sql = METRICS_SQL.format(conditions=" AND ".join(conditions), order_by=order_by)
+    _write_partitioned(
+        os.path.join(directory, METRICS_DIRECTORY),
+        _record_batches(sql, params, METRIC_SCHEMA, batch_size, counts, "performance_metrics"),
+        METRIC_SCHEMA, partition_by
+    )
+
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "created_at": datetime.now().isoformat(),
+        "engine": storage_mar.DB_ENGINE,
+        "start": start.isoformat() if start is not None else None,
+        "end": end.isoformat() if end is not None else None,
+        "partition_by": partition_by,
+        "rows": counts,
+    }
+    with open(os.path.join(directory, MANIFEST), "w") as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+# --- Snapshot Loading ---
+
+def _as_date(value):
+    return value if isinstance(value, date) and not isinstance(value, datetime) else value.date()
+
+class Snapshot:
+    """A snapshot written by export_snapshot(), read with pyarrow alone."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST)) as file:
+            self.manifest = json.load(file)
+        if self.manifest["version"] != SNAPSHOT_VERSION:
+            raise ValueError(f"unsupported snapshot version {self.manifest['version']}")
+        self.metrics = ds.dataset(
+            os.path.join(directory, METRICS_DIRECTORY), schema=METRIC_SCHEMA, format="parquet",
+            partitioning=metric_partitioning(self.manifest["partition_by"])
+        )
+
+    def table(self, name):
+        """Returns the memory-mapped campaigns, segments or customer_segments table."""
+        return pq.read_table(os.path.join(self.directory, f"{name}.parquet"), memory_map=True)
+
+    def read_campaigns(self):
+        """Returns the campaigns as dicts shaped like the backends' read_campaigns()."""
+        return self.table("campaigns").to_pylist()
+
+    def metric_table(self, start=None, end=None, campaign_id=None, columns=None):
+        """Returns the metrics in [start, end) as an Arrow table, reading only the matching partitions."""
+        conditions = []
+        if campaign_id:
+            conditions.append(ds.field("campaign_id") == campaign_id)
+        if start is not None:
+            conditions.append(ds.field("day") >= pa.scalar(_as_date(start), pa.date32()))
+            conditions.append(ds.field("timestamp") >= pa.scalar(start, pa.timestamp("us")))
+        if end is not None:
+            conditions.append(ds.field("day") <= pa.scalar(_as_date(end), pa.date32()))
+            conditions.append(ds.field("timestamp") < pa.scalar(end, pa.timestamp("us")))
+        condition = None
+        for expression in conditions:
+            condition = expression if condition is None else condition & expression
+        return self.metrics.to_table(columns=columns, filter=condition)
+
+    def read_metric_columns(self, start=None, end=None, campaign_id=None):
+        """Returns the raw metrics in [start, end) as MetricColumns, like the backends' read_metric_columns()."""
+        table = self.metric_table(start, end, campaign_id, list(bm.MetricColumns._fields))
+        return bm.MetricColumns(
+            table["campaign_id"].to_numpy().astype(np.int32),
+            table["timestamp"].to_numpy().astype("datetime64[us]"),
+            *(pc.fill_null(table[name], 0).to_numpy().astype(np.int64) for name in ("emails_sent", "emails_opened", "clicks")),
+        )
+
+def load_snapshot(directory):
+    """Opens the snapshot in `directory`; no database connection is made."""
+    return Snapshot(directory)
+
+def snapshot_kpis(snapshot, period=timedelta(days=7), end=None):
+    """Returns kpi_mar.compute_campaign_kpis() over a snapshot, for the period ending at `end`.
+
+    `end` defaults to the snapshot's end, or its creation time.
+    """
+    if end is None:
+        end = datetime.fromisoformat(snapshot.manifest["end"] or snapshot.manifest["created_at"])
+    start = end - 2 * period if period else None
+    return kpi_mar.compute_campaign_kpis(snapshot.read_metric_columns(start, end), snapshot.read_campaigns(), end, period)
+
+# --- Command Line ---
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export = subparsers.add_parser("export", help="write a snapshot of the database to a new directory")
+    export.add_argument("directory")
+    export.add_argument("--start", type=datetime.fromisoformat, help="first metric timestamp to include")
+    export.add_argument("--end", type=datetime.fromisoformat, help="metrics before this timestamp are included")
+    export.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE, help="rows per fetch and record batch")
+    export.add_argument("--partition-by", nargs="*", choices=PARTITION_COLUMNS, default=list(PARTITION_COLUMNS),
+                        help="metric partition columns (default: campaign_id day)")
+
+    summary = subparsers.add_parser("summary", help="print campaign KPIs from a snapshot, without a database")
+    summary.add_argument("directory")
+    summary.add_argument("--period-days", type=int, default=7)
+    summary.add_argument("--end", type=datetime.fromisoformat,
+                         help="end of the reported period (default: the snapshot's end or creation time)")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        manifest = export_snapshot(args.directory, args.start, args.end, args.batch_size, args.partition_by)
+        print(json.dumps(manifest, indent=2))
+    elif args.command == "summary":
+        snapshot = load_snapshot(args.directory)
+        kpis = snapshot_kpis(snapshot, timedelta(days=args.period_days), args.end)
+        print(f"{'campaign':<40}{'clicks':>10}{'open %':>9}{'CTR %':>9}{'cost/click':>12}")
+        for i in range(len(kpis["campaign_id"])):
+            print(f"{kpis['name'][i][:39]:<40}{kpis['clicks'][i]:>10}{kpis['open_rate'][i]:>9.2f}"
+                  f"{kpis['click_through_rate'][i]:>9.2f}{kpis['cost_per_click'][i]:>12.2f}")
+
+if __name__ == "__main__":
+    main()
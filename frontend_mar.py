@@ -1,11 +1,49 @@
 import streamlit as st
 import pandas as pd
-from datetime import date
-import backend_mar as bm
+import csv
+import io
+import json
+import tempfile
+from datetime import date, datetime, timedelta
+import async_mar as am
+import criteria_mar as cm
+import kpi_mar
+import storage_mar
+
+bm = storage_mar.load_backend()
 
 # Set Streamlit page configuration
 st.set_page_config(layout="wide", page_title="Digital Ad Campaign Tracker")
 
+# Performance chart ranges; None means all history. Every range is downsampled to CHART_POINTS buckets.
+CHART_RANGES = {
+    "Last 24 hours": timedelta(days=1),
+    "Last 7 days": timedelta(days=7),
+    "Last 30 days": timedelta(days=30),
+    "Last 365 days": timedelta(days=365),
+    "All time": None,
+}
+CHART_DEFAULT_RANGE = "Last 30 days"
+CHART_POINTS = 500
+
+# Key metric periods, each compared with the period before it; None means all history.
+KPI_PERIODS = {
+    "Last 24 hours": timedelta(days=1),
+    "Last 7 days": timedelta(days=7),
+    "Last 30 days": timedelta(days=30),
+    "All time": None,
+}
+KPI_DEFAULT_PERIOD = "Last 7 days"
+
+# Campaign leaderboard rankings, by backend metric name
+LEADERBOARD_METRICS = {
+    "Clicks": "clicks",
+    "Click-Through Rate": "click_through_rate",
+    "Open Rate": "open_rate",
+    "Cost per Click": "cost_per_click",
+}
+LEADERBOARD_SIZES = [5, 10, 25]
+
 # App Title and Description
 st.title("Digital Ad Campaign Tracker 📊")
 st.markdown("A simple application to manage marketing campaigns, track performance, and gain business insights.")
@@ -22,7 +60,7 @@ def show_campaign_form(campaign_data=None):
         end_date = st.date_input("End Date", value=campaign_data.get('end_date', date.today()) if campaign_data else date.today())
         description = st.text_area("Description", value=campaign_data.get('description', '') if campaign_data else '')
         
-        all_channels = ['Email', 'Social Media', 'Paid Ads']
+        all_channels = [name for _, name in bm.get_channel_types()]
         selected_channels = st.multiselect(
             "Channels",
             options=all_channels,
@@ -45,11 +83,91 @@ def show_campaign_form(campaign_data=None):
                     st.error("Failed to create campaign.")
             st.rerun()
 
+def format_demographics(demographics):
+    """Renders a demographics dict as "key: value" text for display."""
+    return ", ".join(f"{key}: {value}" for key, value in (demographics or {}).items())
+
+def csv_download(chunks, columns, format_row=None):
+    """Writes streamed row chunks to a temporary CSV file and returns it rewound, for st.download_button.
+
+    Passed to the button inside a callable, it only runs when the button is
+    clicked, and only one chunk of rows is in memory at a time.
+    """
+    text = io.TextIOWrapper(tempfile.TemporaryFile(), encoding="utf-8", newline="")
+    writer = csv.writer(text)
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(map(format_row, rows) if format_row else rows)
+    text.flush()
+    text.seek(0)
+    return text.detach()
+
+def show_paged_table(key, fetch_page, page_size, **query):
+    """Fetches and navigates one keyset page at a time; returns the current page's rows.
+
+    The stack of page cursors lives in session state, so only the visible page
+    is ever loaded. Changing any query parameter starts again from page one.
+    """
+    cursors_key, query_key = f"{key}_cursors", f"{key}_query"
+    query["page_size"] = page_size
+    if st.session_state.get(query_key) != query:
+        st.session_state[query_key] = query
+        st.session_state[cursors_key] = [None]
+    cursors = st.session_state[cursors_key]
+
+    rows, next_cursor = fetch_page(after=cursors[-1], **query)
+
+    col_prev, col_page, col_next = st.columns([1, 3, 1])
+    with col_prev:
+        if st.button("◀ Previous", key=f"{key}_prev", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+    with col_page:
+        st.caption(f"Page {len(cursors)}")
+    with col_next:
+        if st.button("Next ▶", key=f"{key}_next", disabled=next_cursor is None):
+            cursors.append(next_cursor)
+            st.rerun()
+    return rows
+
+def load_performance_page():
+    """Fetches the campaigns, key metric columns and chart data of the Performance Tracking page concurrently.
+
+    The period and chart selections are read from session state, which holds
+    the widgets' values before they are drawn. The campaign KPIs are computed
+    from the fetched columns and added as "kpis" (None if they failed to load),
+    and the time range the chart covers as "chart_bounds".
+    """
+    kpi_period = KPI_PERIODS[st.session_state.get("kpi_period", KPI_DEFAULT_PERIOD)]
+    kpi_start, kpi_end, kpi_unit = kpi_mar.kpi_window(kpi_period)
+    chart_campaign = st.session_state.get("chart_campaign")
+    chart_window = CHART_RANGES[st.session_state.get("chart_range", CHART_DEFAULT_RANGE)]
+    chart_end = datetime.now().replace(second=0, microsecond=0) + timedelta(minutes=1)
+    chart_start = chart_end - chart_window if chart_window else None
+    page_data = am.load_page_data({
+        "campaigns": am.read_campaigns,
+        "metric_columns": lambda: am.read_metric_columns(kpi_start, kpi_end, unit=kpi_unit),
+        "performance_data": lambda: am.get_performance_metrics(
+            campaign_id=chart_campaign['id'] if chart_campaign else None,
+            start=chart_start,
+            end=chart_end,
+            points=CHART_POINTS
+        ),
+    })
+    page_data["chart_bounds"] = bm.chart_bounds(chart_start, chart_end, CHART_POINTS)
+    page_data["kpis"] = None
+    if page_data["metric_columns"] is not None:
+        page_data["kpis"] = kpi_mar.compute_campaign_kpis(page_data["metric_columns"], page_data["campaigns"], kpi_end, kpi_period)
+    return page_data
+
 # --- Main Streamlit App Layout ---
 
 # Sidebar for navigation
 st.sidebar.header("Navigation")
 menu = ["Campaign Management", "Customer Segmentation", "Performance Tracking", "Business Insights"]
+# Hidden diagnostics page, shown when the app is opened with ?diagnostics=1
+if st.query_params.get("diagnostics") == "1":
+    menu.append("Diagnostics")
 choice = st.sidebar.radio("Go to:", menu)
 
 if choice == "Campaign Management":
@@ -59,7 +177,24 @@ if choice == "Campaign Management":
     show_campaign_form()
     
     st.subheader("Existing Campaigns")
-    campaigns = bm.read_campaigns()
+    filter_col1, filter_col2, filter_col3, filter_col4 = st.columns(4)
+    with filter_col1:
+        name_filter = st.text_input("Name contains", key="campaign_name_filter")
+    with filter_col2:
+        channel_filter = st.selectbox(
+            "Channel", ['All'] + [name for _, name in bm.get_channel_types()], key="campaign_channel_filter"
+        )
+    with filter_col3:
+        campaign_sort = st.selectbox("Sort by", list(bm.CAMPAIGN_SORT_COLUMNS), key="campaign_sort")
+        campaign_desc = st.checkbox("Descending", key="campaign_sort_desc")
+    with filter_col4:
+        campaign_page_size = st.selectbox("Rows per page", [25, 50, 100], key="campaign_page_size")
+    campaigns = show_paged_table(
+        "campaigns", bm.read_campaigns_page, campaign_page_size,
+        sort_by=campaign_sort, descending=campaign_desc,
+        name_contains=name_filter or None,
+        channel=None if channel_filter == 'All' else channel_filter
+    )
     if campaigns:
         df = pd.DataFrame(campaigns)
         st.dataframe(df)
@@ -100,7 +235,7 @@ elif choice == "Customer Segmentation":
             st.markdown("##### Add a New Customer")
             name = st.text_input("Name")
             email = st.text_input("Email")
-            demographics = st.text_area("Demographics (e.g., location, age)")
+            demographics = st.text_area("Demographics (e.g., location: North, age: 25)")
             submitted = st.form_submit_button("Add Customer")
             if submitted and name and email:
                 if bm.create_customer(name, email, demographics):
@@ -109,47 +244,151 @@ elif choice == "Customer Segmentation":
                     st.error("Failed to add customer. Email might be a duplicate.")
                 st.rerun()
                 
+        with st.expander("Bulk Import Customers"):
+            uploaded = st.file_uploader(
+                "CSV or NDJSON file with name, email and demographics fields",
+                type=['csv', 'ndjson', 'jsonl']
+            )
+            if uploaded is not None and st.button("Import Customers"):
+                file_format = 'csv' if uploaded.name.lower().endswith('.csv') else 'ndjson'
+                progress = st.progress(0.0, text="Importing...")
+                stats = bm.import_customers(
+                    uploaded, file_format,
+                    progress_callback=lambda s: progress.progress(
+                        min(uploaded.tell() / max(uploaded.size, 1), 1.0),
+                        text=f"Imported {s['inserted'] + s['updated']:,} of {s['read']:,} records read"
+                    )
+                )
+                if stats is None:
+                    st.error("Import failed.")
+                else:
+                    st.success(
+                        f"Imported {stats['inserted']:,} new and {stats['updated']:,} existing customers "
+                        f"({stats['duplicates']:,} duplicates, {stats['rejected']:,} rejected)."
+                    )
+                    for line, reason in stats['errors']:
+                        st.caption(f"Line {line}: {reason}")
+
     with col2:
-        customers = bm.read_customers()
+        st.markdown("##### All Customers")
+        search_col, sort_col, size_col = st.columns([2, 1, 1])
+        with search_col:
+            customer_search = st.text_input("Search name or email", key="customer_search")
+            customer_criteria = st.text_input("Filter by criteria (e.g., location = North)", key="customer_criteria")
+        with sort_col:
+            customer_sort = st.selectbox("Sort by", list(bm.CUSTOMER_SORT_COLUMNS), key="customer_sort")
+            customer_desc = st.checkbox("Descending", key="customer_sort_desc")
+        with size_col:
+            customer_page_size = st.selectbox("Rows per page", [25, 50, 100], key="customer_page_size")
+        try:
+            if customer_criteria:
+                cm.compile_criteria(customer_criteria)
+        except cm.CriteriaError as error:
+            st.error(f"Invalid criteria: {error}")
+            customer_criteria = None
+        customers = show_paged_table(
+            "customers", bm.read_customers_page, customer_page_size,
+            sort_by=customer_sort, descending=customer_desc, search=customer_search or None,
+            criteria=customer_criteria or None
+        )
         if customers:
-            st.markdown("##### All Customers")
             df_customers = pd.DataFrame(customers, columns=['ID', 'Name', 'Email', 'Demographics'])
+            df_customers['Demographics'] = df_customers['Demographics'].apply(format_demographics)
             st.dataframe(df_customers, use_container_width=True)
+        else:
+            st.info("No customers found.")
+        st.download_button(
+            "Download All Customers (CSV)",
+            data=lambda: csv_download(
+                bm.stream_customers(), ['ID', 'Name', 'Email', 'Demographics'],
+                lambda row: (*row[:3], json.dumps(row[3]))
+            ),
+            file_name="customers.csv", mime="text/csv", on_click="ignore"
+        )
     
     st.subheader("Create Dynamic Segments")
-    with st.form("segment_form", clear_on_submit=True):
+    with st.form("segment_form"):
         segment_name = st.text_input("Segment Name")
-        criteria = st.text_area("Segment Criteria (e.g., 'location = North', 'age < 30')", placeholder="This field can be used to describe the dynamic logic for your team.")
-        segment_submitted = st.form_submit_button("Create Segment")
+        criteria = st.text_area(
+            "Segment Criteria",
+            placeholder="One condition per line, e.g.\nlocation = North\nage < 30 AND email CONTAINS '@example.com'"
+        )
+        compute_members = st.checkbox("Compute membership from criteria", value=True)
+        preview_col, create_col = st.columns(2)
+        with preview_col:
+            preview_submitted = st.form_submit_button("Preview Matches")
+        with create_col:
+            segment_submitted = st.form_submit_button("Create Segment")
+        if preview_submitted or (segment_submitted and compute_members):
+            try:
+                cm.compile_criteria(criteria)
+            except cm.CriteriaError as error:
+                st.error(f"Invalid criteria: {error}")
+                preview_submitted = segment_submitted = False
+        if preview_submitted:
+            matches = bm.count_customers_matching(criteria)
+            if matches is None:
+                st.error("Failed to evaluate criteria.")
+            else:
+                st.info(f"{matches:,} customers match these criteria.")
         if segment_submitted and segment_name:
-            segment_id = bm.create_segment(segment_name, criteria)
-            if segment_id:
+            # One transaction, so a failed membership computation leaves no empty segment behind
+            try:
+                with bm.session():
+                    segment_id = bm.create_segment(segment_name, criteria)
+                    if compute_members:
+                        bm.refresh_segment(segment_id)
                 st.success(f"Segment '{segment_name}' created!")
-            else:
+            except bm.SessionError:
                 st.error("Failed to create segment.")
             st.rerun()
-    
+
     st.subheader("Existing Segments")
-    segments = bm.read_segments()
-    if segments:
-        for segment in segments:
-            st.markdown(f"**Segment:** {segment['name']} (ID: {segment['id']})")
-            st.markdown(f"**Criteria:** {segment['criteria']}")
-            st.markdown(f"**Customers in this segment:** {', '.join([c[1] for c in segment['customers']])}")
-            if st.button(f"Delete Segment {segment['name']}", key=f"delete_segment_{segment['id']}"):
-                if bm.delete_segment(segment['id']):
-                    st.success(f"Segment '{segment['name']}' deleted.")
+    if st.button("Apply Customer Changes to Segments"):
+        refresh_stats = bm.refresh_segments_incremental()
+        if refresh_stats is None:
+            st.error("Failed to refresh segments.")
+        else:
+            st.success(
+                f"Re-evaluated {refresh_stats['changed_customers']:,} changed customers against "
+                f"{refresh_stats['segments']} segments: {refresh_stats['added']:,} added, "
+                f"{refresh_stats['removed']:,} removed in {refresh_stats['seconds']:.2f}s."
+            )
+            if refresh_stats["failed"]:
+                st.warning(
+                    "These segments could not be evaluated and were left unchanged: "
+                    f"{', '.join(str(segment_id) for segment_id in refresh_stats['failed'])}."
+                )
+    # Segments render as they stream in, so only one segment's members are held at a time
+    segment_count = 0
+    for segment in bm.stream_segments():
+        segment_count += 1
+        st.markdown(f"**Segment:** {segment['name']} (ID: {segment['id']})")
+        st.markdown(f"**Criteria:** {segment['criteria']}")
+        st.markdown(f"**Customers in this segment:** {', '.join([c[1] for c in segment['customers']])}")
+        if cm.is_executable(segment['criteria']):
+            if st.button(f"Refresh Segment {segment['name']}", key=f"refresh_segment_{segment['id']}"):
+                if bm.refresh_segment(segment['id']):
+                    st.success(f"Segment '{segment['name']}' refreshed.")
                     st.rerun()
                 else:
-                    st.error("Failed to delete segment.")
-    else:
+                    st.error("Failed to refresh segment.")
+        if st.button(f"Delete Segment {segment['name']}", key=f"delete_segment_{segment['id']}"):
+            if bm.delete_segment(segment['id']):
+                st.success(f"Segment '{segment['name']}' deleted.")
+                st.rerun()
+            else:
+                st.error("Failed to delete segment.")
+    if not segment_count:
         st.info("No segments created yet.")
 
 elif choice == "Performance Tracking":
     st.header("Performance Tracking 📈")
     
+    page_data = load_performance_page()
+    campaigns = page_data["campaigns"]
+
     st.subheader("Log New Performance Data (Simulated)")
-    campaigns = bm.read_campaigns()
     if campaigns:
         campaign_select = st.selectbox("Select a Campaign to log data for:", campaigns, format_func=lambda x: x['name'])
         
@@ -157,66 +396,200 @@ elif choice == "Performance Tracking":
             emails_sent = st.number_input("Emails Sent", min_value=0)
             emails_opened = st.number_input("Emails Opened", min_value=0)
             clicks = st.number_input("Clicks", min_value=0)
+            log_channel = st.selectbox(
+                "Channel", [None] + campaign_select['channels'],
+                format_func=lambda x: "Not attributed" if x is None else x
+            )
             log_submitted = st.form_submit_button("Log Data")
             
             if log_submitted:
                 if emails_opened > emails_sent:
                     st.warning("Emails opened cannot be more than emails sent.")
                 else:
-                    if bm.log_performance_metric(campaign_select['id'], emails_sent, emails_opened, clicks):
+                    if bm.log_performance_metric(campaign_select['id'], emails_sent, emails_opened, clicks, log_channel):
                         st.success("Performance data logged successfully!")
+                        page_data = load_performance_page()
                     else:
                         st.error("Failed to log performance data.")
     else:
         st.warning("Please create a campaign in 'Campaign Management' first.")
     
     st.subheader("Real-Time Dashboard")
-    performance_data = bm.get_performance_metrics()
+    st.markdown("##### Key Metrics by Campaign")
+    st.selectbox(
+        "Period", list(KPI_PERIODS), index=list(KPI_PERIODS).index(KPI_DEFAULT_PERIOD), key="kpi_period",
+        help="Changes compare each figure with the period before."
+    )
+    kpis = page_data["kpis"]
+    if kpis is None:
+        st.error("Could not load the key metrics.")
+    elif len(kpis["campaign_id"]):
+        # KPIs arrive as NumPy columns computed by kpi_mar; only rounding and labels happen here
+        df_kpis = pd.DataFrame({
+            'Campaign ID': kpis['campaign_id'], 'Campaign': kpis['name'], 'Spend': kpis['spend'].round(2),
+            'Emails Sent': kpis['emails_sent'], 'Emails Opened': kpis['emails_opened'], 'Clicks': kpis['clicks'],
+            'Open Rate': kpis['open_rate'].round(2), 'Click-Through Rate': kpis['click_through_rate'].round(2),
+            'Cost per Click': kpis['cost_per_click'].round(2), 'Clicks Change': kpis['clicks_change'],
+            'Open Rate Change': kpis['open_rate_change'].round(2),
+            'Click-Through Rate Change': kpis['click_through_rate_change'].round(2),
+        })
+        st.dataframe(df_kpis, use_container_width=True)
+
+    st.markdown("##### Performance Data Over Time")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.selectbox(
+            "Campaign", [None] + campaigns,
+            format_func=lambda x: "All campaigns" if x is None else x['name'], key="chart_campaign"
+        )
+    with col2:
+        st.selectbox("Time range", list(CHART_RANGES), index=list(CHART_RANGES).index(CHART_DEFAULT_RANGE), key="chart_range")
+    performance_data = page_data["performance_data"]
     if performance_data:
-        df_performance = pd.DataFrame(performance_data, columns=['ID', 'Campaign ID', 'Emails Sent', 'Emails Opened', 'Clicks', 'Timestamp'])
-        
-        # Display aggregated metrics for each campaign
-        df_agg = df_performance.groupby('Campaign ID').agg({
-            'Emails Sent': 'sum',
-            'Emails Opened': 'sum',
-            'Clicks': 'sum'
-        }).reset_index()
-        df_agg['Open Rate'] = (df_agg['Emails Opened'] / df_agg['Emails Sent'] * 100).fillna(0).round(2)
-        df_agg['Click-Through Rate'] = (df_agg['Clicks'] / df_agg['Emails Opened'] * 100).fillna(0).round(2)
-        
-        st.markdown("##### Key Metrics by Campaign")
-        st.dataframe(df_agg, use_container_width=True)
-        
-        st.markdown("##### Performance Data Over Time")
+        df_performance = pd.DataFrame(performance_data, columns=['Timestamp', 'Emails Sent', 'Emails Opened', 'Clicks'])
         st.line_chart(df_performance, x='Timestamp', y=['Emails Sent', 'Emails Opened', 'Clicks'])
     else:
-        st.info("No performance data available yet.")
+        st.info("No performance data available for this selection.")
+    chart_campaign = st.session_state.get("chart_campaign")
+    chart_start, chart_end = page_data["chart_bounds"]
+    channel_names = dict(bm.get_channel_types())
+    st.download_button(
+        "Download Raw Data for This Selection (CSV)",
+        # Reads the raw rows only when clicked, streaming them from the database in chunks
+        data=lambda: csv_download(
+            bm.stream_performance_metrics(
+                campaign_id=chart_campaign['id'] if chart_campaign else None,
+                start=chart_start,
+                end=chart_end
+            ),
+            ['ID', 'Campaign ID', 'Emails Sent', 'Emails Opened', 'Clicks', 'Timestamp', 'Channel'],
+            lambda row: (*row[:6], channel_names.get(row[6], ''))
+        ),
+        file_name="performance_metrics.csv", mime="text/csv", on_click="ignore"
+    )
 
 elif choice == "Business Insights":
     st.header("Business Insights 🧠")
-    
-    st.subheader("Campaign Totals and Averages")
-    col1, col2, col3 = st.columns(3)
-    
+    insights = bm.get_insights_snapshot()
+    if insights is None:
+        st.error("Could not load business insights.")
+    else:
+        st.subheader("Campaign Totals and Averages")
+        col1, col2, col3 = st.columns(3)
+
+        with col1:
+            st.metric("Total Campaigns", insights.campaign_count)
+        with col2:
+            st.metric("Total Campaign Budget", f"${insights.total_budget:,.2f}")
+        with col3:
+            st.metric("Average Clicks (All Campaigns)", f"{insights.average_clicks:.2f}")
+
+        st.subheader("Performance Highlights")
+        st.markdown(f"**Highest Clicks in a single entry:** {insights.max_clicks}")
+        st.markdown(f"**Lowest Clicks in a single entry:** {insights.min_clicks}")
+        st.markdown(f"**Highest Emails Sent in a single entry:** {insights.max_sent}")
+        st.markdown(f"**Highest Emails Opened in a single entry:** {insights.max_opened}")
+
+        if insights.top_campaign:
+            st.success(f"The most successful campaign is '{insights.top_campaign}' with a total of {insights.top_campaign_clicks} clicks.")
+        else:
+            st.info("No clicks data to determine the most successful campaign.")
+
+    st.subheader("Campaign Leaderboard")
+    col1, col2, col3 = st.columns([2, 2, 1])
     with col1:
-        st.metric("Total Campaigns", bm.get_campaign_count())
+        leaderboard_metric = st.selectbox("Rank by", list(LEADERBOARD_METRICS), key="leaderboard_metric")
     with col2:
-        total_budget = bm.get_total_campaign_budget()
-        st.metric("Total Campaign Budget", f"${total_budget:,.2f}")
+        leaderboard_period = st.selectbox(
+            "Period", list(KPI_PERIODS), index=list(KPI_PERIODS).index(KPI_DEFAULT_PERIOD), key="leaderboard_period"
+        )
     with col3:
-        avg_clicks = bm.get_average_clicks_per_campaign()
-        st.metric("Average Clicks (All Campaigns)", f"{avg_clicks:.2f}")
-
-    st.subheader("Performance Highlights")
-    max_min_metrics = bm.get_max_min_metrics()
-    if max_min_metrics:
-        st.markdown(f"**Highest Clicks in a single entry:** {max_min_metrics.get('max_clicks', 'N/A')}")
-        st.markdown(f"**Lowest Clicks in a single entry:** {max_min_metrics.get('min_clicks', 'N/A')}")
-        st.markdown(f"**Highest Emails Sent in a single entry:** {max_min_metrics.get('max_sent', 'N/A')}")
-        st.markdown(f"**Highest Emails Opened in a single entry:** {max_min_metrics.get('max_opened', 'N/A')}")
-    
-    most_successful = bm.get_most_successful_campaign()
-    if most_successful:
-        st.success(f"The most successful campaign is '{most_successful[0]}' with a total of {most_successful[1]} clicks.")
+        leaderboard_size = st.selectbox("Top", LEADERBOARD_SIZES, index=1, key="leaderboard_size")
+    # Same buckets as the key metrics, but only the latest period is ranked
+    period = KPI_PERIODS[leaderboard_period]
+    _, leaderboard_end, leaderboard_unit = kpi_mar.kpi_window(period)
+    leaderboard = bm.get_campaign_leaderboard(
+        LEADERBOARD_METRICS[leaderboard_metric], start=leaderboard_end - period if period else None,
+        end=leaderboard_end, limit=leaderboard_size, unit=leaderboard_unit
+    )
+    if leaderboard:
+        df_leaderboard = pd.DataFrame(
+            [entry[:-1] for entry in leaderboard],
+            columns=['Rank', 'Campaign ID', 'Campaign', 'Emails Sent', 'Emails Opened', 'Clicks', 'Spend']
+        )
+        df_leaderboard['Spend'] = df_leaderboard['Spend'].round(2)
+        # The ranked value is the matching column below, so it is not shown twice
+        df_leaderboard['Open Rate'] = (
+            df_leaderboard['Emails Opened'] / df_leaderboard['Emails Sent'].where(df_leaderboard['Emails Sent'] > 0) * 100
+        ).round(2)
+        df_leaderboard['Click-Through Rate'] = (
+            df_leaderboard['Clicks'] / df_leaderboard['Emails Opened'].where(df_leaderboard['Emails Opened'] > 0) * 100
+        ).round(2)
+        df_leaderboard['Cost per Click'] = (df_leaderboard['Spend'] / df_leaderboard['Clicks'].where(df_leaderboard['Clicks'] > 0)).round(2)
+        st.dataframe(df_leaderboard, use_container_width=True, hide_index=True)
+    else:
+        st.info("No campaign performance to rank for this period.")
+
+    st.subheader("Performance by Channel")
+    st.caption(
+        "Budgets are split evenly across a campaign's channels. Metrics logged for a channel count towards it; "
+        "the rest are split evenly across the campaign's channels."
+    )
+    channel_performance = bm.get_channel_performance()
+    if channel_performance:
+        df_channels = pd.DataFrame(channel_performance, columns=['Channel', 'Campaigns', 'Spend', 'Emails Sent', 'Emails Opened', 'Clicks'])
+        amounts = ['Spend', 'Emails Sent', 'Emails Opened', 'Clicks']
+        df_channels[amounts] = df_channels[amounts].astype(float)
+        df_channels['Open Rate'] = (df_channels['Emails Opened'] / df_channels['Emails Sent'] * 100).fillna(0).round(2)
+        df_channels['Cost per Click'] = (df_channels['Spend'] / df_channels['Clicks'].where(df_channels['Clicks'] > 0)).round(2)
+        st.dataframe(df_channels, use_container_width=True)
+        st.bar_chart(df_channels, x='Channel', y=['Clicks'])
+
+elif choice == "Diagnostics":
+    st.header("Query Diagnostics 🩺")
+    diagnostics = bm.query_diagnostics()
+    st.caption(
+        f"Since {diagnostics['since']:%Y-%m-%d %H:%M:%S}. Statements slower than {diagnostics['slow_ms']:.0f} ms "
+        "are logged on the backend_mar.slow_queries logger; set SLOW_QUERY_MS to change the threshold."
+    )
+    if st.button("Reset Statistics"):
+        bm.reset_query_diagnostics()
+        st.rerun()
+
+    pool_wait = diagnostics["pool_wait"]
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Connection Checkouts", pool_wait["count"])
+    col2.metric("Mean Wait (ms)", f"{pool_wait['mean_ms']:.2f}")
+    col3.metric("p95 Wait (ms)", f"{pool_wait['p95_ms']:.2f}")
+    col4.metric("Max Wait (ms)", f"{pool_wait['max_ms']:.2f}")
+
+    st.subheader("Statements by Total Time")
+    if diagnostics["queries"]:
+        df_queries = pd.DataFrame(diagnostics["queries"])
+        df_queries = df_queries[['fingerprint', 'count', 'errors', 'rows', 'total_ms', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms']]
+        st.dataframe(df_queries.round(2), use_container_width=True, hide_index=True)
+
+        selected = st.selectbox("Latency histogram for", df_queries['fingerprint'], format_func=lambda x: x[:120])
+        buckets = next(query["buckets"] for query in diagnostics["queries"] if query["fingerprint"] == selected)
+        df_buckets = pd.DataFrame(
+            [(f"≤ {bound} ms" if bound is not None else "slower", count) for bound, count in buckets],
+            columns=['Latency', 'Statements']
+        )
+        st.bar_chart(df_buckets, x='Latency', y='Statements', sort=False)
     else:
-        st.info("No clicks data to determine the most successful campaign.")
\ No newline at end of file
+        st.info("No statements recorded yet.")
+
+    st.subheader("Recent Slow Statements")
+    if diagnostics["slow_queries"]:
+        st.dataframe(pd.DataFrame(diagnostics["slow_queries"][::-1]), use_container_width=True, hide_index=True)
+    else:
+        st.info("No slow statements recorded.")
+
+# Query cache counters, read after the page has run so they include this rerun.
+cache = bm.cache_stats()
+with st.sidebar.expander("Query Cache"):
+    st.caption(
+        f"{cache['hits']} hits, {cache['misses']} misses, {cache['entries']} entries cached "
+        f"({cache['bytes'] / 2**20:.1f} MB), {cache['invalidations']} invalidated, {cache['evictions']} evicted, "
+        f"{cache['oversized']} too large to cache"
+    )
@@ -0,0 +1,189 @@
+"""Query instrumentation for backend_mar: per-statement timings, histograms and a slow-query log.
+
+backend_mar's pool hands out connections whose cursors are
+InstrumentedCursor, so every execute(), executemany() and copy_expert() is
+timed and recorded under its fingerprint: the statement with literals and
+parameter placeholders replaced by "?" and whitespace collapsed, so calls
+that differ only in their values are grouped together. Time spent waiting
+for a pooled connection is recorded separately.
+
+Statements slower than SLOW_QUERY_MS are logged as warnings on the
+"backend_mar.slow_queries" logger (fingerprint only, never parameter values)
+and kept in a short in-memory list. add_query_hook() registers extra
+callbacks, e.g. to forward timings to an external metrics system.
+"""
+import functools
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import psycopg2.extensions
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+SLOW_QUERY_LOG_SIZE = 100
+MAX_FINGERPRINTS = 500
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended.
+HISTOGRAM_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+slow_query_logger = logging.getLogger("backend_mar.slow_queries")
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w$.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%(?:\(\w+\))?s")
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+@functools.lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """Returns `sql` with literals and placeholders replaced by "?" and whitespace collapsed."""
+    normalized = _STRING_RE.sub("?", sql)
+    normalized = _PLACEHOLDER_RE.sub("?", normalized)
+    normalized = _NUMBER_RE.sub("?", normalized)
+    normalized = _LIST_RE.sub("(?, ...)", normalized)
+    return _WHITESPACE_RE.sub(" ", normalized).strip().rstrip(";").strip()
+
+class Histogram:
+    """Counts of observations per HISTOGRAM_BOUNDS_MS bucket, plus their sum and maximum."""
+
+    def __init__(self):
+        self.counts = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms):
+        index = 0
+        while index < len(HISTOGRAM_BOUNDS_MS) and ms > HISTOGRAM_BOUNDS_MS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q):
+        """Returns the upper bound (ms) of the bucket holding the q-quantile; the maximum for the last bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return min(HISTOGRAM_BOUNDS_MS[index], self.max_ms) if index < len(HISTOGRAM_BOUNDS_MS) else self.max_ms
+        return self.max_ms
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total_ms": self.total_ms,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "max_ms": self.max_ms,
+            "buckets": list(zip(HISTOGRAM_BOUNDS_MS + (None,), self.counts)),
+        }
+
+class QueryStats:
+    """Thread-safe per-fingerprint statement statistics and connection wait times."""
+
+    def __init__(self, slow_ms=SLOW_QUERY_MS):
+        self.slow_ms = slow_ms
+        self._lock = threading.Lock()
+        self._hooks = []
+        self.reset()
+
+    def reset(self):
+        """Drops every recorded statistic."""
+        with self._lock:
+            self._queries = {}
+            self._pool_wait = Histogram()
+            self._slow = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+            self._started = datetime.now()
+
+    def add_hook(self, hook):
+        """Calls hook(fingerprint, seconds, rows, error) after every recorded statement."""
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self._hooks.remove(hook)
+
+    def record_query(self, sql, seconds, rows, error=None):
+        """Records one statement's duration, row count and whether it failed."""
+        key = fingerprint(sql)
+        ms = seconds * 1000
+        rows = max(rows, 0)
+        with self._lock:
+            stats = self._queries.get(key)
+            if stats is None:
+                if len(self._queries) >= MAX_FINGERPRINTS:
+                    key = "<other statements>"
+                    stats = self._queries.get(key)
+                if stats is None:
+                    stats = self._queries[key] = {"histogram": Histogram(), "rows": 0, "errors": 0}
+            stats["histogram"].observe(ms)
+            stats["rows"] += rows
+            if error is not None:
+                stats["errors"] += 1
+            if ms >= self.slow_ms:
+                self._slow.append({"at": datetime.now(), "fingerprint": key, "ms": ms, "rows": rows, "error": error})
+        if ms >= self.slow_ms:
+            slow_query_logger.warning("slow query (%.1f ms, %d rows%s): %s", ms, rows, f", failed: {error}" if error else "", key)
+        for hook in self._hooks:
+            try:
+                hook(key, seconds, rows, error)
+            except Exception as hook_error:
+                print(f"Error in query hook: {hook_error}")
+
+    def record_pool_wait(self, seconds):
+        """Records how long a caller waited for a pooled connection."""
+        with self._lock:
+            self._pool_wait.observe(seconds * 1000)
+
+    def snapshot(self):
+        """Returns the recorded statistics, with queries sorted by total time."""
+        with self._lock:
+            queries = [
+                dict(stats["histogram"].summary(), fingerprint=key, rows=stats["rows"], errors=stats["errors"])
+                for key, stats in self._queries.items()
+            ]
+            pool_wait = self._pool_wait.summary()
+            slow = list(self._slow)
+            started = self._started
+        queries.sort(key=lambda query: query["total_ms"], reverse=True)
+        return {"since": started, "slow_ms": self.slow_ms, "queries": queries, "pool_wait": pool_wait, "slow_queries": slow}
+
+query_stats = QueryStats()
+
+def add_query_hook(hook):
+    """Registers hook(fingerprint, seconds, rows, error) to run after every statement."""
+    query_stats.add_hook(hook)
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """A cursor that records every statement it runs in query_stats."""
+
+    def _timed(self, query, run):
+        started = time.perf_counter()
+        error = None
+        try:
+            return run()
+        except Exception as exc:
+            error = type(exc).__name__
+            raise
+        finally:
+            sql = query if isinstance(query, str) else (query.decode() if isinstance(query, bytes) else query.as_string(self))
+            query_stats.record_query(sql, time.perf_counter() - started, self.rowcount, error)
+
+    def execute(self, query, vars=None):
+        return self._timed(query, lambda: super(InstrumentedCursor, self).execute(query, vars))
+
+    def executemany(self, query, vars_list):
+        return self._timed(query, lambda: super(InstrumentedCursor, self).executemany(query, vars_list))
+
+    def copy_expert(self, sql, file, size=8192):
+        return self._timed(sql, lambda: super(InstrumentedCursor, self).copy_expert(sql, file, size))
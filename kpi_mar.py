@@ -0,0 +1,164 @@
+"""Vectorized campaign KPIs over columnar performance metrics.
+
+Metrics are read with read_metric_columns() of the storage engine selected by
+DB_ENGINE as parallel NumPy arrays and summed per campaign with np.bincount,
+so no Python object is built per metric and no DataFrame groupby runs on a
+page rerun. compute_campaign_kpis() reports, per campaign:
+
+    emails_sent, emails_opened, clicks   totals in the current period
+    spend                                the budget share of the period
+    open_rate, click_through_rate        opened / sent and clicks / opened, in %
+    cost_per_click                       spend / clicks, NaN without clicks
+    *_change                             current minus previous period
+
+A campaign's budget is spread evenly over its days (end date included) to
+get its spend in a period. Ratios with a zero denominator are 0, except cost
+per click, which is NaN.
+"""
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+import storage_mar
+
+bm = storage_mar.load_backend()
+
+# Periods shorter than this are read from hourly buckets, longer ones and all time from daily buckets
+DAILY_BUCKETS_FROM = timedelta(days=30)
+# Metrics whose period-over-period change is reported
+CHANGE_FIELDS = ("clicks", "open_rate", "click_through_rate", "cost_per_click")
+
+def safe_divide(numerator, denominator, fill=0.0):
+    """Divides elementwise, giving `fill` where the denominator is zero."""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    result = np.full(np.broadcast(numerator, denominator).shape, fill, dtype=np.float64)
+    np.divide(numerator, denominator, out=result, where=denominator != 0)
+    return result
+
+def _datetime64(value):
+    """Converts a date, datetime or None to datetime64[us]; None stays None."""
+    if value is None:
+        return None
+    if isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time())
+    return np.datetime64(value, "us")
+
+def kpi_window(period, now=None):
+    """Returns (start, end, unit) of the metrics to read for `period` (a timedelta, or None for all time).
+
+    `end` is the start of the bucket after `now`, so the current hour or day
+    counts in full, and `start` is two periods earlier so the previous period
+    can be compared (None for all time).
+    """
+    now = now or datetime.now()
+    if period is None or period >= DAILY_BUCKETS_FROM:
+        unit, end = "day", datetime.combine(now.date(), datetime.min.time()) + timedelta(days=1)
+    else:
+        unit, end = "hour", now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    return (end - 2 * period if period else None), end, unit
+
+def campaign_columns(campaigns):
+    """Turns read_campaigns() dicts into (ids, names, budgets, start_dates, end_dates) arrays sorted by id."""
+    campaigns = sorted(campaigns, key=lambda campaign: campaign["id"])
+    return (
+        np.array([campaign["id"] for campaign in campaigns], dtype=np.int64),
+        np.array([campaign["name"] for campaign in campaigns], dtype=object),
+        np.array([float(campaign["budget"]) for campaign in campaigns], dtype=np.float64),
+        np.array([campaign["start_date"] for campaign in campaigns], dtype="datetime64[D]"),
+        np.array([campaign["end_date"] for campaign in campaigns], dtype="datetime64[D]"),
+    )
+
+def _campaign_positions(metric_campaign_ids, campaign_ids):
+    """Maps each metric's campaign id to its index in `campaign_ids`, -1 for unknown campaigns."""
+    # Ids past the table are clipped onto its last entry, which is -1
+    lookup = np.full(int(campaign_ids.max(initial=0)) + 2, -1, dtype=np.int64)
+    lookup[campaign_ids] = np.arange(len(campaign_ids))
+    return lookup.take(metric_campaign_ids, mode="clip")
+
+def campaign_totals(columns, campaign_ids, edges):
+    """Sums emails_sent, emails_opened and clicks per period and campaign in one pass.
+
+    `edges` are the ascending bounds of consecutive periods [edges[0],
+    edges[1]), [edges[1], edges[2]) ...; a leading None leaves the first
+    period open. Returns three int64 arrays of shape (periods, campaigns),
+    aligned with the distinct, positive `campaign_ids`; metrics of other
+    campaigns or outside the periods are ignored.
+    """
+    periods, campaigns = len(edges) - 1, len(campaign_ids)
+    timestamps = columns.timestamp
+    slot = _campaign_positions(columns.campaign_id, campaign_ids)
+    ignored = (slot < 0) | (timestamps >= _datetime64(edges[-1]))
+    if edges[0] is not None:
+        ignored |= timestamps < _datetime64(edges[0])
+    # Comparisons against the inner edges are cheaper than np.searchsorted on large arrays
+    for edge in edges[1:-1]:
+        slot += (timestamps >= _datetime64(edge)) * campaigns
+    # Ignored metrics are counted in one extra slot that is dropped afterwards
+    slot[ignored] = periods * campaigns
+    return tuple(
+        np.bincount(slot, weights=values, minlength=periods * campaigns + 1)[:-1].astype(np.int64).reshape(periods, campaigns)
+        for values in (columns.emails_sent, columns.emails_opened, columns.clicks)
+    )
+
+def prorated_spend(budgets, start_dates, end_dates, start=None, end=None):
+    """Returns each budget's share of [start, end), spreading it evenly from start_date to the end of end_date."""
+    first = start_dates.astype("datetime64[us]")
+    last = (end_dates + np.timedelta64(1, "D")).astype("datetime64[us]")
+    overlap_start = first if start is None else np.maximum(first, _datetime64(start))
+    overlap_end = last if end is None else np.minimum(last, _datetime64(end))
+    overlap = np.maximum(overlap_end - overlap_start, np.timedelta64(0, "us")).astype(np.int64)
+    duration = np.maximum(last - first, np.timedelta64(0, "us")).astype(np.int64)
+    return budgets * safe_divide(overlap, duration)
+
+def _period_kpis(campaigns, totals, period_index, start, end):
+    _, _, budgets, start_dates, end_dates = campaigns
+    emails_sent, emails_opened, clicks = (values[period_index] for values in totals)
+    spend = prorated_spend(budgets, start_dates, end_dates, start, end)
+    return {
+        "spend": spend,
+        "emails_sent": emails_sent,
+        "emails_opened": emails_opened,
+        "clicks": clicks,
+        "open_rate": safe_divide(emails_opened, emails_sent) * 100,
+        "click_through_rate": safe_divide(clicks, emails_opened) * 100,
+        "cost_per_click": safe_divide(spend, clicks, fill=np.nan),
+    }
+
+def compute_campaign_kpis(columns, campaigns, end, period=None):
+    """Computes per-campaign KPIs for [end - period, end) and their change from the period before.
+
+    `columns` are MetricColumns covering at least both periods and
+    `campaigns` read_campaigns() dicts. With `period` None the current period
+    is all metrics before `end` and the changes are NaN. Returns a dict of
+    equally long arrays: campaign_id and name, then the fields described in
+    the module docstring, in campaign id order.
+    """
+    campaigns = campaign_columns(campaigns)
+    if period:
+        start = end - period
+        totals = campaign_totals(columns, campaigns[0], [start - period, start, end])
+        previous = _period_kpis(campaigns, totals, 0, start - period, start)
+        current = _period_kpis(campaigns, totals, 1, start, end)
+    else:
+        totals = campaign_totals(columns, campaigns[0], [None, end])
+        current = _period_kpis(campaigns, totals, 0, None, end)
+    kpis = {"campaign_id": campaigns[0], "name": campaigns[1], **current}
+    for field in CHANGE_FIELDS:
+        kpis[f"{field}_change"] = current[field] - previous[field] if period else np.full(len(campaigns[0]), np.nan)
+    return kpis
+
+def get_campaign_kpis(period=timedelta(days=7), now=None):
+    """Reads the metrics of the last two periods and returns compute_campaign_kpis() for the latest one.
+
+    Returns None on error.
+    """
+    try:
+        start, end, unit = kpi_window(period, now)
+        columns = bm.read_metric_columns(start, end, unit=unit)
+        if columns is None:
+            return None
+        return compute_campaign_kpis(columns, bm.read_campaigns(), end, period)
+    except Exception as error:
+        print(f"Error computing campaign KPIs: {error}")
+        return None
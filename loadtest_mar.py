@@ -0,0 +1,292 @@
+"""Reproducible load test for the storage backend on seeded synthetic data.
+
+Generates data with datagen_mar, times each backend function, then
+simulates concurrent Streamlit sessions that load the app's pages in a loop,
+and writes everything to a JSON file that can be compared across commits:
+
+    DB_NAME=campaigns_bench python loadtest_mar.py --rows 100000 --sessions 8 --output before.json
+    DB_NAME=campaigns_bench python loadtest_mar.py --rows 100000 --sessions 8 --output after.json --compare before.json
+
+With --embedded DIR it runs against an embedded PostgreSQL in DIR instead
+(needs the pgserver package), so no database server or network is required.
+DB_ENGINE=sqlite tests the embedded SQLite engine on the SQLITE_PATH file.
+Generated rows are removed afterwards unless --keep-data is given.
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import threading
+import time
+from datetime import datetime, timedelta
+
+import async_mar as am
+import datagen_mar
+import kpi_mar
+from cache_mar import QueryCache
+
+bm = datagen_mar.bm
+
+CHART_POINTS = 500
+
+# --- Statistics ---
+
+def summarize(durations):
+    """Returns count, mean, p50, p95, p99 and max (ms) of durations in seconds."""
+    if not durations:
+        return {"count": 0}
+    ms = sorted(d * 1000 for d in durations)
+
+    def percentile(q):
+        return ms[min(len(ms) - 1, int(q * len(ms)))]
+
+    return {
+        "count": len(ms), "mean_ms": statistics.fmean(ms), "p50_ms": percentile(0.5),
+        "p95_ms": percentile(0.95), "p99_ms": percentile(0.99), "max_ms": ms[-1],
+    }
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# --- Function Timings ---
+
+def function_cases(data, rng):
+    """Returns (name, callable) pairs covering the backend read and write paths."""
+    anchor = datetime.fromisoformat(data["anchor"])
+    campaign_ids, segment_ids = data["campaign_ids"], data["segment_ids"]
+    seed = data["seed"]
+    counter = iter(range(10 ** 9))
+
+    def campaign_round_trip():
+        name = f"{datagen_mar.GEN_PREFIX}{seed}-load-{next(counter)}"
+        bm.create_campaign(name, 1000, anchor.date(), anchor.date(), "", ["Email", "Paid Ads"])
+        campaign = bm.read_campaigns_page(page_size=1, name_contains=name)[0][0]
+        bm.update_campaign(campaign["id"], name, 2000, anchor.date(), anchor.date(), "", ["Email"])
+        bm.delete_campaign(campaign["id"])
+
+    def customer_round_trip():
+        email = f"{datagen_mar.GEN_PREFIX}{seed}-load-{next(counter)}@example.com"
+        bm.create_customer("Load Test", email, {"location": "North", "age": 30})
+        customer = bm.read_customers_page(page_size=1, search=email)[0][0]
+        bm.update_customer(customer[0], "Load Test", email, {"location": "South", "age": 31})
+        bm.delete_customer(customer[0])
+
+    return [
+        ("read_campaigns", bm.read_campaigns),
+        ("read_campaigns_page", lambda: bm.read_campaigns_page(page_size=50)),
+        ("read_campaigns_page (filtered)", lambda: bm.read_campaigns_page(page_size=50, channel="Email", sort_by="budget", descending=True)),
+        ("read_customers_page", lambda: bm.read_customers_page(page_size=50)),
+        ("read_customers_page (criteria)", lambda: bm.read_customers_page(page_size=50, criteria="location = North\nage < 30")),
+        ("find_customers_by_demographics", lambda: bm.find_customers_by_demographics({"plan": "pro"}, {"age": (30, 40)})),
+        ("count_customers_matching", lambda: bm.count_customers_matching("plan IN ('pro', 'team') AND age >= 40")),
+        ("read_segments", bm.read_segments),
+        ("stream_segments", lambda: sum(1 for _ in bm.stream_segments())),
+        ("stream_customers", lambda: sum(len(rows) for rows in bm.stream_customers())),
+        ("refresh_segment", lambda: bm.refresh_segment(rng.choice(segment_ids))),
+        ("get_campaign_metric_totals", bm.get_campaign_metric_totals),
+        ("get_performance_metrics (campaign, 30 days)", lambda: bm.get_performance_metrics(
+            rng.choice(campaign_ids), anchor - timedelta(days=30), anchor, CHART_POINTS)),
+        ("get_performance_metrics (all, 365 days)", lambda: bm.get_performance_metrics(
+            None, anchor - timedelta(days=365), anchor, CHART_POINTS)),
+        ("stream_performance_metrics (all, 365 days)", lambda: sum(
+            len(rows) for rows in bm.stream_performance_metrics(None, anchor - timedelta(days=365), anchor))),
+        ("read_metric_columns (all, 365 days)", lambda: bm.read_metric_columns(anchor - timedelta(days=365), anchor)),
+        ("get_campaign_kpis (7 days)", lambda: kpi_mar.get_campaign_kpis(timedelta(days=7), anchor)),
+        ("get_campaign_kpis (all time)", lambda: kpi_mar.get_campaign_kpis(None, anchor)),
+        ("get_insights_snapshot", lambda: bm.get_insights_snapshot(use_cache=False)),
+        ("get_channel_performance (365 days)", lambda: bm.get_channel_performance(anchor - timedelta(days=365), anchor)),
+        ("get_campaign_leaderboard (clicks, 7 days)", lambda: bm.get_campaign_leaderboard(
+            "clicks", anchor - timedelta(days=7), anchor, unit="hour")),
+        ("get_campaign_leaderboard (CPC, all time)", lambda: bm.get_campaign_leaderboard("cost_per_click", end=anchor)),
+        ("log_performance_metric", lambda: bm.log_performance_metric(rng.choice(campaign_ids), 100, 20, 3)),
+        ("campaign create/update/delete", campaign_round_trip),
+        ("customer create/update/delete", customer_round_trip),
+    ]
+
+def time_functions(data, repeat, seed):
+    """Times every function case `repeat` times with the query cache disabled."""
+    rng = random.Random(seed)
+    cached, bm._query_cache = bm._query_cache, QueryCache(ttl=0)
+    results = {}
+    try:
+        for name, func in function_cases(data, rng):
+            durations = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                func()
+                durations.append(time.perf_counter() - started)
+            results[name] = summarize(durations)
+            print(f"  {name:<46}p50 {results[name]['p50_ms']:>9.2f} ms   p95 {results[name]['p95_ms']:>9.2f} ms", flush=True)
+    finally:
+        bm._query_cache = cached
+    return results
+
+# --- Session Simulation ---
+
+def page_loaders(data):
+    """Returns page name -> callable issuing the same backend calls as that page of frontend_mar.py."""
+    anchor = datetime.fromisoformat(data["anchor"])
+    campaign_ids = data["campaign_ids"]
+
+    def performance_tracking(rng):
+        campaign_id = rng.choice([None] + campaign_ids)
+        kpi_start, kpi_end, kpi_unit = kpi_mar.kpi_window(timedelta(days=7), anchor)
+        page_data = am.load_page_data({
+            "campaigns": am.read_campaigns,
+            "metric_columns": lambda: am.read_metric_columns(kpi_start, kpi_end, unit=kpi_unit),
+            "performance_data": lambda: am.get_performance_metrics(
+                campaign_id, anchor - timedelta(days=30), anchor, CHART_POINTS),
+        })
+        kpi_mar.compute_campaign_kpis(page_data["metric_columns"], page_data["campaigns"], kpi_end, timedelta(days=7))
+
+    def customer_segmentation(rng):
+        bm.read_customers_page(page_size=50)
+        bm.read_segments()
+
+    def business_insights(rng):
+        bm.get_insights_snapshot()
+        _, end, unit = kpi_mar.kpi_window(timedelta(days=7))
+        bm.get_campaign_leaderboard("clicks", end - timedelta(days=7), end, unit=unit)
+        bm.get_channel_performance()
+
+    return {
+        "Campaign Management": lambda rng: bm.read_campaigns_page(page_size=50),
+        "Customer Segmentation": customer_segmentation,
+        "Performance Tracking": performance_tracking,
+        "Business Insights": business_insights,
+    }
+
+def simulate_sessions(data, sessions, duration, think_time, write_ratio, seed):
+    """Runs `sessions` threads that load random pages for `duration` seconds.
+
+    Each page load is followed by a random pause of up to `think_time`
+    seconds; with probability `write_ratio` a session logs a metric first, so
+    cache invalidation is exercised. Returns per-page latency summaries,
+    throughput and errors.
+    """
+    loaders = page_loaders(data)
+    latencies = {page: [] for page in loaders}
+    errors = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def session(number):
+        rng = random.Random(seed * 1000 + number)
+        while time.monotonic() < deadline:
+            page = rng.choice(list(loaders))
+            started = time.perf_counter()
+            try:
+                if rng.random() < write_ratio:
+                    bm.log_performance_metric(rng.choice(data["campaign_ids"]), 100, 20, 3)
+                loaders[page](rng)
+            except Exception as error:
+                with lock:
+                    errors.append(f"{page}: {error}")
+                continue
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies[page].append(elapsed)
+            time.sleep(rng.uniform(0, think_time))
+
+    threads = [threading.Thread(target=session, args=(n,)) for n in range(sessions)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    loads = sum(len(durations) for durations in latencies.values())
+    return {
+        "sessions": sessions, "seconds": elapsed, "page_loads": loads, "page_loads_per_second": loads / elapsed,
+        "all_pages": summarize([d for durations in latencies.values() for d in durations]),
+        "pages": {page: summarize(durations) for page, durations in latencies.items()},
+        "errors": errors[:20], "error_count": len(errors),
+    }
+
+# --- Comparison ---
+
+def compare(baseline, current):
+    """Prints p50/p95 of every function and page next to a baseline result file."""
+    print(f"{'':<46}{'base p50':>10}{'p50':>10}{'change':>9}{'base p95':>11}{'p95':>10}{'change':>9}")
+    sections = [("functions", lambda r: r["functions"]), ("pages", lambda r: r["sessions"]["pages"])]
+    for title, pick in sections:
+        print(title)
+        for name, now in pick(current).items():
+            before = pick(baseline).get(name)
+            if not before or not before.get("count") or not now.get("count"):
+                continue
+            row = f"  {name:<44}"
+            for key in ("p50_ms", "p95_ms"):
+                change = (now[key] / before[key] - 1) * 100 if before[key] else 0.0
+                row += f"{before[key]:>10.2f}{now[key]:>10.2f}{change:>+8.0f}%"
+            print(row)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000, help="approximate total rows to generate (10k to 10M)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=20, help="timed calls per backend function")
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent simulated Streamlit sessions")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run the session simulation")
+    parser.add_argument("--think-time", type=float, default=0.2, help="maximum pause between page loads (s)")
+    parser.add_argument("--write-ratio", type=float, default=0.05, help="share of page loads preceded by a write")
+    parser.add_argument("--output", default="loadtest_results.json")
+    parser.add_argument("--compare", metavar="BASELINE", help="result file of an earlier run to compare with")
+    parser.add_argument("--embedded", metavar="DIR", help="use an embedded PostgreSQL in DIR (needs pgserver)")
+    parser.add_argument("--keep-data", action="store_true", help="leave the generated rows in the database")
+    args = parser.parse_args()
+
+    if args.embedded:
+        datagen_mar.use_embedded_database(args.embedded)
+    datagen_mar.drop_generated()
+    try:
+        print(f"Generating about {args.rows:,} rows (seed {args.seed})...", flush=True)
+        data = datagen_mar.generate(args.rows, args.seed)
+        print("Timing backend functions...", flush=True)
+        functions = time_functions(data, args.repeat, args.seed)
+        print(f"Simulating {args.sessions} sessions for {args.duration:.0f}s...", flush=True)
+        bm.reset_query_diagnostics()
+        sessions = simulate_sessions(data, args.sessions, args.duration, args.think_time, args.write_ratio, args.seed)
+        diagnostics = bm.query_diagnostics()
+        with bm.db_cursor() as cur:
+            cur.execute("SELECT sqlite_version();" if datagen_mar.SQLITE else "SHOW server_version;")
+            server_version = cur.fetchone()[0]
+    finally:
+        am.shutdown_executor()
+        if not args.keep_data:
+            datagen_mar.drop_generated()
+
+    result = {
+        "meta": {
+            "commit": _git_commit(), "started": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "engine": datagen_mar.storage_mar.DB_ENGINE, "server_version": server_version,
+            "embedded": bool(args.embedded), "args": vars(args),
+        },
+        "data": {key: data[key] for key in ("seed", "anchor", "counts", "seconds")},
+        "functions": functions,
+        "sessions": sessions,
+        "cache": bm.cache_stats(),
+        "top_statements": [
+            {key: query[key] for key in ("fingerprint", "count", "total_ms", "p50_ms", "p95_ms", "max_ms")}
+            for query in diagnostics["queries"][:10]
+        ],
+        "pool_wait": {key: value for key, value in diagnostics["pool_wait"].items() if key != "buckets"},
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, default=str)
+    all_pages = sessions["all_pages"]
+    print(f"{sessions['page_loads']} page loads, {sessions['page_loads_per_second']:.1f}/s, "
+          f"p50 {all_pages.get('p50_ms', 0):.1f} ms, p95 {all_pages.get('p95_ms', 0):.1f} ms, "
+          f"{sessions['error_count']} errors; results written to {args.output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), result)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Versioned schema migrations for the campaign tracker database.
+
+Migrations are the SQL files in the migrations directory, named
+NNNN_description.sql and applied in version order. Each one runs in its own
+transaction and is recorded in the schema_migrations table, so only pending
+migrations run. Every migration is also written to be safe to run more than
+once, so databases created by hand from an older README schema can be brought
+up to date by applying all of them. It uses the same DB_* environment
+variables as the app:
+
+    python migrate_mar.py            # apply pending migrations
+    python migrate_mar.py status     # list applied and pending migrations
+    python migrate_mar.py check      # EXPLAIN the hot queries and check they use their indexes
+"""
+import argparse
+import json
+import os
+import re
+import sys
+
+import psycopg2
+
+import backend_mar as bm
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+_MIGRATION_RE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+
+# Any fixed key works; it only has to be the same for every runner.
+MIGRATION_LOCK_KEY = 0x6D6372
+
+# (description, query, params, index the query must be able to use)
+HOT_QUERIES = [
+    (
+        "read_campaigns_page: channels of each campaign",
+        "SELECT array_agg(ch.channel_type_id ORDER BY ch.id) FROM channels ch WHERE ch.campaign_id = %s;",
+        (1,), "channels_campaign_id_channel_type_id_idx",
+    ),
+    (
+        "read_campaigns_page: campaigns on a channel",
+        "SELECT campaign_id FROM channels WHERE channel_type_id = %s;",
+        (1,), "channels_channel_type_id_campaign_id_idx",
+    ),
+    (
+        "get_performance_metrics: one campaign over a time range",
+        "SELECT * FROM performance_metrics WHERE campaign_id = %s AND timestamp >= %s AND timestamp < %s ORDER BY timestamp;",
+        (1, "2024-01-01", "2024-02-01"), "performance_metrics_campaign_id_timestamp_idx",
+    ),
+    (
+        "read_segments / membership writes: members of a segment",
+        "SELECT customer_id FROM customer_segments WHERE segment_id = %s;",
+        (1,), "customer_segments_segment_id_idx",
+    ),
+]
+
+def list_migrations():
+    """Returns (version, name, path) for every migration file, in version order."""
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = _MIGRATION_RE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    migrations.sort()
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError("two migration files share a version number")
+    return migrations
+
+def _ensure_migrations_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+def applied_versions():
+    """Returns the set of migration versions recorded in schema_migrations."""
+    with bm.db_cursor() as cur:
+        _ensure_migrations_table(cur)
+        cur.execute("SELECT version FROM schema_migrations;")
+        return {row[0] for row in cur.fetchall()}
+
+def migrate(target=None):
+    """Applies every pending migration up to `target` (default: all); returns the versions applied.
+
+    A session advisory lock keeps concurrent runners from applying the same
+    migration twice. A failing migration is rolled back and stops the run;
+    migrations applied before it stay applied.
+    """
+    applied = []
+    with bm.db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s);", (MIGRATION_LOCK_KEY,))
+            try:
+                _ensure_migrations_table(cur)
+                conn.commit()
+                cur.execute("SELECT version FROM schema_migrations;")
+                done = {row[0] for row in cur.fetchall()}
+                for version, name, path in list_migrations():
+                    if version in done or (target is not None and version > target):
+                        continue
+                    with open(path, encoding="utf-8") as f:
+                        sql = f.read()
+                    try:
+                        cur.execute(sql)
+                        cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s);", (version, name))
+                        conn.commit()
+                    except psycopg2.Error as error:
+                        conn.rollback()
+                        raise RuntimeError(f"migration {version:04d}_{name} failed: {error}") from error
+                    applied.append(version)
+            finally:
+                cur.execute("SELECT pg_advisory_unlock(%s);", (MIGRATION_LOCK_KEY,))
+    if applied:
+        bm.invalidate_cache()
+    return applied
+
+def _plan_indexes(plan):
+    """Returns the names of every index used anywhere in an EXPLAIN (FORMAT JSON) plan node."""
+    names = {plan["Index Name"]} if "Index Name" in plan else set()
+    for child in plan.get("Plans", []):
+        names |= _plan_indexes(child)
+    return names
+
+def check_hot_queries():
+    """EXPLAINs each hot query and returns [(description, expected index, used indexes, ok)].
+
+    Sequential scans are disabled for the check, so it verifies that the
+    planner can answer each query from its index; on small tables it would
+    otherwise rightly prefer a sequential scan.
+    """
+    results = []
+    with bm.db_cursor() as cur:
+        cur.execute("SET LOCAL enable_seqscan = off;")
+        for description, query, params, index in HOT_QUERIES:
+            cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+            plan = cur.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            used = _plan_indexes(plan[0]["Plan"])
+            results.append((description, index, sorted(used), index in used))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", nargs="?", default="migrate", choices=["migrate", "status", "check"])
+    parser.add_argument("--target", type=int, help="highest migration version to apply")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        try:
+            applied = migrate(args.target)
+        except RuntimeError as error:
+            sys.exit(f"Error: {error}")
+        print(f"Applied {len(applied)} migration(s): {', '.join(f'{v:04d}' for v in applied) or 'none pending'}")
+    elif args.command == "status":
+        done = applied_versions()
+        for version, name, _ in list_migrations():
+            print(f"{version:04d}_{name:<40}{'applied' if version in done else 'pending'}")
+    elif args.command == "check":
+        failed = False
+        for description, index, used, ok in check_hot_queries():
+            print(f"{'OK  ' if ok else 'FAIL'} {description}: expected {index}, plan uses {', '.join(used) or 'no index'}")
+            failed = failed or not ok
+        sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
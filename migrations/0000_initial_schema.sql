@@ -0,0 +1,47 @@
+-- Creates the original campaign, customer, segment and performance tables.
+-- Later migrations evolve this schema; run them all with python migrate_mar.py.
+--
+-- Safe to run more than once.
+
+CREATE TABLE IF NOT EXISTS campaigns (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    budget DECIMAL(10, 2) NOT NULL,
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    description TEXT
+);
+
+CREATE TABLE IF NOT EXISTS channels (
+    id SERIAL PRIMARY KEY,
+    campaign_id INTEGER REFERENCES campaigns(id) ON DELETE CASCADE,
+    channel_type VARCHAR(50) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS customers (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    email VARCHAR(255) UNIQUE NOT NULL,
+    demographics TEXT
+);
+
+CREATE TABLE IF NOT EXISTS segments (
+    id SERIAL PRIMARY KEY,
+    segment_name VARCHAR(255) NOT NULL,
+    criteria TEXT
+);
+
+CREATE TABLE IF NOT EXISTS customer_segments (
+    customer_id INTEGER REFERENCES customers(id) ON DELETE CASCADE,
+    segment_id INTEGER REFERENCES segments(id) ON DELETE CASCADE,
+    PRIMARY KEY (customer_id, segment_id)
+);
+
+CREATE TABLE IF NOT EXISTS performance_metrics (
+    id SERIAL PRIMARY KEY,
+    campaign_id INTEGER REFERENCES campaigns(id) ON DELETE CASCADE,
+    emails_sent INTEGER DEFAULT 0,
+    emails_opened INTEGER DEFAULT 0,
+    clicks INTEGER DEFAULT 0,
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,61 @@
+-- Converts customers.demographics from free text to indexed JSONB.
+--
+-- Text such as "location: North, age=25" becomes {"location": "North", "age": 25}:
+-- key/value pairs are separated by commas, semicolons or newlines, keys are
+-- lower-cased with spaces turned into underscores, and numeric values become
+-- JSON numbers. Values that already hold a JSON object are kept as they are,
+-- and text without any key/value pair is kept under "notes".
+--
+-- Safe to run more than once.
+
+CREATE FUNCTION pg_temp.parse_demographics(raw TEXT) RETURNS JSONB AS $$
+DECLARE
+    result JSONB := '{}';
+    pair TEXT[];
+BEGIN
+    IF raw IS NULL OR btrim(raw) = '' THEN
+        RETURN result;
+    END IF;
+    IF btrim(raw) LIKE '{%' THEN
+        BEGIN
+            RETURN raw::jsonb;
+        EXCEPTION WHEN invalid_text_representation THEN
+            NULL;
+        END;
+    END IF;
+    FOR pair IN SELECT regexp_matches(raw, '([A-Za-z_][A-Za-z0-9_ ]*)\s*[:=]\s*([^,;\n]*)', 'g') LOOP
+        result := result || jsonb_build_object(
+            regexp_replace(lower(btrim(pair[1])), '\s+', '_', 'g'),
+            CASE
+                WHEN btrim(pair[2]) ~ '^-?[0-9]+(\.[0-9]+)?$' THEN to_jsonb(btrim(pair[2])::numeric)
+                ELSE to_jsonb(btrim(pair[2]))
+            END
+        );
+    END LOOP;
+    IF result = '{}' THEN
+        result := jsonb_build_object('notes', btrim(raw));
+    END IF;
+    RETURN result;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_name = 'customers' AND column_name = 'demographics') <> 'jsonb' THEN
+        ALTER TABLE customers
+            ALTER COLUMN demographics TYPE JSONB USING pg_temp.parse_demographics(demographics);
+    END IF;
+END;
+$$;
+
+UPDATE customers SET demographics = '{}' WHERE demographics IS NULL;
+ALTER TABLE customers ALTER COLUMN demographics SET DEFAULT '{}';
+ALTER TABLE customers ALTER COLUMN demographics SET NOT NULL;
+
+-- Containment lookups (demographics @> '{"location": "North"}')
+CREATE INDEX IF NOT EXISTS customers_demographics_idx ON customers USING GIN (demographics jsonb_path_ops);
+
+-- Range lookups on numeric keys; queries must use the same expression
+CREATE INDEX IF NOT EXISTS customers_demographics_age_idx ON customers
+    ((CASE WHEN jsonb_typeof(demographics -> 'age') = 'number' THEN (demographics ->> 'age')::numeric END));
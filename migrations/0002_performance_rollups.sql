@@ -0,0 +1,49 @@
+-- Adds hourly and daily per-campaign rollups of performance_metrics and
+-- backfills them from the raw rows. backend_mar keeps them up to date as
+-- metrics are logged; rebuild_performance_rollups() recomputes them.
+--
+-- Safe to run more than once.
+
+CREATE TABLE IF NOT EXISTS performance_rollup_hourly (
+    campaign_id INTEGER REFERENCES campaigns(id) ON DELETE CASCADE,
+    bucket TIMESTAMP NOT NULL,
+    entries INTEGER NOT NULL,
+    emails_sent BIGINT NOT NULL,
+    emails_opened BIGINT NOT NULL,
+    clicks BIGINT NOT NULL,
+    min_emails_sent INTEGER, max_emails_sent INTEGER,
+    min_emails_opened INTEGER, max_emails_opened INTEGER,
+    min_clicks INTEGER, max_clicks INTEGER,
+    PRIMARY KEY (campaign_id, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS performance_rollup_daily (
+    campaign_id INTEGER REFERENCES campaigns(id) ON DELETE CASCADE,
+    bucket TIMESTAMP NOT NULL,
+    entries INTEGER NOT NULL,
+    emails_sent BIGINT NOT NULL,
+    emails_opened BIGINT NOT NULL,
+    clicks BIGINT NOT NULL,
+    min_emails_sent INTEGER, max_emails_sent INTEGER,
+    min_emails_opened INTEGER, max_emails_opened INTEGER,
+    min_clicks INTEGER, max_clicks INTEGER,
+    PRIMARY KEY (campaign_id, bucket)
+);
+
+DELETE FROM performance_rollup_hourly;
+INSERT INTO performance_rollup_hourly
+SELECT campaign_id, date_trunc('hour', timestamp), COUNT(*),
+       COALESCE(SUM(emails_sent), 0), COALESCE(SUM(emails_opened), 0), COALESCE(SUM(clicks), 0),
+       MIN(emails_sent), MAX(emails_sent), MIN(emails_opened), MAX(emails_opened), MIN(clicks), MAX(clicks)
+FROM performance_metrics
+WHERE campaign_id IS NOT NULL
+GROUP BY 1, 2;
+
+DELETE FROM performance_rollup_daily;
+INSERT INTO performance_rollup_daily
+SELECT campaign_id, date_trunc('day', bucket), SUM(entries),
+       SUM(emails_sent), SUM(emails_opened), SUM(clicks),
+       MIN(min_emails_sent), MAX(max_emails_sent), MIN(min_emails_opened), MAX(max_emails_opened),
+       MIN(min_clicks), MAX(max_clicks)
+FROM performance_rollup_hourly
+GROUP BY 1, 2;
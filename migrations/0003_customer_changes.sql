@@ -0,0 +1,27 @@
+-- Adds the customer_changes log that refresh_segments_incremental() consumes,
+-- filled by statement-level triggers on customers.
+--
+-- Safe to run more than once.
+
+CREATE TABLE IF NOT EXISTS customer_changes (
+    id BIGSERIAL PRIMARY KEY,
+    customer_id INTEGER NOT NULL,
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION log_customer_changes() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO customer_changes (customer_id) SELECT id FROM changed_rows;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS customers_insert_changes ON customers;
+CREATE TRIGGER customers_insert_changes AFTER INSERT ON customers
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION log_customer_changes();
+
+DROP TRIGGER IF EXISTS customers_update_changes ON customers;
+CREATE TRIGGER customers_update_changes AFTER UPDATE ON customers
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION log_customer_changes();
@@ -0,0 +1,14 @@
+-- Indexes the foreign keys the hot read paths filter on. PostgreSQL does not
+-- index the referencing side of a foreign key by itself.
+--
+-- Safe to run more than once.
+
+-- Channels of a campaign (read_campaigns_page, update_campaign, campaign deletes)
+CREATE INDEX IF NOT EXISTS channels_campaign_id_idx ON channels (campaign_id);
+
+-- A campaign's metrics over a time range (get_performance_metrics, campaign deletes)
+CREATE INDEX IF NOT EXISTS performance_metrics_campaign_id_timestamp_idx ON performance_metrics (campaign_id, timestamp);
+
+-- Members of a segment (read_segments, membership writes, segment deletes); the
+-- primary key (customer_id, segment_id) only serves lookups by customer
+CREATE INDEX IF NOT EXISTS customer_segments_segment_id_idx ON customer_segments (segment_id);
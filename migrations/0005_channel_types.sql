@@ -0,0 +1,76 @@
+-- Moves channel names into a channel_types lookup table keyed by a SMALLINT,
+-- so channels store (campaign_id, channel_type_id) pairs instead of repeated
+-- strings, and lets performance metrics be attributed to a channel. Channel
+-- filters and per-channel aggregates then run on the integer indexes.
+--
+-- Safe to run more than once.
+
+CREATE TABLE IF NOT EXISTS channel_types (
+    id SMALLSERIAL PRIMARY KEY,
+    name VARCHAR(50) UNIQUE NOT NULL
+);
+
+INSERT INTO channel_types (name)
+SELECT name FROM (VALUES (1, 'Email'), (2, 'Social Media'), (3, 'Paid Ads'), (4, 'Content Marketing')) AS v(position, name)
+WHERE NOT EXISTS (SELECT 1 FROM channel_types t WHERE t.name = v.name)
+ORDER BY position;
+
+ALTER TABLE channels ADD COLUMN IF NOT EXISTS channel_type_id SMALLINT REFERENCES channel_types(id);
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'channels' AND column_name = 'channel_type'
+    ) THEN
+        INSERT INTO channel_types (name)
+        SELECT DISTINCT ch.channel_type FROM channels ch
+        WHERE NOT EXISTS (SELECT 1 FROM channel_types t WHERE t.name = ch.channel_type);
+
+        UPDATE channels ch SET channel_type_id = t.id
+        FROM channel_types t
+        WHERE t.name = ch.channel_type AND ch.channel_type_id IS NULL;
+
+        ALTER TABLE channels DROP COLUMN channel_type;
+    END IF;
+END $$;
+
+-- A campaign lists each channel once; the earliest row of a duplicate is kept.
+DELETE FROM channels ch
+USING channels earlier
+WHERE earlier.campaign_id = ch.campaign_id
+  AND earlier.channel_type_id = ch.channel_type_id
+  AND earlier.id < ch.id;
+
+ALTER TABLE channels ALTER COLUMN channel_type_id SET NOT NULL;
+
+-- Channels of a campaign; replaces channels_campaign_id_idx as the campaign lookup
+CREATE UNIQUE INDEX IF NOT EXISTS channels_campaign_id_channel_type_id_idx ON channels (campaign_id, channel_type_id);
+DROP INDEX IF EXISTS channels_campaign_id_idx;
+
+-- Campaigns on a channel (channel filters, per-channel aggregates)
+CREATE INDEX IF NOT EXISTS channels_channel_type_id_campaign_id_idx ON channels (channel_type_id, campaign_id);
+
+-- NULL when a metric is not attributed to a channel
+ALTER TABLE performance_metrics ADD COLUMN IF NOT EXISTS channel_type_id SMALLINT REFERENCES channel_types(id);
+
+-- Daily per-campaign, per-channel totals of the attributed metrics, maintained
+-- alongside performance_rollup_daily.
+CREATE TABLE IF NOT EXISTS performance_rollup_channel_daily (
+    campaign_id INTEGER REFERENCES campaigns(id) ON DELETE CASCADE,
+    channel_type_id SMALLINT REFERENCES channel_types(id),
+    bucket TIMESTAMP NOT NULL,
+    entries INTEGER NOT NULL,
+    emails_sent BIGINT NOT NULL,
+    emails_opened BIGINT NOT NULL,
+    clicks BIGINT NOT NULL,
+    PRIMARY KEY (campaign_id, channel_type_id, bucket)
+);
+
+DELETE FROM performance_rollup_channel_daily;
+INSERT INTO performance_rollup_channel_daily
+SELECT campaign_id, channel_type_id, date_trunc('day', timestamp), COUNT(*),
+       COALESCE(SUM(emails_sent), 0), COALESCE(SUM(emails_opened), 0), COALESCE(SUM(clicks), 0)
+FROM performance_metrics
+WHERE campaign_id IS NOT NULL AND channel_type_id IS NOT NULL
+GROUP BY 1, 2, 3;
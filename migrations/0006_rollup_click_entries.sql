@@ -0,0 +1,27 @@
+-- Counts the raw rows with non-NULL clicks in each hourly and daily rollup
+-- bucket, so average clicks can divide by them like AVG(clicks) does instead
+-- of by every row (entries). Backfilled from the raw rows.
+--
+-- Safe to run more than once.
+
+ALTER TABLE performance_rollup_hourly ADD COLUMN IF NOT EXISTS click_entries INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE performance_rollup_daily ADD COLUMN IF NOT EXISTS click_entries INTEGER NOT NULL DEFAULT 0;
+
+UPDATE performance_rollup_hourly r
+SET click_entries = src.click_entries
+FROM (
+    SELECT campaign_id, date_trunc('hour', timestamp) AS bucket, COUNT(clicks) AS click_entries
+    FROM performance_metrics
+    WHERE campaign_id IS NOT NULL
+    GROUP BY 1, 2
+) src
+WHERE r.campaign_id = src.campaign_id AND r.bucket = src.bucket AND r.click_entries <> src.click_entries;
+
+UPDATE performance_rollup_daily r
+SET click_entries = src.click_entries
+FROM (
+    SELECT campaign_id, date_trunc('day', bucket) AS bucket, SUM(click_entries) AS click_entries
+    FROM performance_rollup_hourly
+    GROUP BY 1, 2
+) src
+WHERE r.campaign_id = src.campaign_id AND r.bucket = src.bucket AND r.click_entries <> src.click_entries;
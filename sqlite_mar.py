@@ -0,0 +1,1381 @@
+"""An embedded SQLite storage engine with the same API as backend_mar.
+
+Select it with DB_ENGINE=sqlite (see storage_mar); the database file is
+SQLITE_PATH (default campaigns.sqlite3) and its schema is created, or brought
+up to date through SCHEMA_UPGRADES, on first use. Everything runs in-process,
+so small deployments and CI benchmarks need no database server and pay no
+network round trips.
+
+The file is opened in WAL mode, so readers never block the writer, with
+synchronous=NORMAL, a 64 MB page cache and memory-mapped reads. Each thread
+keeps its own connection, whose statement cache keeps the backend's queries
+prepared. Writes take the write lock up front (BEGIN IMMEDIATE) so concurrent
+writers queue instead of failing on lock upgrades.
+
+Differences from the PostgreSQL engine: demographics are JSON text queried
+with SQLite's JSON functions, there are no rollup tables (metric aggregates
+are computed from the indexed raw rows), and budgets are stored as REAL and
+returned as Decimal.
+"""
+import calendar
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+
+import numpy as np
+
+import backend_mar as bm
+from backend_mar import (
+    CAMPAIGN_SORT_COLUMNS, CAMPAIGN_UPDATE_FIELDS, CUSTOMER_SORT_COLUMNS, DEFAULT_PAGE_SIZE, IMPORT_BATCH_SIZE,
+    IMPORT_MAX_ERRORS_KEPT, MAX_CHART_POINTS, STREAM_FETCH_SIZE, InsightsSnapshot, MetricColumns, parse_demographics,
+)
+from cache_mar import QueryCache
+from criteria_mar import compile_criteria, demographic_numeric_sql, demographic_sql, is_executable
+from instrument_mar import query_stats
+
+SQLITE_PATH = os.getenv("SQLITE_PATH", "campaigns.sqlite3")
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "30"))
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", "65536"))
+SQLITE_MMAP_BYTES = int(os.getenv("SQLITE_MMAP_BYTES", str(256 * 1024 * 1024)))
+SQLITE_CACHED_STATEMENTS = 512
+
+# Used by async_mar to size its thread pool.
+DB_POOL_MAX = bm.DB_POOL_MAX
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode()))
+sqlite3.register_converter("DECIMAL", lambda value: Decimal(value.decode()))
+sqlite3.register_converter("JSON", lambda value: json.loads(value))
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS campaigns (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        budget DECIMAL NOT NULL,
+        start_date DATE NOT NULL,
+        end_date DATE NOT NULL,
+        description TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS channels (
+        id INTEGER PRIMARY KEY,
+        campaign_id INTEGER REFERENCES campaigns(id) ON DELETE CASCADE,
+        channel_type TEXT NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS customers (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        demographics JSON NOT NULL DEFAULT '{}' CHECK (json_valid(demographics))
+    );
+    CREATE INDEX IF NOT EXISTS customers_demographics_location_idx ON customers (json_extract(demographics, '$.location'));
+    CREATE INDEX IF NOT EXISTS customers_demographics_age_idx ON customers
+        ((CASE WHEN json_type(demographics, '$.age') IN ('integer', 'real') THEN json_extract(demographics, '$.age') END));
+
+    CREATE TABLE IF NOT EXISTS segments (
+        id INTEGER PRIMARY KEY,
+        segment_name TEXT NOT NULL,
+        criteria TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS customer_segments (
+        customer_id INTEGER REFERENCES customers(id) ON DELETE CASCADE,
+        segment_id INTEGER REFERENCES segments(id) ON DELETE CASCADE,
+        PRIMARY KEY (customer_id, segment_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS customer_segments_segment_id_idx ON customer_segments (segment_id, customer_id);
+
+    CREATE TABLE IF NOT EXISTS performance_metrics (
+        id INTEGER PRIMARY KEY,
+        campaign_id INTEGER REFERENCES campaigns(id) ON DELETE CASCADE,
+        emails_sent INTEGER DEFAULT 0,
+        emails_opened INTEGER DEFAULT 0,
+        clicks INTEGER DEFAULT 0,
+        timestamp TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime'))
+    );
+    CREATE INDEX IF NOT EXISTS performance_metrics_campaign_id_timestamp_idx ON performance_metrics (campaign_id, timestamp);
+    CREATE INDEX IF NOT EXISTS performance_metrics_timestamp_idx ON performance_metrics (timestamp);
+
+    CREATE TABLE IF NOT EXISTS customer_changes (
+        id INTEGER PRIMARY KEY,
+        customer_id INTEGER NOT NULL
+    );
+    CREATE TRIGGER IF NOT EXISTS customers_insert_changes AFTER INSERT ON customers
+    BEGIN
+        INSERT INTO customer_changes (customer_id) VALUES (NEW.id);
+    END;
+    CREATE TRIGGER IF NOT EXISTS customers_update_changes AFTER UPDATE ON customers
+    BEGIN
+        INSERT INTO customer_changes (customer_id) VALUES (NEW.id);
+    END;
+"""
+
+# Applied in order to files whose user_version is below their position (1-based);
+# each mirrors a migration of the PostgreSQL engine.
+SCHEMA_UPGRADES = [
+    # 1: channel_types lookup table (migrations/0005_channel_types.sql)
+    (
+        "CREATE TABLE channel_types (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);",
+        "INSERT INTO channel_types (name) VALUES ('Email'), ('Social Media'), ('Paid Ads'), ('Content Marketing');",
+        """
+        INSERT INTO channel_types (name)
+        SELECT DISTINCT channel_type FROM channels
+        WHERE channel_type NOT IN (SELECT name FROM channel_types)
+        ORDER BY channel_type;
+        """,
+        """
+        CREATE TABLE channels_upgrade (
+            id INTEGER PRIMARY KEY,
+            campaign_id INTEGER REFERENCES campaigns(id) ON DELETE CASCADE,
+            channel_type_id INTEGER NOT NULL REFERENCES channel_types(id)
+        );
+        """,
+        """
+        INSERT INTO channels_upgrade (id, campaign_id, channel_type_id)
+        SELECT MIN(ch.id), ch.campaign_id, t.id
+        FROM channels ch JOIN channel_types t ON t.name = ch.channel_type
+        GROUP BY ch.campaign_id, t.id;
+        """,
+        "DROP TABLE channels;",
+        "ALTER TABLE channels_upgrade RENAME TO channels;",
+        "CREATE UNIQUE INDEX channels_campaign_id_channel_type_id_idx ON channels (campaign_id, channel_type_id);",
+        "CREATE INDEX channels_channel_type_id_campaign_id_idx ON channels (channel_type_id, campaign_id);",
+        "ALTER TABLE performance_metrics ADD COLUMN channel_type_id INTEGER REFERENCES channel_types(id);",
+    ),
+]
+
+def _upgrade_schema(conn):
+    """Applies the SCHEMA_UPGRADES the file is missing, each in its own write transaction."""
+    for version, statements in enumerate(SCHEMA_UPGRADES, start=1):
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            if conn.execute("PRAGMA user_version;").fetchone()[0] < version:
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {version};")
+            conn.execute("COMMIT;")
+        except Exception:
+            conn.rollback()
+            raise
+
+def _qmark(sql):
+    """Converts the %s placeholders of SQL fragments shared with backend_mar to SQLite's ?."""
+    return sql.replace("%s", "?")
+
+# --- Connections ---
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """A cursor that records every statement it runs in instrument_mar.query_stats."""
+
+    def _timed(self, sql, run):
+        started = time.perf_counter()
+        error = None
+        try:
+            return run()
+        except Exception as exc:
+            error = type(exc).__name__
+            raise
+        finally:
+            query_stats.record_query(sql, time.perf_counter() - started, self.rowcount, error)
+
+    def execute(self, sql, parameters=()):
+        return self._timed(sql, lambda: super(InstrumentedCursor, self).execute(sql, parameters))
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(sql, lambda: super(InstrumentedCursor, self).executemany(sql, seq_of_parameters))
+
+_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+_schema_ready = False
+
+def get_db_connection():
+    """Returns this thread's connection to SQLITE_PATH, opening and tuning it on first use."""
+    global _schema_ready
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        return conn
+    conn = sqlite3.connect(
+        SQLITE_PATH, timeout=SQLITE_BUSY_TIMEOUT, isolation_level=None, check_same_thread=False,
+        detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES, cached_statements=SQLITE_CACHED_STATEMENTS
+    )
+    conn.execute("PRAGMA journal_mode = WAL;")
+    conn.execute("PRAGMA synchronous = NORMAL;")
+    conn.execute("PRAGMA foreign_keys = ON;")
+    conn.execute("PRAGMA temp_store = MEMORY;")
+    conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_KB};")
+    conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_BYTES};")
+    with _connections_lock:
+        if not _schema_ready:
+            conn.executescript(SCHEMA)
+            _upgrade_schema(conn)
+            _schema_ready = True
+        _connections.append(conn)
+    _local.conn = conn
+    return conn
+
+def close_pool():
+    """Closes every thread's connection; the next query opens a fresh one."""
+    global _schema_ready
+    with _connections_lock:
+        for conn in _connections:
+            conn.close()
+        _connections.clear()
+        _schema_ready = False
+    _local.__dict__.clear()
+
+@contextmanager
+def db_cursor():
+    """Yields a cursor inside a write transaction on this thread's connection.
+
+    The transaction is committed when the block exits cleanly and rolled back
+    when it raises. Inside a session() the cursor joins the session's
+    transaction instead.
+    """
+    current = active_session()
+    if current is not None:
+        with current._operation() as conn:
+            cur = conn.cursor(InstrumentedCursor)
+            try:
+                yield cur
+            finally:
+                cur.close()
+        return
+    conn = get_db_connection()
+    cur = conn.cursor(InstrumentedCursor)
+    cur.execute("BEGIN IMMEDIATE;")
+    try:
+        yield cur
+        cur.execute("COMMIT;")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+# --- Unit of Work ---
+
+PLACEHOLDER = "?"
+SessionError = bm.SessionError
+
+class Session(bm.Session):
+    """A unit of work on this thread's connection; see backend_mar.Session."""
+
+    def _execute_batch(self, cur, sql, rows, page_size):
+        # In-process, so there are no round trips to batch
+        cur.executemany(sql, rows)
+
+def active_session():
+    """Returns the Session open on this thread, or None."""
+    return getattr(_local, "session", None)
+
+@contextmanager
+def session():
+    """Opens a unit of work on this thread and yields its Session; see backend_mar.session().
+
+    The write lock is taken up front (BEGIN IMMEDIATE), so other writers wait
+    for the whole session.
+    """
+    if active_session() is not None:
+        raise SessionError("a session is already open on this thread")
+    conn = get_db_connection()
+    conn.execute("BEGIN IMMEDIATE;")
+    current = _local.session = Session(conn)
+    try:
+        yield current
+        if current.error is not None:
+            raise SessionError(f"session rolled back: {current.error}") from current.error
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        _local.session = None
+    current._apply_invalidations(invalidate_cache)
+
+# --- Query Cache ---
+
+_query_cache = QueryCache()
+
+def cached_query(sql, params=(), tables=()):
+    """Runs a read-only query through the query cache and returns all rows; see backend_mar.cached_query()."""
+    # Inside a session the rows may include its uncommitted writes
+    use_cache = active_session() is None
+    key = (sql, repr(list(params)))
+    hit, rows = _query_cache.get(key) if use_cache else (False, None)
+    if hit:
+        return list(rows)
+    generation = _query_cache.generation(tables)
+    cur = get_db_connection().cursor(InstrumentedCursor)
+    try:
+        rows = cur.execute(sql, list(params)).fetchall()
+    finally:
+        cur.close()
+    if use_cache:
+        rows = list(_query_cache.put(key, rows, tables, generation))
+    return rows
+
+def invalidate_cache(*tables):
+    """Drops cached results that read any of `tables`; with no arguments drops everything.
+
+    Inside a session() the invalidation waits for the commit.
+    """
+    current = active_session()
+    if current is not None:
+        current._invalidate(tables)
+        return
+    if tables:
+        _query_cache.invalidate(*tables)
+    else:
+        _query_cache.clear()
+
+def cache_stats():
+    """Returns the query cache's hit, miss, invalidation and eviction counters."""
+    return _query_cache.snapshot()
+
+query_diagnostics = bm.query_diagnostics
+reset_query_diagnostics = bm.reset_query_diagnostics
+
+# --- Streaming Reads ---
+
+def stream_query(sql, params=(), fetch_size=None):
+    """Runs a read-only query and yields its rows in lists of up to `fetch_size`; see backend_mar.stream_query().
+
+    SQLite produces rows as they are fetched, so a plain cursor streams
+    without holding the whole result.
+    """
+    fetch_size = fetch_size or STREAM_FETCH_SIZE
+    cur = get_db_connection().cursor(InstrumentedCursor)
+    try:
+        cur.execute(sql, list(params))
+        while True:
+            rows = cur.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cur.close()
+
+# --- Channel Types ---
+
+def get_channel_types():
+    """Retrieves (id, name) of every channel type in id order."""
+    try:
+        return cached_query("SELECT id, name FROM channel_types ORDER BY id;", tables=("channel_types",))
+    except Exception as error:
+        print(f"Error reading channel types: {error}")
+        return []
+
+def _channel_type_ids():
+    """Returns a channel name -> channel_types id map."""
+    return {name: channel_type_id for channel_type_id, name in get_channel_types()}
+
+def _ensure_channel_types(cur, names):
+    """Adds the channel names missing from channel_types; returns whether any were added."""
+    known = _channel_type_ids()
+    missing = [name for name in dict.fromkeys(names) if name not in known]
+    if not missing:
+        return False
+    cur.executemany("INSERT OR IGNORE INTO channel_types (name) VALUES (?);", [(name,) for name in missing])
+    return True
+
+# --- CRUD Operations for Campaigns ---
+
+_CAMPAIGN_COLUMNS = """
+    c.id, c.name, c.budget, c.start_date, c.end_date, c.description,
+    (SELECT json_group_array(name) FROM (
+        SELECT t.name FROM channels ch JOIN channel_types t ON t.id = ch.channel_type_id
+        WHERE ch.campaign_id = c.id ORDER BY ch.id
+    )) AS "channels [JSON]"
+"""
+
+def _campaign_dict(row):
+    return {
+        "id": row[0], "name": row[1], "budget": row[2],
+        "start_date": row[3], "end_date": row[4],
+        "description": row[5], "channels": list(row[6])
+    }
+
+def create_campaign(name, budget, start_date, end_date, description, channels):
+    """Creates a new campaign and its associated channels and returns its ID."""
+    try:
+        channels = list(dict.fromkeys(channels))
+        with db_cursor() as cur:
+            added_types = _ensure_channel_types(cur, channels)
+            cur.execute(
+                "INSERT INTO campaigns (name, budget, start_date, end_date, description) VALUES (?, ?, ?, ?, ?);",
+                (name, budget, start_date, end_date, description)
+            )
+            campaign_id = cur.lastrowid
+            cur.execute("""
+                INSERT INTO channels (campaign_id, channel_type_id)
+                SELECT ?, t.id FROM json_each(?) w JOIN channel_types t ON t.name = w.value
+                ORDER BY w.key;
+            """, (campaign_id, json.dumps(channels)))
+        invalidate_cache("campaigns", "channels", *(["channel_types"] if added_types else []))
+        return campaign_id
+    except Exception as error:
+        print(f"Error creating campaign: {error}")
+        return False
+
+def read_campaigns():
+    """Retrieves all campaigns with their associated channels."""
+    try:
+        rows = cached_query(f"SELECT {_CAMPAIGN_COLUMNS} FROM campaigns c ORDER BY c.id;", tables=("campaigns", "channels", "channel_types"))
+        return [_campaign_dict(row) for row in rows]
+    except Exception as error:
+        print(f"Error reading campaigns: {error}")
+        return []
+
+def read_campaigns_page(page_size=DEFAULT_PAGE_SIZE, after=None, sort_by="id", descending=False,
+                        name_contains=None, channel=None):
+    """Retrieves one keyset page of campaigns with their channels; see backend_mar.read_campaigns_page()."""
+    try:
+        if sort_by not in CAMPAIGN_SORT_COLUMNS:
+            raise ValueError(f"cannot sort campaigns by {sort_by!r}")
+        page_size = bm._page_size(page_size)
+        seek, params, order_by = bm._keyset_page(sort_by, descending, after)
+        conditions = [_qmark(seek)]
+        if name_contains:
+            conditions.append("name LIKE ?")
+            params.append(f"%{name_contains}%")
+        if channel:
+            conditions.append(
+                "EXISTS (SELECT 1 FROM channels ch WHERE ch.campaign_id = c.id"
+                " AND ch.channel_type_id = (SELECT id FROM channel_types WHERE name = ?))"
+            )
+            params.append(channel)
+        rows = cached_query(f"""
+            SELECT {_CAMPAIGN_COLUMNS}
+            FROM campaigns c
+            WHERE {" AND ".join(conditions)}
+            {order_by}
+            LIMIT ?;
+        """, params + [page_size + 1], ("campaigns", "channels", "channel_types"))
+        rows, next_cursor = bm._split_page(rows, page_size, CAMPAIGN_SORT_COLUMNS[sort_by])
+        return [_campaign_dict(row) for row in rows], next_cursor
+    except Exception as error:
+        print(f"Error reading campaigns page: {error}")
+        return [], None
+
+def _apply_campaign_updates(cur, rows, channels):
+    """Writes campaign rows and channel sets, touching only what differs; see backend_mar._apply_campaign_updates()."""
+    stats = {"updated": 0, "channels_added": 0, "channels_removed": 0}
+    if rows:
+        cur.executemany("""
+            UPDATE campaigns SET name = ?2, budget = ?3, start_date = ?4, end_date = ?5, description = ?6
+            WHERE id = ?1
+              AND NOT (name IS ?2 AND budget IS ?3 AND start_date IS ?4 AND end_date IS ?5 AND description IS ?6);
+        """, [(campaign_id, name, float(budget), start_date, end_date, description)
+              for campaign_id, name, budget, start_date, end_date, description in rows])
+        stats["updated"] = cur.rowcount
+    if channels:
+        wanted = [(campaign_id, json.dumps(channel_list)) for campaign_id, channel_list in channels.items()]
+        cur.executemany("""
+            DELETE FROM channels
+            WHERE campaign_id = ?1 AND channel_type_id NOT IN (
+                SELECT t.id FROM json_each(?2) w JOIN channel_types t ON t.name = w.value
+            );
+        """, wanted)
+        stats["channels_removed"] = cur.rowcount
+        cur.executemany("""
+            INSERT INTO channels (campaign_id, channel_type_id)
+            SELECT ?1, t.id FROM json_each(?2) w JOIN channel_types t ON t.name = w.value
+            WHERE NOT EXISTS (SELECT 1 FROM channels ch WHERE ch.campaign_id = ?1 AND ch.channel_type_id = t.id)
+            ORDER BY w.key;
+        """, wanted)
+        stats["channels_added"] = cur.rowcount
+    return stats
+
+def _invalidate_campaign_updates(stats, added_types):
+    tables = ["channel_types"] if added_types else []
+    if stats["updated"]:
+        tables.append("campaigns")
+    if stats["channels_added"] or stats["channels_removed"]:
+        tables.append("channels")
+    if tables:
+        invalidate_cache(*tables)
+
+def update_campaign(campaign_id, name, budget, start_date, end_date, description, channels):
+    """Updates an existing campaign and its channels, writing only the fields and channels that changed."""
+    try:
+        update = dict(zip(("id",) + CAMPAIGN_UPDATE_FIELDS, (campaign_id, name, budget, start_date, end_date, description)))
+        rows, channel_sets = bm._campaign_update_rows([dict(update, channels=channels)])
+        with db_cursor() as cur:
+            added_types = _ensure_channel_types(cur, channel_sets.get(int(campaign_id), []))
+            stats = _apply_campaign_updates(cur, rows, channel_sets)
+        _invalidate_campaign_updates(stats, added_types)
+        return True
+    except Exception as error:
+        print(f"Error updating campaign: {error}")
+        return False
+
+def update_campaigns(updates):
+    """Updates many campaigns in one transaction; returns update stats, or None on error; see backend_mar."""
+    try:
+        rows, channel_sets = bm._campaign_update_rows(updates)
+        with db_cursor() as cur:
+            added_types = _ensure_channel_types(cur, [name for names in channel_sets.values() for name in names])
+            stats = _apply_campaign_updates(cur, rows, channel_sets)
+        _invalidate_campaign_updates(stats, added_types)
+        return stats
+    except Exception as error:
+        print(f"Error updating campaigns: {error}")
+        return None
+
+def delete_campaign(campaign_id):
+    """Deletes a campaign."""
+    try:
+        with db_cursor() as cur:
+            cur.execute("DELETE FROM campaigns WHERE id = ?;", (campaign_id,))
+        invalidate_cache("campaigns", "channels", "performance_metrics")
+        return True
+    except Exception as error:
+        print(f"Error deleting campaign: {error}")
+        return False
+
+# --- CRUD Operations for Customers ---
+
+def _demographics_param(demographics):
+    """Serializes demographics given as a dict or free text for the JSON column."""
+    if not isinstance(demographics, dict):
+        demographics = parse_demographics(demographics)
+    return json.dumps(demographics)
+
+def create_customer(name, email, demographics):
+    """Creates a new customer; demographics may be a dict or "key: value" text."""
+    try:
+        with db_cursor() as cur:
+            cur.execute(
+                "INSERT INTO customers (name, email, demographics) VALUES (?, ?, ?);",
+                (name, email, _demographics_param(demographics))
+            )
+        invalidate_cache("customers")
+        return True
+    except Exception as error:
+        print(f"Error creating customer: {error}")
+        return False
+
+def read_customers():
+    """Retrieves all customers."""
+    try:
+        return cached_query("SELECT * FROM customers;", tables=("customers",))
+    except Exception as error:
+        print(f"Error reading customers: {error}")
+        return []
+
+def stream_customers(fetch_size=None):
+    """Yields all customers in id order, in lists of up to `fetch_size` rows; see backend_mar.stream_customers()."""
+    try:
+        yield from stream_query("SELECT * FROM customers ORDER BY id;", fetch_size=fetch_size)
+    except Exception as error:
+        print(f"Error streaming customers: {error}")
+
+def read_customers_page(page_size=DEFAULT_PAGE_SIZE, after=None, sort_by="id", descending=False, search=None,
+                        criteria=None):
+    """Retrieves one keyset page of customers as (id, name, email, demographics) rows; see backend_mar."""
+    try:
+        if sort_by not in CUSTOMER_SORT_COLUMNS:
+            raise ValueError(f"cannot sort customers by {sort_by!r}")
+        page_size = bm._page_size(page_size)
+        seek, params, order_by = bm._keyset_page(sort_by, descending, after)
+        conditions = [_qmark(seek)]
+        if search:
+            conditions.append("(name LIKE ? OR email LIKE ?)")
+            params.extend([f"%{search}%", f"%{search}%"])
+        if criteria:
+            condition, criteria_params = compile_criteria(criteria, "sqlite")
+            conditions.append(_qmark(condition))
+            params.extend(criteria_params)
+        rows = cached_query(f"""
+            SELECT id, name, email, demographics
+            FROM customers c
+            WHERE {" AND ".join(conditions)}
+            {order_by}
+            LIMIT ?;
+        """, params + [page_size + 1], ("customers",))
+        return bm._split_page(rows, page_size, CUSTOMER_SORT_COLUMNS[sort_by])
+    except Exception as error:
+        print(f"Error reading customers page: {error}")
+        return [], None
+
+def _demographic_condition(equals=None, ranges=None):
+    """Builds a predicate over customers c from demographic filters."""
+    conditions, params = [], []
+    for key, value in (equals or {}).items():
+        sql, key_params = demographic_sql(key, "sqlite")
+        conditions.append(f"{sql} = ?")
+        params.extend(key_params + [value])
+    for key, (minimum, maximum) in (ranges or {}).items():
+        sql, key_params = demographic_numeric_sql(key, "sqlite")
+        if minimum is not None:
+            conditions.append(f"{sql} >= ?")
+            params.extend(key_params + [minimum])
+        if maximum is not None:
+            conditions.append(f"{sql} <= ?")
+            params.extend(key_params + [maximum])
+    return _qmark(" AND ".join(conditions) or "TRUE"), params
+
+def find_customers_by_demographics(equals=None, ranges=None, page_size=DEFAULT_PAGE_SIZE, after=None):
+    """Retrieves one page of customers matching demographic filters, ordered by id; see backend_mar."""
+    try:
+        page_size = bm._page_size(page_size)
+        condition, params = _demographic_condition(equals, ranges)
+        seek, seek_params, order_by = bm._keyset_page("id", False, after)
+        rows = cached_query(f"""
+            SELECT id, name, email, demographics
+            FROM customers c
+            WHERE {_qmark(seek)} AND {condition}
+            {order_by}
+            LIMIT ?;
+        """, seek_params + params + [page_size + 1], ("customers",))
+        return bm._split_page(rows, page_size, 0)
+    except Exception as error:
+        print(f"Error finding customers by demographics: {error}")
+        return [], None
+
+def count_customers_by_demographics(equals=None, ranges=None):
+    """Counts customers matching demographic filters without fetching them."""
+    try:
+        condition, params = _demographic_condition(equals, ranges)
+        return cached_query(f"SELECT COUNT(*) FROM customers c WHERE {condition};", params, ("customers",))[0][0]
+    except Exception as error:
+        print(f"Error counting customers by demographics: {error}")
+        return None
+
+def update_customer(customer_id, name, email, demographics):
+    """Updates an existing customer; demographics may be a dict or "key: value" text."""
+    try:
+        with db_cursor() as cur:
+            cur.execute(
+                "UPDATE customers SET name = ?, email = ?, demographics = ? WHERE id = ?;",
+                (name, email, _demographics_param(demographics), customer_id)
+            )
+        invalidate_cache("customers")
+        return True
+    except Exception as error:
+        print(f"Error updating customer: {error}")
+        return False
+
+def delete_customer(customer_id):
+    """Deletes a customer."""
+    try:
+        with db_cursor() as cur:
+            cur.execute("DELETE FROM customers WHERE id = ?;", (customer_id,))
+        invalidate_cache("customers", "customer_segments")
+        return True
+    except Exception as error:
+        print(f"Error deleting customer: {error}")
+        return False
+
+# --- Bulk Customer Import ---
+
+def _flush_import_batch(batch, stats):
+    """Stages one batch in a temporary table and upserts it into customers."""
+    with db_cursor() as cur:
+        cur.execute("CREATE TEMP TABLE IF NOT EXISTS customer_import (line INTEGER, name TEXT, email TEXT, demographics TEXT);")
+        cur.execute("DELETE FROM customer_import;")
+        cur.executemany("INSERT INTO customer_import VALUES (?, ?, ?, ?);", batch)
+        cur.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS customer_import_latest AS
+            SELECT * FROM customer_import WHERE 0;
+        """)
+        cur.execute("DELETE FROM customer_import_latest;")
+        cur.execute("""
+            INSERT INTO customer_import_latest
+            SELECT * FROM customer_import
+            WHERE line IN (SELECT MAX(line) FROM customer_import GROUP BY email);
+        """)
+        cur.execute("SELECT COUNT(*) FROM customer_import_latest l JOIN customers c ON c.email = l.email;")
+        updated = cur.fetchone()[0]
+        cur.execute("""
+            INSERT INTO customers (name, email, demographics)
+            SELECT name, email, demographics FROM customer_import_latest WHERE TRUE
+            ON CONFLICT (email) DO UPDATE SET name = excluded.name, demographics = excluded.demographics;
+        """)
+        upserted = cur.rowcount
+    stats["inserted"] += upserted - updated
+    stats["updated"] += updated
+    stats["duplicates"] += len(batch) - upserted
+
+def import_customers(source, file_format="csv", batch_size=IMPORT_BATCH_SIZE, progress_callback=None):
+    """Bulk-loads customers from a CSV or NDJSON file, upserting on email; see backend_mar.import_customers()."""
+    stats = {"read": 0, "inserted": 0, "updated": 0, "duplicates": 0, "rejected": 0, "errors": []}
+    stream, close_stream = bm._open_text(source)
+    try:
+        batch = []
+        for line_num, record in bm._iter_import_records(stream, file_format):
+            stats["read"] += 1
+            try:
+                row = bm._validate_import_record(record)
+            except ValueError as reason:
+                stats["rejected"] += 1
+                if len(stats["errors"]) < IMPORT_MAX_ERRORS_KEPT:
+                    stats["errors"].append((line_num, str(reason)))
+                continue
+            batch.append((line_num,) + row)
+            if len(batch) >= batch_size:
+                _flush_import_batch(batch, stats)
+                batch = []
+                if progress_callback:
+                    progress_callback(stats)
+        if batch:
+            _flush_import_batch(batch, stats)
+        if progress_callback:
+            progress_callback(stats)
+        return stats
+    except Exception as error:
+        print(f"Error importing customers: {error}")
+        return None
+    finally:
+        invalidate_cache("customers")
+        close_stream()
+
+# --- CRUD Operations for Segments and Customer-Segment Association ---
+
+def create_segment(segment_name, criteria):
+    """Creates a new segment and returns its ID."""
+    try:
+        with db_cursor() as cur:
+            cur.execute("INSERT INTO segments (segment_name, criteria) VALUES (?, ?);", (segment_name, criteria))
+            segment_id = cur.lastrowid
+        invalidate_cache("segments")
+        return segment_id
+    except Exception as error:
+        print(f"Error creating segment: {error}")
+        return None
+
+def _member_source(customer_ids, where):
+    """Returns (sql, params) for a subquery yielding the selected customer_id column.
+
+    Id lists are passed as one JSON array parameter and expanded with
+    json_each(), whatever their length; `where` is a (sql, params) predicate
+    over `customers c` in the sqlite criteria dialect.
+    """
+    if (customer_ids is None) == (where is None):
+        raise ValueError("pass either customer_ids or where")
+    if where is not None:
+        condition, params = where
+        return f"SELECT c.id AS customer_id FROM customers c WHERE {_qmark(condition)}", list(params)
+    ids = sorted({int(customer_id) for customer_id in customer_ids})
+    return "SELECT value AS customer_id FROM json_each(?)", [json.dumps(ids)]
+
+def add_customers_to_segment(segment_id, customer_ids=None, where=None):
+    """Adds customers, given as a list of ids or a `where` predicate, to a segment in one statement."""
+    try:
+        source, params = _member_source(customer_ids, where)
+        with db_cursor() as cur:
+            cur.execute(f"""
+                INSERT OR IGNORE INTO customer_segments (customer_id, segment_id)
+                SELECT src.customer_id, ? FROM ({source}) src;
+            """, [segment_id] + params)
+        invalidate_cache("customer_segments")
+        return True
+    except Exception as error:
+        print(f"Error adding customers to segment: {error}")
+        return False
+
+def remove_customers_from_segment(segment_id, customer_ids=None, where=None):
+    """Removes customers, given as a list of ids or a `where` predicate, from a segment in one statement."""
+    try:
+        source, params = _member_source(customer_ids, where)
+        with db_cursor() as cur:
+            cur.execute(
+                f"DELETE FROM customer_segments WHERE segment_id = ? AND customer_id IN ({source});",
+                [segment_id] + params
+            )
+        invalidate_cache("customer_segments")
+        return True
+    except Exception as error:
+        print(f"Error removing customers from segment: {error}")
+        return False
+
+def _replace_members(cur, segment_id, customer_ids=None, where=None):
+    source, params = _member_source(customer_ids, where)
+    cur.execute(
+        f"DELETE FROM customer_segments WHERE segment_id = ? AND customer_id NOT IN ({source});",
+        [segment_id] + params
+    )
+    cur.execute(f"""
+        INSERT OR IGNORE INTO customer_segments (customer_id, segment_id)
+        SELECT src.customer_id, ? FROM ({source}) src;
+    """, [segment_id] + params)
+
+def replace_segment_members(segment_id, customer_ids=None, where=None):
+    """Makes the selected customers the exact membership of a segment, writing only the difference."""
+    try:
+        with db_cursor() as cur:
+            _replace_members(cur, segment_id, customer_ids, where)
+        invalidate_cache("customer_segments")
+        return True
+    except Exception as error:
+        print(f"Error replacing segment members: {error}")
+        return False
+
+# --- Criteria-Driven Segments ---
+
+def count_customers_matching(criteria):
+    """Counts the customers matching segment criteria without fetching them."""
+    try:
+        condition, params = compile_criteria(criteria, "sqlite")
+        return cached_query(f"SELECT COUNT(*) FROM customers c WHERE {_qmark(condition)};", params, ("customers",))[0][0]
+    except Exception as error:
+        print(f"Error counting matching customers: {error}")
+        return None
+
+def refresh_segment(segment_id):
+    """Recomputes a segment's membership from its criteria inside the database."""
+    try:
+        with db_cursor() as cur:
+            cur.execute("SELECT criteria FROM segments WHERE id = ?;", (segment_id,))
+            row = cur.fetchone()
+            if row is None:
+                raise ValueError(f"segment {segment_id} does not exist")
+            _replace_members(cur, segment_id, where=compile_criteria(row[0], "sqlite"))
+        invalidate_cache("customer_segments")
+        return True
+    except Exception as error:
+        print(f"Error refreshing segment: {error}")
+        return False
+
+def refresh_segments():
+    """Recomputes every segment whose criteria are executable; returns how many were refreshed."""
+    try:
+        segments = cached_query("SELECT id, criteria FROM segments ORDER BY id;", tables=("segments",))
+    except Exception as error:
+        print(f"Error reading segments: {error}")
+        return 0
+    return sum(
+        1 for segment_id, criteria in segments
+        if is_executable(criteria) and refresh_segment(segment_id)
+    )
+
+def refresh_segments_incremental():
+    """Re-evaluates only customers changed since the last run; see backend_mar.refresh_segments_incremental()."""
+    started = time.perf_counter()
+    stats = {"changed_customers": 0, "segments": 0, "added": 0, "removed": 0, "failed": []}
+    try:
+        with db_cursor() as cur:
+            cur.execute("CREATE TEMP TABLE IF NOT EXISTS changed_customers (customer_id INTEGER PRIMARY KEY);")
+            cur.execute("DELETE FROM changed_customers;")
+            cur.execute("INSERT OR IGNORE INTO changed_customers SELECT customer_id FROM customer_changes;")
+            stats["changed_customers"] = cur.rowcount
+            cur.execute("DELETE FROM customer_changes;")
+            if stats["changed_customers"]:
+                cur.execute("SELECT id, criteria FROM segments ORDER BY id;")
+                for segment_id, criteria in cur.fetchall():
+                    if not is_executable(criteria):
+                        continue
+                    condition, params = compile_criteria(criteria, "sqlite")
+                    condition = _qmark(condition)
+                    cur.execute("SAVEPOINT refresh_segment;")
+                    try:
+                        cur.execute(f"""
+                            DELETE FROM customer_segments
+                            WHERE segment_id = ? AND customer_id IN (
+                                SELECT c.id FROM changed_customers ch JOIN customers c ON c.id = ch.customer_id
+                                WHERE NOT ({condition})
+                            );
+                        """, [segment_id] + params)
+                        removed = cur.rowcount
+                        cur.execute(f"""
+                            INSERT OR IGNORE INTO customer_segments (customer_id, segment_id)
+                            SELECT c.id, ? FROM changed_customers ch JOIN customers c ON c.id = ch.customer_id
+                            WHERE {condition};
+                        """, [segment_id] + params)
+                        added = cur.rowcount
+                    except sqlite3.DatabaseError as error:
+                        cur.execute("ROLLBACK TO SAVEPOINT refresh_segment;")
+                        print(f"Error refreshing segment {segment_id}: {error}")
+                        stats["failed"].append(segment_id)
+                        continue
+                    cur.execute("RELEASE SAVEPOINT refresh_segment;")
+                    stats["removed"] += removed
+                    stats["added"] += added
+                    stats["segments"] += 1
+        if stats["added"] or stats["removed"]:
+            invalidate_cache("customer_segments")
+        stats["seconds"] = time.perf_counter() - started
+        return stats
+    except Exception as error:
+        print(f"Error refreshing segments incrementally: {error}")
+        return None
+
+def read_segments():
+    """Retrieves all segments and their associated customers."""
+    try:
+        rows = cached_query(bm.SEGMENT_MEMBERS_SQL, tables=("segments", "customer_segments", "customers"))
+        return list(bm._group_segments(rows))
+    except Exception as error:
+        print(f"Error reading segments: {error}")
+        return []
+
+def stream_segments(fetch_size=None):
+    """Yields the segments of read_segments() one at a time; see backend_mar.stream_segments()."""
+    try:
+        yield from bm._group_segments(itertools.chain.from_iterable(stream_query(bm.SEGMENT_MEMBERS_SQL, fetch_size=fetch_size)))
+    except Exception as error:
+        print(f"Error streaming segments: {error}")
+
+def delete_segment(segment_id):
+    """Deletes a segment."""
+    try:
+        with db_cursor() as cur:
+            cur.execute("DELETE FROM segments WHERE id = ?;", (segment_id,))
+        invalidate_cache("segments", "customer_segments")
+        return True
+    except Exception as error:
+        print(f"Error deleting segment: {error}")
+        return False
+
+# --- CRUD Operations for Performance Metrics ---
+
+def log_performance_metric(campaign_id, emails_sent, emails_opened, clicks, channel=None):
+    """Inserts a new performance metric record for a campaign, optionally attributed to a channel by name."""
+    try:
+        channel_type_id = None
+        if channel is not None:
+            channel_type_id = _channel_type_ids().get(channel)
+            if channel_type_id is None:
+                raise ValueError(f"unknown channel {channel!r}")
+        with db_cursor() as cur:
+            cur.execute(
+                "INSERT INTO performance_metrics (campaign_id, emails_sent, emails_opened, clicks, channel_type_id)"
+                " VALUES (?, ?, ?, ?, ?);",
+                (campaign_id, emails_sent, emails_opened, clicks, channel_type_id)
+            )
+        invalidate_cache("performance_metrics")
+        return True
+    except Exception as error:
+        print(f"Error logging performance metric: {error}")
+        return False
+
+def rebuild_performance_rollups():
+    """Does nothing: the SQLite engine aggregates the indexed raw rows and keeps no rollups."""
+    return True
+
+def write_metric_batch(rows):
+    """Writes (campaign_id, sent, opened, clicks, timestamp[, channel_type_id]) rows in one transaction.
+
+    Rows for campaigns that do not exist are discarded; their count is
+    returned. Errors propagate to the caller.
+    """
+    rows = [tuple(row) if len(row) == 6 else tuple(row) + (None,) for row in rows]
+    with db_cursor() as cur:
+        cur.executemany("""
+            INSERT INTO performance_metrics (campaign_id, emails_sent, emails_opened, clicks, timestamp, channel_type_id)
+            SELECT ?1, ?2, ?3, ?4, ?5, ?6 WHERE EXISTS (SELECT 1 FROM campaigns WHERE id = ?1);
+        """, rows)
+        written = cur.rowcount
+    invalidate_cache("performance_metrics")
+    return len(rows) - written
+
+class MetricIngestor(bm.MetricIngestor):
+    """backend_mar.MetricIngestor writing through the SQLite engine."""
+    RETRYABLE_ERRORS = (sqlite3.OperationalError,)
+
+    def __init__(self, *args, writer=None, channel_types=None, **kwargs):
+        super().__init__(
+            *args, writer=writer or write_metric_batch, channel_types=channel_types or get_channel_types, **kwargs
+        )
+
+_ingestor = None
+_ingestor_lock = threading.Lock()
+
+def get_metric_ingestor():
+    """Returns the process-wide MetricIngestor, starting it on first use."""
+    global _ingestor
+    if _ingestor is None:
+        with _ingestor_lock:
+            if _ingestor is None:
+                _ingestor = MetricIngestor()
+                bm.atexit.register(_ingestor.close)
+    return _ingestor
+
+def ingest_performance_metrics(events, timeout=None):
+    """Queues a batch of metric events for buffered, batched writing; see MetricIngestor.submit()."""
+    return get_metric_ingestor().submit(events, timeout)
+
+def get_campaign_metric_totals():
+    """Retrieves (campaign_id, emails_sent, emails_opened, clicks) totals per campaign."""
+    try:
+        return cached_query("""
+            SELECT campaign_id, SUM(emails_sent), SUM(emails_opened), SUM(clicks)
+            FROM performance_metrics
+            WHERE campaign_id IS NOT NULL
+            GROUP BY campaign_id
+            ORDER BY campaign_id;
+        """, tables=("performance_metrics",))
+    except Exception as error:
+        print(f"Error retrieving campaign metric totals: {error}")
+        return []
+
+chart_bounds = bm.chart_bounds
+
+def get_performance_metrics(campaign_id=None, start=None, end=None, points=None):
+    """Retrieves raw or downsampled performance metrics; see backend_mar.get_performance_metrics()."""
+    try:
+        conditions, params = ["TRUE"], []
+        if campaign_id:
+            conditions.append("campaign_id = ?")
+            params.append(campaign_id)
+        if points is None:
+            if start is not None:
+                conditions.append("timestamp >= ?")
+                params.append(start)
+            if end is not None:
+                conditions.append("timestamp < ?")
+                params.append(end)
+            return cached_query(
+                f"SELECT * FROM performance_metrics WHERE {' AND '.join(conditions)} ORDER BY timestamp;",
+                params, ("performance_metrics",)
+            )
+
+        if end is None:
+            end = datetime.now().replace(second=0, microsecond=0) + bm.timedelta(minutes=1)
+        if start is None:
+            start = cached_query(
+                f'SELECT MIN(timestamp) AS "first [TIMESTAMP]" FROM performance_metrics WHERE {" AND ".join(conditions)};',
+                params, ("performance_metrics",)
+            )[0][0]
+            if start is None:
+                return []
+        if start >= end:
+            return []
+        _, start, width = bm._chart_bucketing(start, end, min(max(1, points), MAX_CHART_POINTS))
+        rows = cached_query(f"""
+            SELECT (CAST(strftime('%s', timestamp) AS INTEGER) - ?) / ? AS bucket,
+                   SUM(emails_sent), SUM(emails_opened), SUM(clicks)
+            FROM performance_metrics
+            WHERE {' AND '.join(conditions)} AND timestamp >= ? AND timestamp < ?
+            GROUP BY bucket
+            ORDER BY bucket;
+        """, [calendar.timegm(start.timetuple()), width] + params + [start, end], ("performance_metrics",))
+        return [(start + bm.timedelta(seconds=bucket * width),) + tuple(sums) for bucket, *sums in rows]
+    except Exception as error:
+        print(f"Error retrieving performance metrics: {error}")
+        return []
+
+def stream_performance_metrics(campaign_id=None, start=None, end=None, fetch_size=None):
+    """Yields raw performance metrics in lists of up to `fetch_size`; see backend_mar.stream_performance_metrics()."""
+    try:
+        conditions, params = ["TRUE"], []
+        if campaign_id:
+            conditions.append("campaign_id = ?")
+            params.append(campaign_id)
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("timestamp < ?")
+            params.append(end)
+        yield from stream_query(
+            f"SELECT * FROM performance_metrics WHERE {' AND '.join(conditions)} ORDER BY timestamp;", params, fetch_size
+        )
+    except Exception as error:
+        print(f"Error streaming performance metrics: {error}")
+
+# --- Columnar Metric Reads ---
+
+# Seconds per bucket of read_metric_columns() units
+_UNIT_SECONDS = {"hour": 3600, "day": 86400}
+_METRIC_ROW_DTYPE = np.dtype([
+    ("campaign_id", np.int32), ("timestamp", np.int64),
+    ("emails_sent", np.int64), ("emails_opened", np.int64), ("clicks", np.int64),
+])
+
+def _bucket_ceiling(value, seconds):
+    """Returns the start of the first `seconds`-wide bucket at or after `value`."""
+    epoch = calendar.timegm(value.timetuple()) + (1 if getattr(value, "microsecond", 0) else 0)
+    return datetime(1970, 1, 1) + bm.timedelta(seconds=-(-epoch // seconds) * seconds)
+
+def read_metric_columns(start=None, end=None, campaign_id=None, unit=None):
+    """Reads performance metrics as MetricColumns; see backend_mar.read_metric_columns().
+
+    Buckets are grouped from the raw rows, and the rows are fed from the
+    cursor straight into one structured array.
+    """
+    try:
+        conditions, params = ["campaign_id IS NOT NULL"], []
+        if campaign_id:
+            conditions.append("campaign_id = ?")
+            params.append(campaign_id)
+        if unit:
+            seconds = _UNIT_SECONDS[unit]
+            bucket = f"(CAST(strftime('%s', timestamp) AS INTEGER) / {seconds}) * {seconds} * 1000000"
+            columns = f"campaign_id, {bucket} AS bucket, SUM(emails_sent), SUM(emails_opened), SUM(clicks)"
+            grouping = "GROUP BY campaign_id, bucket"
+            if start is not None:
+                # Like the rollups: only buckets starting at or after `start`
+                conditions.append("timestamp >= ?")
+                params.append(_bucket_ceiling(start, seconds))
+        else:
+            bucket = "CAST(round((julianday(timestamp) - 2440587.5) * 86400000) AS INTEGER) * 1000"
+            columns = f"campaign_id, {bucket}, COALESCE(emails_sent, 0), COALESCE(emails_opened, 0), COALESCE(clicks, 0)"
+            grouping = ""
+            if start is not None:
+                conditions.append("timestamp >= ?")
+                params.append(start)
+        if end is not None:
+            conditions.append("timestamp < ?")
+            params.append(end)
+        sql = f"SELECT {columns} FROM performance_metrics WHERE {' AND '.join(conditions)} {grouping};"
+        use_cache = active_session() is None
+        key = (sql, repr(params))
+        hit, result = _query_cache.get(key) if use_cache else (False, None)
+        if hit:
+            return result
+        generation = _query_cache.generation(("performance_metrics",))
+        cur = get_db_connection().cursor(InstrumentedCursor)
+        try:
+            rows = np.fromiter(cur.execute(sql, params), dtype=_METRIC_ROW_DTYPE)
+        finally:
+            cur.close()
+        result = MetricColumns(
+            rows["campaign_id"].copy(), rows["timestamp"].astype("timedelta64[us]") + np.datetime64(0, "us"),
+            rows["emails_sent"].copy(), rows["emails_opened"].copy(), rows["clicks"].copy(),
+        )
+        if use_cache:
+            result = _query_cache.put(key, result, ("performance_metrics",), generation)
+        return result
+    except Exception as error:
+        print(f"Error reading metric columns: {error}")
+        return None
+
+# --- Business Insights Functions ---
+
+def _decimal(value):
+    return Decimal(str(value)) if value is not None else None
+
+def get_total_campaign_budget():
+    """Calculates the total budget of all campaigns."""
+    try:
+        result = cached_query("SELECT SUM(budget) FROM campaigns;", tables=("campaigns",))[0][0]
+        return _decimal(result) if result is not None else 0
+    except Exception as error:
+        print(f"Error getting total budget: {error}")
+        return 0
+
+def get_average_clicks_per_campaign():
+    """Calculates the average clicks per campaign."""
+    try:
+        result = cached_query(
+            "SELECT CAST(SUM(clicks) AS REAL) / NULLIF(COUNT(clicks), 0) FROM performance_metrics;",
+            tables=("performance_metrics",)
+        )[0][0]
+        return _decimal(result) if result is not None else 0
+    except Exception as error:
+        print(f"Error getting average clicks: {error}")
+        return 0
+
+def get_most_successful_campaign():
+    """Finds the campaign with the highest number of clicks."""
+    try:
+        rows = cached_query("""
+            SELECT c.name, SUM(pm.clicks) AS total_clicks
+            FROM campaigns c
+            JOIN performance_metrics pm ON c.id = pm.campaign_id
+            GROUP BY c.id
+            ORDER BY total_clicks DESC, c.id
+            LIMIT 1;
+        """, tables=("campaigns", "performance_metrics"))
+        return rows[0] if rows else None
+    except Exception as error:
+        print(f"Error getting most successful campaign: {error}")
+        return None
+
+def get_campaign_count():
+    """Counts the total number of campaigns."""
+    try:
+        return cached_query("SELECT COUNT(*) FROM campaigns;", tables=("campaigns",))[0][0]
+    except Exception as error:
+        print(f"Error getting campaign count: {error}")
+        return 0
+
+def get_max_min_metrics():
+    """Gets the max and min values for emails sent, opened, and clicks."""
+    try:
+        rows = cached_query("""
+            SELECT MAX(emails_sent), MIN(emails_sent), MAX(emails_opened), MIN(emails_opened), MAX(clicks), MIN(clicks)
+            FROM performance_metrics;
+        """, tables=("performance_metrics",))
+        if not rows:
+            return {}
+        results = rows[0]
+        return {
+            'max_sent': results[0], 'min_sent': results[1],
+            'max_opened': results[2], 'min_opened': results[3],
+            'max_clicks': results[4], 'min_clicks': results[5]
+        }
+    except Exception as error:
+        print(f"Error getting max/min metrics: {error}")
+        return {}
+
+INSIGHTS_SNAPSHOT_SQL = """
+    WITH campaign_totals AS (
+        SELECT COUNT(*) AS campaign_count, COALESCE(SUM(budget), 0) AS total_budget
+        FROM campaigns
+    ), metric_totals AS (
+        SELECT COALESCE(CAST(SUM(clicks) AS REAL) / NULLIF(COUNT(clicks), 0), 0) AS average_clicks,
+               MAX(emails_sent), MIN(emails_sent),
+               MAX(emails_opened), MIN(emails_opened),
+               MAX(clicks), MIN(clicks)
+        FROM performance_metrics
+    ), top_campaign AS (
+        SELECT c.name, SUM(pm.clicks) AS total_clicks
+        FROM campaigns c
+        JOIN performance_metrics pm ON c.id = pm.campaign_id
+        GROUP BY c.id
+        ORDER BY total_clicks DESC, c.id
+        LIMIT 1
+    )
+    SELECT ct.campaign_count, ct.total_budget, mt.*, tc.name, tc.total_clicks
+    FROM campaign_totals ct
+    CROSS JOIN metric_totals mt
+    LEFT JOIN top_campaign tc ON TRUE;
+"""
+
+def get_insights_snapshot(use_cache=True):
+    """Returns an InsightsSnapshot of all Business Insights figures from one statement, or None on error."""
+    try:
+        if use_cache:
+            row = cached_query(INSIGHTS_SNAPSHOT_SQL, tables=("campaigns", "performance_metrics"))[0]
+        else:
+            cur = get_db_connection().cursor(InstrumentedCursor)
+            try:
+                row = cur.execute(INSIGHTS_SNAPSHOT_SQL).fetchone()
+            finally:
+                cur.close()
+        row = (row[0], _decimal(row[1]), _decimal(row[2])) + tuple(row[3:])
+        return InsightsSnapshot(*row)
+    except Exception as error:
+        print(f"Error getting insights snapshot: {error}")
+        return None
+
+# --- Channel Analytics ---
+
+ChannelPerformance = bm.ChannelPerformance
+
+CHANNEL_PERFORMANCE_SQL = """
+    WITH campaign_channels AS (
+        SELECT campaign_id, channel_type_id, COUNT(*) OVER (PARTITION BY campaign_id) AS channel_count
+        FROM channels
+    ), metrics AS (
+        SELECT campaign_id, channel_type_id,
+               SUM(emails_sent) AS emails_sent, SUM(emails_opened) AS emails_opened, SUM(clicks) AS clicks
+        FROM performance_metrics
+        WHERE campaign_id IS NOT NULL AND {timestamp_filter}
+        GROUP BY campaign_id, channel_type_id
+    ), shares AS (
+        SELECT cc.channel_type_id, cc.campaign_id, c.budget / cc.channel_count AS spend,
+               COALESCE(m.emails_sent, 0) * 1.0 / cc.channel_count AS emails_sent,
+               COALESCE(m.emails_opened, 0) * 1.0 / cc.channel_count AS emails_opened,
+               COALESCE(m.clicks, 0) * 1.0 / cc.channel_count AS clicks
+        FROM campaign_channels cc
+        JOIN campaigns c ON c.id = cc.campaign_id
+        LEFT JOIN metrics m ON m.campaign_id = cc.campaign_id AND m.channel_type_id IS NULL
+        UNION ALL
+        SELECT channel_type_id, campaign_id, 0, emails_sent, emails_opened, clicks
+        FROM metrics
+        WHERE channel_type_id IS NOT NULL
+    )
+    SELECT t.name, COUNT(DISTINCT s.campaign_id),
+           ROUND(COALESCE(SUM(s.spend), 0), 2), ROUND(COALESCE(SUM(s.emails_sent), 0), 2),
+           ROUND(COALESCE(SUM(s.emails_opened), 0), 2), ROUND(COALESCE(SUM(s.clicks), 0), 2)
+    FROM channel_types t
+    LEFT JOIN shares s ON s.channel_type_id = t.id
+    GROUP BY t.id, t.name
+    ORDER BY t.id;
+"""
+
+def get_channel_performance(start=None, end=None):
+    """Retrieves a ChannelPerformance row per channel type; see backend_mar.get_channel_performance().
+
+    The shares are computed from the raw metric rows of the days from
+    start's day up to end.
+    """
+    try:
+        conditions, params = ["TRUE"], []
+        if start is not None:
+            conditions.append("timestamp >= date(?)")
+            params.append(start)
+        if end is not None:
+            conditions.append("strftime('%Y-%m-%d 00:00:00', timestamp) < ?")
+            params.append(end)
+        rows = cached_query(
+            CHANNEL_PERFORMANCE_SQL.format(timestamp_filter=" AND ".join(conditions)), params,
+            ("campaigns", "channels", "channel_types", "performance_metrics")
+        )
+        return [ChannelPerformance(name, campaigns, *(_decimal(value) for value in sums)) for name, campaigns, *sums in rows]
+    except Exception as error:
+        print(f"Error retrieving channel performance: {error}")
+        return []
+
+# --- Campaign Leaderboard ---
+
+LeaderboardEntry = bm.LeaderboardEntry
+
+LEADERBOARD_SQL = """
+    WITH totals AS (
+        SELECT campaign_id, SUM(emails_sent) AS emails_sent, SUM(emails_opened) AS emails_opened, SUM(clicks) AS clicks
+        FROM performance_metrics
+        WHERE {timestamp_filter}
+        GROUP BY campaign_id
+    ), spend AS (
+        SELECT c.id AS campaign_id, COALESCE(c.budget * MAX(
+                   MIN(julianday(c.end_date, '+1 day'), COALESCE(julianday(?), julianday(c.end_date, '+1 day')))
+                   - MAX(julianday(c.start_date), COALESCE(julianday(?), julianday(c.start_date))), 0
+               ) / NULLIF(julianday(c.end_date, '+1 day') - julianday(c.start_date), 0), 0) AS spend
+        FROM campaigns c
+    ), scored AS (
+        SELECT c.id, c.name, t.emails_sent, t.emails_opened, t.clicks, s.spend, CAST({metric} AS REAL) AS value
+        FROM totals t
+        JOIN campaigns c ON c.id = t.campaign_id
+        JOIN spend s ON s.campaign_id = c.id
+    )
+    SELECT RANK() OVER (ORDER BY value {direction}), id, name, emails_sent, emails_opened, clicks, spend, value
+    FROM scored
+    WHERE value IS NOT NULL
+    ORDER BY value {direction}, clicks DESC, id
+    LIMIT ?;
+"""
+
+def get_campaign_leaderboard(metric="clicks", start=None, end=None, limit=10, unit="day"):
+    """Ranks campaigns by `metric` over a time window; see backend_mar.get_campaign_leaderboard().
+
+    There are no rollups here, so the totals are summed from the indexed raw
+    rows of the hour or day (`unit`) buckets that start in [start, end).
+    """
+    try:
+        if metric not in bm.LEADERBOARD_METRICS:
+            raise ValueError(f"unknown leaderboard metric {metric!r}")
+        expression, ascending = bm.LEADERBOARD_METRICS[metric]
+        seconds = _UNIT_SECONDS[unit]
+        conditions, params = ["campaign_id IS NOT NULL"], []
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            params.append(_bucket_ceiling(start, seconds))
+        if end is not None:
+            conditions.append("timestamp < ?")
+            params.append(_bucket_ceiling(end, seconds))
+        sql = LEADERBOARD_SQL.format(
+            timestamp_filter=" AND ".join(conditions), metric=expression, direction="ASC" if ascending else "DESC"
+        )
+        spend_end = end if end is not None else bm._next_bucket(datetime.now(), unit)
+        rows = cached_query(
+            sql, params + [spend_end, start, min(max(1, limit), bm.LEADERBOARD_MAX_LIMIT)], ("campaigns", "performance_metrics")
+        )
+        return [LeaderboardEntry(*row) for row in rows]
+    except Exception as error:
+        print(f"Error retrieving campaign leaderboard: {error}")
+        return []
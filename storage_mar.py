@@ -0,0 +1,28 @@
+"""Storage engine selection for the campaign tracker.
+
+Each engine is a module exposing the same functions (create_campaign,
+read_customers_page, get_insights_snapshot, ...):
+
+    postgresql  backend_mar  PostgreSQL through psycopg2 (default)
+    sqlite      sqlite_mar   an embedded SQLite file, no server needed
+
+The app and async_mar use whichever module DB_ENGINE names:
+
+    DB_ENGINE=sqlite SQLITE_PATH=campaigns.sqlite3 streamlit run frontend_mar.py
+"""
+import importlib
+import os
+
+ENGINES = {
+    "postgresql": "backend_mar",
+    "sqlite": "sqlite_mar",
+}
+
+DB_ENGINE = os.getenv("DB_ENGINE", "postgresql")
+
+def load_backend(engine=None):
+    """Imports and returns the backend module of `engine` (default: DB_ENGINE)."""
+    engine = engine or DB_ENGINE
+    if engine not in ENGINES:
+        raise ValueError(f"unknown DB_ENGINE {engine!r}; expected one of {', '.join(ENGINES)}")
+    return importlib.import_module(ENGINES[engine])
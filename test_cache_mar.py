@@ -0,0 +1,51 @@
+"""Unit tests for cache_mar; they need no database."""
+import numpy as np
+import pytest
+
+from cache_mar import QueryCache, estimate_size, freeze
+
+def put(cache, key, value, tables=("customers",)):
+    return cache.put(key, value, tables, cache.generation(tables))
+
+def test_freeze_makes_results_read_only():
+    rows = freeze([(1, [2, 3]), (4, ())])
+    assert rows == ((1, (2, 3)), (4, ()))
+    array = freeze(np.arange(3))
+    with pytest.raises(ValueError):
+        array[0] = 1
+
+def test_estimate_size_scales_with_rows():
+    rows = [(i, f"customer {i}", f"customer{i}@example.com") for i in range(10000)]
+    small, large = estimate_size(rows[:100]), estimate_size(rows)
+    assert 80 * small < large < 120 * small
+    assert estimate_size(np.zeros(1000, dtype=np.int64)) == 8000
+
+def test_oversized_results_are_returned_but_not_stored():
+    cache = QueryCache(max_bytes=10000)
+    rows = [(i, "x" * 100) for i in range(1000)]
+    assert put(cache, "all customers", rows) == tuple(rows)
+    assert cache.get("all customers") == (False, None)
+    assert cache.snapshot()["oversized"] == 1
+    assert cache.snapshot()["bytes"] == 0
+
+def test_byte_budget_evicts_least_recently_used():
+    cache = QueryCache(max_bytes=10000)
+    rows = [(i, "x" * 100) for i in range(20)]
+    size = estimate_size(freeze(rows))
+    count = 10000 // size
+    for key in range(count + 1):
+        put(cache, key, rows)
+        cache.get(0)
+    snapshot = cache.snapshot()
+    assert snapshot["bytes"] <= 10000
+    assert snapshot["entries"] == count
+    assert cache.get(0)[0] and not cache.get(1)[0]
+
+def test_invalidation_releases_bytes():
+    cache = QueryCache()
+    put(cache, "segments", [(1, "VIP")], ("segments",))
+    put(cache, "customers", [(1, "Ann")], ("customers",))
+    cache.invalidate("customers")
+    assert cache.snapshot()["bytes"] == estimate_size(freeze([(1, "VIP")]))
+    cache.clear()
+    assert cache.snapshot()["bytes"] == 0
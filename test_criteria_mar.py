@@ -0,0 +1,35 @@
+"""Unit tests for criteria_mar; they only compile criteria and need no database."""
+import pytest
+
+from criteria_mar import CriteriaError, compile_criteria, is_executable
+
+@pytest.mark.parametrize("criteria", ["id CONTAINS '1'", "id = abc", "id < 'x'", "id IN (1, abc)"])
+@pytest.mark.parametrize("dialect", ["postgresql", "sqlite"])
+def test_id_needs_numbers(criteria, dialect):
+    with pytest.raises(CriteriaError):
+        compile_criteria(criteria, dialect)
+    assert not is_executable(criteria)
+
+@pytest.mark.parametrize("dialect", ["postgresql", "sqlite"])
+def test_id_compares_numerically(dialect):
+    assert compile_criteria("id >= 5", dialect) == ("COALESCE(c.id >= %s, FALSE)", [5])
+    assert compile_criteria("id IN (1, 2)", dialect) == ("COALESCE(c.id IN (%s, %s), FALSE)", [1, 2])
+
+@pytest.mark.parametrize("criteria, expected", [
+    ("name = 5", ("COALESCE(c.name = %s, FALSE)", ["5"])),
+    ("email < 3", ("COALESCE(c.email < %s, FALSE)", ["3"])),
+    ("name IN (1, Ann)", ("COALESCE(c.name IN (%s, %s), FALSE)", ["1", "Ann"])),
+    ("name != 2.5", ("COALESCE(c.name <> %s, FALSE)", ["2.5"])),
+])
+@pytest.mark.parametrize("dialect", ["postgresql", "sqlite"])
+def test_text_columns_compare_as_text(criteria, expected, dialect):
+    assert compile_criteria(criteria, dialect) == expected
+    assert is_executable(criteria)
+
+def test_text_column_contains():
+    assert compile_criteria("email CONTAINS '@example.com'") == ("COALESCE(c.email ILIKE %s, FALSE)", ["%@example.com%"])
+
+def test_numeric_demographics_stay_numeric():
+    sql, params = compile_criteria("age < 30")
+    assert "::numeric" in sql
+    assert params == ["age", "age", 30]
@@ -0,0 +1,310 @@
+"""Tests for the SQLite engine; each runs against a fresh database file, so no server is needed."""
+import io
+import sqlite3
+from datetime import date, datetime
+
+import pytest
+
+import sqlite_mar
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(sqlite_mar, "SQLITE_PATH", str(tmp_path / "campaigns.sqlite3"))
+    sqlite_mar.close_pool()
+    sqlite_mar.invalidate_cache()
+    yield sqlite_mar
+    sqlite_mar.close_pool()
+    sqlite_mar.invalidate_cache()
+
+def add_customers(db, *people):
+    for name, demographics in people:
+        assert db.create_customer(name, f"{name.lower()}@example.com", demographics)
+    return {row[1]: row[0] for row in db.read_customers()}
+
+def members(db, segment_id):
+    return [name for segment in db.read_segments() if segment["id"] == segment_id for _, name in segment["customers"]]
+
+def new_campaign(db, name="Spring", channels=("Email", "Paid Ads")):
+    return db.create_campaign(name, 1000, date(2026, 3, 1), date(2026, 3, 31), "", list(channels))
+
+# --- Segments ---
+
+def test_segment_membership(db):
+    ids = add_customers(db, ("Ann", ""), ("Bob", ""), ("Cid", ""))
+    segment_id = db.create_segment("VIP", "")
+    assert db.add_customers_to_segment(segment_id, [ids["Ann"], ids["Bob"], ids["Ann"]])
+    assert members(db, segment_id) == ["Ann", "Bob"]
+    assert db.replace_segment_members(segment_id, [ids["Bob"], ids["Cid"]])
+    assert members(db, segment_id) == ["Bob", "Cid"]
+    assert db.remove_customers_from_segment(segment_id, [ids["Bob"]])
+    assert members(db, segment_id) == ["Cid"]
+
+def test_unknown_members_fail_the_whole_statement(db):
+    ids = add_customers(db, ("Ann", ""))
+    segment_id = db.create_segment("VIP", "")
+    assert not db.add_customers_to_segment(segment_id, [ids["Ann"], ids["Ann"] + 100])
+    assert members(db, segment_id) == []
+
+def test_segment_refresh(db):
+    add_customers(db, ("Ann", "age: 25"), ("Bob", "age: 41"), ("Cid", "age: 29, location: Paris"))
+    segment_id = db.create_segment("Under 30", "age < 30")
+    assert db.count_customers_matching("age < 30") == 2
+    assert db.refresh_segment(segment_id)
+    assert members(db, segment_id) == ["Ann", "Cid"]
+
+    # The first incremental run consumes the creation changes
+    db.refresh_segments_incremental()
+    ids = {row[1]: row[0] for row in db.read_customers()}
+    assert db.update_customer(ids["Ann"], "Ann", "ann@example.com", "age: 31")
+    assert db.update_customer(ids["Bob"], "Bob", "bob@example.com", "age: 22")
+    stats = db.refresh_segments_incremental()
+    assert (stats["changed_customers"], stats["added"], stats["removed"], stats["failed"]) == (2, 1, 1, [])
+    assert members(db, segment_id) == ["Bob", "Cid"]
+
+def test_refresh_segments_skips_non_executable_criteria(db):
+    add_customers(db, ("Ann", "age: 25"))
+    db.create_segment("Under 30", "age < 30")
+    db.create_segment("Hand-picked", "")
+    assert db.refresh_segments() == 1
+
+# --- Keyset Paging ---
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_customer_pages_cover_every_row_once(db, descending):
+    # Duplicate names make the id tie-breaker matter
+    for i in range(7):
+        assert db.create_customer(f"Name {i % 3}", f"c{i}@example.com", "")
+    expected = sorted(((row[1], row[0]) for row in db.read_customers()), reverse=descending)
+    seen, after = [], None
+    while True:
+        rows, after = db.read_customers_page(page_size=3, after=after, sort_by="name", descending=descending)
+        assert len(rows) <= 3
+        seen.extend((row[1], row[0]) for row in rows)
+        if after is None:
+            break
+    assert seen == expected
+
+def test_campaign_pages_filter_by_channel(db):
+    email_ids = [new_campaign(db, f"Email {i}", ["Email"]) for i in range(3)]
+    new_campaign(db, "Ads", ["Paid Ads"])
+    first, after = db.read_campaigns_page(page_size=2, channel="Email")
+    second, last = db.read_campaigns_page(page_size=2, after=after, channel="Email")
+    assert [c["id"] for c in first + second] == email_ids
+    assert last is None
+
+# --- Campaign Updates ---
+
+def test_update_campaign_writes_only_channel_deltas(db):
+    campaign_id = new_campaign(db)
+    update = {
+        "id": campaign_id, "name": "Spring", "budget": 1000, "start_date": date(2026, 3, 1),
+        "end_date": date(2026, 3, 31), "description": "", "channels": ["Paid Ads", "Podcast"],
+    }
+    assert db.update_campaigns([update]) == {"updated": 0, "channels_added": 1, "channels_removed": 1}
+    assert db.update_campaigns([update]) == {"updated": 0, "channels_added": 0, "channels_removed": 0}
+    assert db.update_campaigns([dict(update, budget=1500, channels=None)]) == {
+        "updated": 1, "channels_added": 0, "channels_removed": 0
+    }
+    [campaign] = db.read_campaigns()
+    assert campaign["channels"] == ["Paid Ads", "Podcast"]
+    assert campaign["budget"] == 1500
+    assert "Podcast" in dict(map(reversed, db.get_channel_types()))
+
+def test_update_campaign(db):
+    campaign_id = new_campaign(db)
+    assert db.update_campaign(campaign_id, "Summer", 800, date(2026, 6, 1), date(2026, 6, 30), "new", ["Email"])
+    [campaign] = db.read_campaigns()
+    assert (campaign["name"], campaign["description"], campaign["channels"]) == ("Summer", "new", ["Email"])
+
+# --- Sessions ---
+
+def test_session_commits_once(db):
+    with db.session() as s:
+        campaign_id = new_campaign(db)
+        segment_id = db.create_segment("Launch", "")
+        s.execute(f"UPDATE segments SET criteria = {db.PLACEHOLDER} WHERE id = {db.PLACEHOLDER};", ("age < 30", segment_id),
+                  tables=("segments",))
+    assert [c["id"] for c in db.read_campaigns()] == [campaign_id]
+    assert [(segment["id"], segment["criteria"]) for segment in db.read_segments()] == [(segment_id, "age < 30")]
+
+def test_session_rolls_back_on_failure(db):
+    with pytest.raises(db.SessionError):
+        with db.session():
+            assert new_campaign(db)
+            segment_id = db.create_segment("Launch", "")
+            assert not db.add_customers_to_segment(segment_id, [12345])
+            # Later calls fail at once instead of writing
+            assert db.create_segment("After", "") is None
+    assert db.read_campaigns() == []
+    assert db.read_segments() == []
+    assert db.active_session() is None
+
+def test_session_savepoint_contains_failure(db):
+    ids = add_customers(db, ("Ann", ""))
+    with db.session() as s:
+        segment_id = db.create_segment("Launch", "")
+        with s.savepoint() as savepoint:
+            assert db.add_customers_to_segment(segment_id, [ids["Ann"]])
+            assert not db.add_customers_to_segment(segment_id, [12345])
+        assert savepoint.error is not None
+        assert new_campaign(db)
+    assert members(db, segment_id) == []
+    assert len(db.read_campaigns()) == 1
+
+def test_session_reads_its_own_writes(db):
+    with db.session():
+        new_campaign(db)
+        assert len(db.read_campaigns()) == 1
+    assert len(db.read_campaigns()) == 1
+
+def test_sessions_do_not_nest(db):
+    with db.session():
+        with pytest.raises(db.SessionError):
+            with db.session():
+                pass
+
+# --- Schema Upgrades ---
+
+def test_schema_upgrade_from_version_0(db):
+    # A file written before channel_types existed: channel names inline, one of them unknown and one repeated
+    conn = sqlite3.connect(db.SQLITE_PATH)
+    conn.executescript(db.SCHEMA)
+    conn.execute("INSERT INTO campaigns (id, name, budget, start_date, end_date) VALUES (1, 'Old', 10, '2025-01-01', '2025-01-31');")
+    conn.executemany("INSERT INTO channels (campaign_id, channel_type) VALUES (1, ?);", [("Email",), ("Podcast",), ("Email",)])
+    conn.commit()
+    assert conn.execute("PRAGMA user_version;").fetchone()[0] == 0
+    conn.close()
+
+    [campaign] = db.read_campaigns()
+    assert campaign["channels"] == ["Email", "Podcast"]
+    assert [name for _, name in db.get_channel_types()] == ["Email", "Social Media", "Paid Ads", "Content Marketing", "Podcast"]
+    assert db.log_performance_metric(1, 10, 5, 1, channel="Podcast")
+    version = db.get_db_connection().execute("PRAGMA user_version;").fetchone()[0]
+    assert version == len(db.SCHEMA_UPGRADES)
+
+def test_schema_upgrades_apply_once(db):
+    new_campaign(db)
+    db.close_pool()
+    # Reopening an up-to-date file must not rerun the upgrades (they would fail on the new tables)
+    assert len(db.read_campaigns()) == 1
+    assert db.get_db_connection().execute("PRAGMA user_version;").fetchone()[0] == len(db.SCHEMA_UPGRADES)
+
+# --- Query Cache ---
+
+@pytest.fixture
+def seeded(db):
+    ids = add_customers(db, ("Ann", "age: 25"), ("Bob", "age: 41"))
+    campaign_id = new_campaign(db)
+    segment_id = db.create_segment("Under 30", "age < 30")
+    db.refresh_segment(segment_id)
+    db.log_performance_metric(campaign_id, 100, 40, 10)
+    return {"campaign": campaign_id, "segment": segment_id, **ids}
+
+def _ingest(db, ids):
+    ingestor = db.MetricIngestor(max_delay=60)
+    try:
+        assert ingestor.submit([{"campaign_id": ids["campaign"], "emails_sent": 5, "clicks": 1}])
+        ingestor.flush()
+        assert ingestor.stats["written"] == 1
+    finally:
+        ingestor.close()
+
+def _in_session(db, ids):
+    with db.session() as s:
+        db.update_customer(ids["Bob"], "Bob", "bob@example.com", "age: 22")
+        s.execute(f"INSERT INTO customer_segments (customer_id, segment_id) VALUES ({db.PLACEHOLDER}, {db.PLACEHOLDER});",
+                  (ids["Bob"], ids["segment"]), tables=("customer_segments",))
+
+def _session_execute_without_tables(db, ids):
+    # Without `tables` the whole cache is dropped at commit
+    with db.session() as s:
+        s.execute("UPDATE campaigns SET name = 'Renamed';")
+
+# Each write through a mutator must be visible to a read cached just before it
+WRITES = {
+    "create_campaign": (lambda db, ids: new_campaign(db, "Autumn"), "read_campaigns", ()),
+    "update_campaign": (
+        lambda db, ids: db.update_campaign(ids["campaign"], "Summer", 1000, date(2026, 3, 1), date(2026, 3, 31), "", ["Email"]),
+        "read_campaigns_page", (),
+    ),
+    "update_campaign new channel type": (
+        lambda db, ids: db.update_campaign(ids["campaign"], "Spring", 1000, date(2026, 3, 1), date(2026, 3, 31), "", ["Radio"]),
+        "get_channel_types", (),
+    ),
+    "update_campaigns": (
+        lambda db, ids: db.update_campaigns([{
+            "id": ids["campaign"], "name": "Spring", "budget": 2500, "start_date": date(2026, 3, 1),
+            "end_date": date(2026, 3, 31), "description": "",
+        }]),
+        "get_total_campaign_budget", (),
+    ),
+    "delete_campaign": (lambda db, ids: db.delete_campaign(ids["campaign"]), "get_campaign_metric_totals", ()),
+    "create_customer": (lambda db, ids: db.create_customer("Cid", "cid@example.com", "age: 20"), "read_customers_page", ()),
+    "update_customer": (
+        lambda db, ids: db.update_customer(ids["Ann"], "Ann", "ann@example.com", "age: 35"),
+        "count_customers_matching", ("age < 30",),
+    ),
+    "delete_customer": (lambda db, ids: db.delete_customer(ids["Ann"]), "read_segments", ()),
+    "import_customers": (
+        lambda db, ids: db.import_customers(io.BytesIO(b"name,email,demographics\nDee,dee@example.com,age: 19\n")),
+        "read_customers", (),
+    ),
+    "create_segment": (lambda db, ids: db.create_segment("Everyone", ""), "read_segments", ()),
+    "add_customers_to_segment": (lambda db, ids: db.add_customers_to_segment(ids["segment"], [ids["Bob"]]), "read_segments", ()),
+    "remove_customers_from_segment": (
+        lambda db, ids: db.remove_customers_from_segment(ids["segment"], [ids["Ann"]]), "read_segments", (),
+    ),
+    "replace_segment_members": (lambda db, ids: db.replace_segment_members(ids["segment"], [ids["Bob"]]), "read_segments", ()),
+    "refresh_segment": (
+        lambda db, ids: db.create_customer("Cid", "cid@example.com", "age: 20") and db.refresh_segment(ids["segment"]),
+        "read_segments", (),
+    ),
+    "refresh_segments_incremental": (
+        lambda db, ids: db.create_customer("Cid", "cid@example.com", "age: 20") and db.refresh_segments_incremental(),
+        "read_segments", (),
+    ),
+    "delete_segment": (lambda db, ids: db.delete_segment(ids["segment"]), "read_segments", ()),
+    "log_performance_metric": (
+        lambda db, ids: db.log_performance_metric(ids["campaign"], 50, 5, 2), "get_campaign_metric_totals", (),
+    ),
+    "write_metric_batch": (
+        lambda db, ids: db.write_metric_batch([(ids["campaign"], 50, 5, 2, datetime.now())]), "get_insights_snapshot", (),
+    ),
+    "MetricIngestor flush": (_ingest, "get_campaign_metric_totals", ()),
+    "session": (_in_session, "read_segments", ()),
+    "session execute without tables": (_session_execute_without_tables, "read_campaigns", ()),
+}
+
+@pytest.mark.parametrize("write", WRITES)
+def test_writes_invalidate_cached_reads(seeded, write):
+    db = sqlite_mar
+    mutate, read_name, args = WRITES[write]
+    read = getattr(db, read_name)
+    before = read(*args)
+    assert read(*args) == before
+    mutate(db, seeded)
+    after = read(*args)
+    assert after != before
+    # A read that bypasses the cache agrees with it
+    db.invalidate_cache()
+    assert read(*args) == after
+
+def test_failed_session_invalidates_nothing(seeded):
+    db = sqlite_mar
+    before = db.read_segments()
+    with pytest.raises(db.SessionError):
+        with db.session():
+            db.add_customers_to_segment(seeded["segment"], [seeded["Bob"]])
+            db.add_customers_to_segment(seeded["segment"], [12345])
+    hits = db.cache_stats()["hits"]
+    assert db.read_segments() == before
+    assert db.cache_stats()["hits"] == hits + 1
+
+def test_cached_reads_return_lists(seeded):
+    db = sqlite_mar
+    for _ in range(2):
+        assert isinstance(db.read_customers(), list)
+        assert isinstance(db.read_customers_page()[0], list)
+        assert isinstance(db.get_channel_types(), list)
+    db.read_customers().clear()
+    assert len(db.read_customers()) == 2